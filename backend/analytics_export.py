@@ -0,0 +1,201 @@
+"""
+Columnar Analytics Exports (Parquet / Arrow IPC)
+
+Bulk dumps of `attendances`, `leaves`, `users` and payroll for the analytics
+team, in place of paging through the JSON endpoints. Rows are read
+with `yield_per` (a server-side cursor on Postgres) ANALYTICS_CHUNK_ROWS at a
+time and each chunk is written as one Parquet row group / Arrow record batch,
+so a multi-year dump is produced in constant memory. The same byte stream is
+served over HTTP or written to files (`python analytics_export.py --out DIR`).
+Payroll for closed months is read from the stored payslips; only the open
+month (and users without a stored payslip) is computed.
+
+pyarrow is optional: without it `require_pyarrow` raises
+ColumnarExportUnavailable and the API answers 501.
+"""
+import os
+from datetime import date, timedelta
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import Select, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from leave_calendar import overlaps
+from models import Attendance, Leave, User
+from payroll import compute_payroll, stored_month_payroll
+from work_calendar import month_last_day
+
+ANALYTICS_CHUNK_ROWS = int(os.getenv("ANALYTICS_CHUNK_ROWS", "50000"))
+
+# format -> (file extension, media type)
+COLUMNAR_FORMATS = {
+    "parquet": ("parquet", "application/vnd.apache.parquet"),
+    "arrow": ("arrows", "application/vnd.apache.arrow.stream"),
+}
+
+# dataset -> [(column, type)]; types map to Arrow types in `arrow_schema`
+DATASET_COLUMNS: Dict[str, List[Tuple[str, str]]] = {
+    "attendances": [
+        ("id", "int"), ("user_id", "int"), ("date", "date"), ("status", "str"),
+        ("in_time", "time"), ("out_time", "time"), ("work_minutes", "int"), ("created_at", "timestamp"),
+    ],
+    "leaves": [
+        ("id", "int"), ("user_id", "int"), ("start_date", "date"), ("end_date", "date"), ("leave_type", "str"),
+        ("status", "str"), ("reason", "str"), ("applied_at", "timestamp"), ("reviewed_at", "timestamp"),
+        ("reviewed_by", "int"),
+    ],
+    "users": [
+        ("id", "int"), ("email", "str"), ("name", "str"), ("role", "str"), ("department", "str"),
+        ("position", "str"), ("base_salary", "int"), ("created_at", "timestamp"),
+    ],
+    "payroll": [
+        ("month", "date"), ("user_id", "int"), ("name", "str"), ("base_salary", "float"), ("tax", "float"),
+        ("deductions", "float"), ("net_salary", "float"), ("absent_days", "int"), ("working_days", "int"),
+    ],
+}
+
+
+class ColumnarExportUnavailable(RuntimeError):
+    pass
+
+
+def require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise ColumnarExportUnavailable("Columnar exports need pyarrow (pip install pyarrow)")
+    return pyarrow
+
+
+def arrow_schema(dataset: str):
+    pa = require_pyarrow()
+    types = {
+        "int": pa.int64(), "float": pa.float64(), "str": pa.string(), "date": pa.date32(),
+        "time": pa.time64("us"), "timestamp": pa.timestamp("us", tz="UTC"),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in DATASET_COLUMNS[dataset]])
+
+
+def _table_query(dataset: str, session: Session, from_date: date, to_date: date) -> Select:
+    if dataset == "attendances":
+        columns = [getattr(Attendance, name) for name, _ in DATASET_COLUMNS[dataset]]
+        return select(*columns).where(Attendance.date >= from_date, Attendance.date <= to_date).order_by(
+            Attendance.date, Attendance.user_id
+        )
+    if dataset == "leaves":
+        columns = [getattr(Leave, name) for name, _ in DATASET_COLUMNS[dataset]]
+        return select(*columns).where(overlaps(session, from_date, to_date)).order_by(Leave.start_date, Leave.id)
+    columns = [getattr(User, name) for name, _ in DATASET_COLUMNS[dataset]]
+    return select(*columns).order_by(User.id)
+
+
+def _row_chunks(dataset: str, session: Session, from_date: date, to_date: date) -> Iterator[List[tuple]]:
+    if dataset != "payroll":
+        stmt = _table_query(dataset, session, from_date, to_date)
+        yield from session.execute(stmt.execution_options(yield_per=ANALYTICS_CHUNK_ROWS)).partitions()
+        return
+    # One month of payroll (every user) per chunk
+    names = [name for name, _ in DATASET_COLUMNS["payroll"]]
+    open_month = date.today().replace(day=1)
+    month_first = from_date.replace(day=1)
+    while month_first <= to_date:
+        if month_first < open_month:
+            results = stored_month_payroll(session, month_first)
+        else:
+            results = compute_payroll(session, month_first)
+        yield [tuple(month_first if name == "month" else data[name] for name in names) for data in results]
+        session.expunge_all()
+        month_first = month_last_day(month_first) + timedelta(days=1)
+
+
+class _ChunkSink:
+    """Write-only, non-seekable file object collecting what the writer emits between drains."""
+
+    def __init__(self):
+        self._chunks = []
+        self.closed = False
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_dataset(bind: Engine, dataset: str, format: str, from_date: date, to_date: date) -> Iterator[bytes]:
+    """
+    Yield `dataset` as a Parquet file or Arrow IPC stream, one row group / record
+    batch per chunk. Opens its own session: the stream outlives the request's.
+    """
+    pa = require_pyarrow()
+    schema = arrow_schema(dataset)
+    sink = _ChunkSink()
+    output = pa.PythonFile(sink, mode="w")
+    if format == "parquet":
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(output, schema, compression="zstd")
+    else:
+        writer = pa.ipc.new_stream(output, schema)
+
+    session = Session(bind=bind)
+    try:
+        for rows in _row_chunks(dataset, session, from_date, to_date):
+            if rows:
+                columns = zip(*rows)
+                writer.write_batch(pa.RecordBatch.from_arrays(
+                    [pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema
+                ))
+                yield sink.drain()
+        writer.close()
+        yield sink.drain()
+    finally:
+        session.close()
+
+
+def write_dataset_files(
+    bind: Engine,
+    directory: str,
+    from_date: date,
+    to_date: date,
+    format: str = "parquet",
+    datasets: Optional[List[str]] = None,
+    progress: Callable[[str], None] = lambda path: None,
+) -> List[str]:
+    """Write each dataset to `<directory>/<dataset>_<from>_<to>.<ext>`; returns the paths."""
+    os.makedirs(directory, exist_ok=True)
+    extension = COLUMNAR_FORMATS[format][0]
+    paths = []
+    for dataset in datasets or list(DATASET_COLUMNS):
+        path = os.path.join(directory, f"{dataset}_{from_date}_{to_date}.{extension}")
+        with open(path, "wb") as file:
+            for data in stream_dataset(bind, dataset, format, from_date, to_date):
+                file.write(data)
+        progress(path)
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from database import engine
+
+    parser = argparse.ArgumentParser(description="Export HRMS data to Parquet / Arrow files")
+    parser.add_argument("--from", dest="from_date", type=date.fromisoformat, required=True)
+    parser.add_argument("--to", dest="to_date", type=date.fromisoformat, default=date.today())
+    parser.add_argument("--format", choices=sorted(COLUMNAR_FORMATS), default="parquet")
+    parser.add_argument("--dataset", action="append", choices=sorted(DATASET_COLUMNS))
+    parser.add_argument("--out", default="analytics")
+    args = parser.parse_args()
+    write_dataset_files(engine, args.out, args.from_date, args.to_date, args.format, args.dataset, progress=print)
@@ -0,0 +1,280 @@
+"""
+Attendance Punches (check-in / check-out as single atomic statements)
+
+Check-in is an `INSERT ... ON CONFLICT (user_id, date) DO NOTHING RETURNING`
+against the unique user/day index and check-out a conditional
+`UPDATE ... RETURNING` that also computes the worked minutes, so concurrent
+punches cannot race each other. An accepted punch adds its increments to the
+monthly rollup in the same transaction; only a rejected punch costs a second
+query, to pick the right error message.
+"""
+import csv
+import io
+import json
+from dataclasses import dataclass
+from datetime import date, datetime, time
+from typing import List, Optional, Set, Tuple
+
+from sqlalchemy import Integer, and_, bindparam, cast, extract, func, insert, literal, select, text, update
+from sqlalchemy.orm import Session
+
+from database import dialect_inserts
+from models import Attendance, User
+from rollup import bump_rollup, rebuild_rollups
+
+LATE_AFTER = time(9, 30, 0)
+
+ALREADY_CHECKED_IN = "You are already checked in! Please check out first."
+SHIFT_COMPLETED = "You have already completed your shift for today."
+ALREADY_CHECKED_OUT = "You have already checked out today."
+NOT_CHECKED_IN = "You are not checked in. Please check in first."
+OUT_BEFORE_IN = "Check-out time is earlier than the check-in time."
+
+# Stored shifts closed per UPDATE statement by replay_punches (3 bind parameters each)
+REPLAY_CLOSE_CHUNK_ROWS = 1000
+
+
+class PunchRejected(Exception):
+    """A check-in/check-out that is not valid in the shift's current state."""
+
+
+def check_in_status(now: time) -> str:
+    return "Present" if now <= LATE_AFTER else "Late"
+
+
+def worked_minutes(day: date, in_time: time, out_time: time) -> int:
+    """Python twin of the check-out UPDATE's work_minutes expression."""
+    return (datetime.combine(day, out_time) - datetime.combine(day, in_time)).seconds // 60
+
+
+def _elapsed_minutes(dialect_name: str, start, end: time):
+    """SQL expression for the whole minutes from the `start` column to `end`."""
+    end = literal(end, Attendance.in_time.type)
+    if dialect_name == "sqlite":
+        # Times are stored as 'HH:MM:SS.ffffff' text; strftime reads them as seconds
+        seconds = cast(func.strftime("%s", end) - func.strftime("%s", start), Integer)
+    else:
+        seconds = cast(func.floor(extract("epoch", end - start)), Integer)
+    return seconds // 60
+
+
+def _detach(db: Session, attendance: Attendance) -> Attendance:
+    # RETURNING already loaded every column; keep it loaded past the commit
+    db.expunge(attendance)
+    db.commit()
+    return attendance
+
+
+def open_shift(db: Session, user_id: int, today: date, now: time) -> Attendance:
+    """Open today's shift. Raises PunchRejected if the user already has a row for today."""
+    insert = dialect_inserts[db.get_bind().dialect.name]
+    stmt = insert(Attendance).values(
+        user_id=user_id,
+        date=today,
+        status=check_in_status(now),
+        in_time=now
+    ).on_conflict_do_nothing(index_elements=["user_id", "date"]).returning(Attendance)
+
+    attendance = db.scalars(stmt).first()
+    if attendance is not None:
+        bump_rollup(db.connection(), user_id, today, status=attendance.status)
+        return _detach(db, attendance)
+
+    db.rollback()
+    out_time = db.scalar(select(Attendance.out_time).where(and_(
+        Attendance.user_id == user_id,
+        Attendance.date == today
+    )))
+    if out_time is not None:
+        raise PunchRejected(SHIFT_COMPLETED)
+    raise PunchRejected(ALREADY_CHECKED_IN)
+
+
+def close_shift(db: Session, user_id: int, today: date, now: time) -> Attendance:
+    """Close today's open shift. Raises PunchRejected if there is none."""
+    stmt = update(Attendance).where(and_(
+        Attendance.user_id == user_id,
+        Attendance.date == today,
+        Attendance.out_time.is_(None)
+    )).values(
+        out_time=now,
+        work_minutes=_elapsed_minutes(db.get_bind().dialect.name, Attendance.in_time, now)
+    ).returning(Attendance).execution_options(synchronize_session=False)
+
+    attendance = db.scalars(stmt).first()
+    if attendance is not None:
+        if attendance.work_minutes is not None:
+            bump_rollup(db.connection(), user_id, today, work_minutes=attendance.work_minutes)
+        return _detach(db, attendance)
+
+    db.rollback()
+    completed = db.scalar(select(Attendance.id).where(and_(
+        Attendance.user_id == user_id,
+        Attendance.date == today,
+        Attendance.out_time.is_not(None)
+    )))
+    if completed is not None:
+        raise PunchRejected(ALREADY_CHECKED_OUT)
+    raise PunchRejected(NOT_CHECKED_IN)
+
+
+# ---- offline time-clock replay ----
+
+PUNCH_DIRECTIONS = ("in", "out")
+
+
+@dataclass
+class PunchRow:
+    """One uploaded punch and, once replayed, its outcome."""
+    line: int
+    user_id: Optional[int] = None
+    timestamp: Optional[datetime] = None
+    direction: Optional[str] = None
+    accepted: bool = False
+    detail: Optional[str] = None
+
+
+def _punch_row(line: int, record: dict) -> PunchRow:
+    row = PunchRow(line)
+    try:
+        row.user_id = int(record["user_id"])
+        timestamp = datetime.fromisoformat(str(record["timestamp"]).strip())
+        if timestamp.tzinfo is not None:
+            # Shifts are recorded in the server's local time, like datetime.now() in check_in
+            timestamp = timestamp.astimezone().replace(tzinfo=None)
+        row.timestamp = timestamp
+        row.direction = str(record["direction"]).strip().lower()
+        if row.direction not in PUNCH_DIRECTIONS:
+            raise ValueError(f"direction must be one of {', '.join(PUNCH_DIRECTIONS)}")
+    except KeyError as e:
+        row.detail = f"Missing field {e.args[0]}"
+    except (TypeError, ValueError) as e:
+        row.detail = f"Invalid punch: {e}"
+    return row
+
+
+def parse_punch_file(content: bytes, csv_format: bool) -> List[PunchRow]:
+    """
+    `user_id,timestamp,direction` punches from CSV (with a header row) or JSON lines.
+    Rows that cannot be parsed come back with `detail` set.
+    """
+    text = content.decode("utf-8-sig")
+    if csv_format:
+        reader = csv.DictReader(io.StringIO(text))
+        return [_punch_row(reader.line_num, record) for record in reader]
+
+    rows = []
+    for line, raw in enumerate(text.splitlines(), 1):
+        if not raw.strip():
+            continue
+        try:
+            record = json.loads(raw)
+        except ValueError as e:
+            rows.append(PunchRow(line, detail=f"Invalid JSON: {e}"))
+            continue
+        rows.append(_punch_row(line, record) if isinstance(record, dict) else PunchRow(line, detail="Expected a JSON object"))
+    return rows
+
+
+def _close_stored_shifts(db: Session, closes: List[Tuple[int, time, Optional[int]]]) -> Set[int]:
+    """
+    Set (id, out_time, work_minutes) on shifts that are still open, joining a VALUES
+    list REPLAY_CLOSE_CHUNK_ROWS rows at a time; returns the ids actually closed.
+    """
+    postgres = db.get_bind().dialect.name == "postgresql"
+    # Postgres types VALUES columns from their contents, which may all be NULL
+    out_time, work_minutes = ("closing.out_time::time", "closing.work_minutes::integer") if postgres else (
+        "closing.out_time", "closing.work_minutes"
+    )
+    table = Attendance.__tablename__
+    updated = set()
+    for start in range(0, len(closes), REPLAY_CLOSE_CHUNK_ROWS):
+        chunk = closes[start:start + REPLAY_CLOSE_CHUNK_ROWS]
+        stmt = text(
+            f"WITH closing (id, out_time, work_minutes) AS (VALUES "
+            f"{', '.join(f'(:id_{i}, :out_{i}, :minutes_{i})' for i in range(len(chunk)))}) "
+            f"UPDATE {table} SET out_time = {out_time}, work_minutes = {work_minutes} "
+            f"FROM closing WHERE {table}.id = closing.id AND {table}.out_time IS NULL RETURNING {table}.id"
+        ).bindparams(*(bindparam(f"out_{i}", type_=Attendance.out_time.type) for i in range(len(chunk))))
+        params = {}
+        for i, (id, out, minutes) in enumerate(chunk):
+            params.update({f"id_{i}": id, f"out_{i}": out, f"minutes_{i}": minutes})
+        updated.update(db.execute(stmt, params).scalars())
+    return updated
+
+
+def replay_punches(db: Session, rows: List[PunchRow]) -> List[PunchRow]:
+    """
+    Replay parsed punches in timestamp order through the check-in/check-out rules,
+    starting from the shifts already stored for the days involved, then write every
+    accepted punch in one transaction (bulk insert of new shifts, chunked update of
+    the stored shifts it closes). A stored shift that was closed by a live check-out in
+    the meantime is left alone and its punch reported as rejected. Outcomes are
+    recorded on the rows, which are returned as given.
+    """
+    valid = [row for row in rows if row.detail is None]
+    if not valid:
+        return rows
+
+    days = {row.timestamp.date() for row in valid}
+    known_users = set(db.scalars(select(User.id)))
+    # Stored shifts of those days: (user_id, date) -> [id, in_time, status, out_time, work_minutes]
+    shifts = {
+        (r.user_id, r.date): [r.id, r.in_time, r.status, r.out_time, r.work_minutes]
+        for r in db.execute(
+            select(Attendance.id, Attendance.user_id, Attendance.date, Attendance.in_time,
+                   Attendance.status, Attendance.out_time, Attendance.work_minutes)
+            .where(and_(Attendance.date >= min(days), Attendance.date <= max(days)))
+        )
+        if r.date in days
+    }
+    opened, closed = set(), set()
+    closed_by = {}
+
+    for row in sorted(valid, key=lambda r: (r.timestamp, r.line)):
+        if row.user_id not in known_users:
+            row.detail = "Unknown user"
+            continue
+        day, at = row.timestamp.date(), row.timestamp.time()
+        key = (row.user_id, day)
+        shift = shifts.get(key)
+        if row.direction == "in":
+            if shift is not None:
+                row.detail = SHIFT_COMPLETED if shift[3] is not None else ALREADY_CHECKED_IN
+                continue
+            shifts[key] = [None, at, check_in_status(at), None, None]
+            opened.add(key)
+        else:
+            if shift is None:
+                row.detail = NOT_CHECKED_IN
+                continue
+            if shift[3] is not None:
+                row.detail = ALREADY_CHECKED_OUT
+                continue
+            if shift[1] is not None and at < shift[1]:
+                row.detail = OUT_BEFORE_IN
+                continue
+            shift[3] = at
+            shift[4] = worked_minutes(day, shift[1], at) if shift[1] else None
+            closed.add(key)
+            closed_by[key] = row
+        row.accepted = True
+
+    if opened:
+        db.execute(insert(Attendance), [
+            {"user_id": user_id, "date": day, "in_time": shifts[(user_id, day)][1],
+             "status": shifts[(user_id, day)][2], "out_time": shifts[(user_id, day)][3],
+             "work_minutes": shifts[(user_id, day)][4]}
+            for user_id, day in opened
+        ])
+    previously_open = closed - opened
+    if previously_open:
+        ids = {shifts[key][0]: key for key in previously_open}
+        updated = _close_stored_shifts(db, [(id, shifts[key][3], shifts[key][4]) for id, key in ids.items()])
+        for id in ids.keys() - updated:
+            # Checked out through the API since the shifts were read
+            row = closed_by[ids[id]]
+            row.accepted, row.detail = False, ALREADY_CHECKED_OUT
+    rebuild_rollups(db.connection(), opened | closed)
+    db.commit()
+    return rows
@@ -0,0 +1,91 @@
+"""
+Concurrency benchmark: latency of authenticated GETs under many simultaneous clients.
+
+Fires `--clients` concurrent requests at `/dashboard/stats` through the ASGI app
+and reports p50/p99 latency. `--query-delay-ms` adds an artificial sleep to every
+SQL statement to emulate a slow remote Postgres; that is where handlers which
+block the event loop fall apart.
+
+Usage (from backend/):
+    python benchmarks/bench_concurrency.py --clients 200 --query-delay-ms 5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from sqlalchemy import create_engine, event
+
+from database import Base, SessionLocal
+from models import User, UserRole
+from main import app, get_password_hash, create_access_token
+
+
+def build_database(path: str, delay_ms: float):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    # Point the app's own session factory (and so the real get_db) at the bench DB
+    SessionLocal.configure(bind=engine)
+
+    db = SessionLocal()
+    db.add(User(
+        email="admin@hrms.com",
+        name="Bench Admin",
+        hashed_password=get_password_hash("admin123"),
+        role=UserRole.ADMIN.value,
+    ))
+    db.commit()
+    db.close()
+
+    if delay_ms:
+        @event.listens_for(engine, "before_cursor_execute")
+        def _slow_query(conn, cursor, statement, parameters, context, executemany):
+            time.sleep(delay_ms / 1000.0)
+
+
+async def run(clients: int, rounds: int) -> list:
+    token = create_access_token({"sub": "admin@hrms.com"})
+    headers = {"Authorization": f"Bearer {token}"}
+    transport = httpx.ASGITransport(app=app)
+    latencies = []
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one():
+            start = time.perf_counter()
+            res = await client.get("/dashboard/stats", headers=headers)
+            latencies.append((time.perf_counter() - start) * 1000)
+            assert res.status_code == 200, res.text
+
+        for _ in range(rounds):
+            await asyncio.gather(*(one() for _ in range(clients)))
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--query-delay-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        build_database(os.path.join(tmp, "bench.db"), args.query_delay_ms)
+        started = time.perf_counter()
+        latencies = asyncio.run(run(args.clients, args.rounds))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"requests={len(latencies)} clients={args.clients} query_delay_ms={args.query_delay_ms}")
+    print(f"p50={statistics.median(latencies):.1f}ms p99={p99:.1f}ms "
+          f"throughput={len(latencies) / elapsed:.0f} req/s")
+
+
+if __name__ == "__main__":
+    main()
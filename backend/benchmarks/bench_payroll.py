@@ -0,0 +1,85 @@
+"""
+Payroll benchmark: whole-company run vs. one calculation per employee.
+
+Seeds an in-memory SQLite database with `--employees` users, a month of
+attendance (~90% presence), approved leaves and holidays, then times
+`compute_payroll` for everyone at once against the per-employee path used by
+`/payroll/me` (timed on a sample and extrapolated).
+
+Usage (from backend/):
+    python benchmarks/bench_payroll.py --employees 10000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta, time as dtime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import Base
+from models import User, Attendance, Leave, Holiday, LeaveStatus
+from payroll import compute_payroll, month_last_day
+from rollup import rebuild_rollups
+
+
+def seed(db, employees: int, month_first: date) -> None:
+    rng = random.Random(42)
+    month_last = month_last_day(month_first)
+    db.execute(insert(User), [
+        {"email": f"emp{i}@hrms.com", "name": f"Employee {i}", "hashed_password": "x",
+         "role": "employee", "base_salary": rng.randint(300000, 2000000)}
+        for i in range(1, employees + 1)
+    ])
+    db.execute(insert(Holiday), [{"name": "Mid-month Holiday", "date": month_first.replace(day=15)}])
+
+    days = [month_first + timedelta(days=i) for i in range(month_last.day)]
+    attendance, leaves = [], []
+    for user_id in range(1, employees + 1):
+        for d in days:
+            if d.weekday() < 5 and rng.random() < 0.9:
+                attendance.append({"user_id": user_id, "date": d, "status": "Present", "in_time": dtime(9, 0)})
+        if rng.random() < 0.3:
+            start = month_first + timedelta(days=rng.randint(0, 20))
+            leaves.append({"user_id": user_id, "start_date": start, "end_date": start + timedelta(days=rng.randint(0, 4)),
+                           "reason": "Bench", "leave_type": "Annual", "status": LeaveStatus.APPROVED.value})
+    db.execute(insert(Attendance), attendance)
+    db.execute(insert(Leave), leaves)
+    # Core inserts bypass the ORM events that keep rollups current
+    rebuild_rollups(db.connection())
+    db.commit()
+    print(f"seeded employees={employees} attendance_rows={len(attendance)} leaves={len(leaves)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--employees", type=int, default=10000)
+    parser.add_argument("--sample", type=int, default=500, help="employees timed on the per-employee path")
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    month_first = date(2025, 3, 1)
+    seed(db, args.employees, month_first)
+
+    started = time.perf_counter()
+    results = compute_payroll(db, month_first)
+    batch = time.perf_counter() - started
+    print(f"batch run: {len(results)} payslips in {batch:.2f}s")
+
+    users = db.query(User).order_by(User.id).limit(args.sample).all()
+    started = time.perf_counter()
+    for user in users:
+        compute_payroll(db, month_first, [user])
+    per_user = (time.perf_counter() - started) / len(users)
+    print(f"per-employee path: {per_user * 1000:.1f}ms each -> ~{per_user * args.employees:.1f}s for {args.employees}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Punch ingestion benchmark: per-request commit vs. the write-behind punch queue.
+
+Seeds a file-backed SQLite database with `--employees` users and has every one
+of them check in from `--threads` concurrent threads, once through
+`attendance.open_shift` (one transaction per punch, as the API does by
+default) and once through `PunchQueue` (acknowledged after the write-ahead
+append, written in batches). Queue throughput includes draining it to the
+database, so both numbers count punches that are durably stored.
+
+Finally an offline time-clock upload of `--upload-days` days of check-ins and
+check-outs for everyone is parsed and replayed as the bulk endpoint does, and
+one of check-outs only, closing the shifts the write-behind run left open.
+
+Usage (from backend/):
+    python benchmarks/bench_punches.py --employees 5000 --threads 16
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, time as dtime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models import User, Attendance
+from attendance import open_shift, parse_punch_file, replay_punches
+from punch_queue import PunchQueue
+
+
+def build_engine(directory: str, employees: int):
+    engine = create_engine(
+        f"sqlite:///{os.path.join(directory, 'bench.db')}",
+        connect_args={"check_same_thread": False, "timeout": 30},
+        pool_size=32,
+    )
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"email": f"emp{i}@hrms.com", "name": f"Employee {i}", "hashed_password": "x", "role": "employee"}
+            for i in range(1, employees + 1)
+        ])
+    return engine
+
+
+def run(label: str, punch, employees: int, threads: int, drain=None) -> None:
+    latencies = []
+
+    def one(user_id: int) -> None:
+        started = time.perf_counter()
+        punch(user_id)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one, range(1, employees + 1)))
+    acked = time.perf_counter() - started
+    if drain is not None:
+        drain()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(
+        f"{label:>14}: {employees / elapsed:8.0f} punches/s stored  "
+        f"(all acknowledged after {acked:.2f}s, stored after {elapsed:.2f}s; "
+        f"ack p50={statistics.median(latencies) * 1000:.2f}ms "
+        f"p99={latencies[int(len(latencies) * 0.99) - 1] * 1000:.2f}ms)"
+    )
+
+
+def replay(label: str, Session, content: bytes) -> None:
+    started = time.perf_counter()
+    db = Session()
+    results = replay_punches(db, parse_punch_file(content, csv_format=True))
+    db.close()
+    elapsed = time.perf_counter() - started
+    accepted = sum(row.accepted for row in results)
+    print(f"{label:>14}: {len(results)} punches ({accepted} accepted) parsed and replayed in {elapsed:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--employees", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--upload-days", type=int, default=5)
+    args = parser.parse_args()
+    today, now = date(2025, 3, 3), dtime(9, 5)
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = build_engine(directory, args.employees)
+        Session = sessionmaker(bind=engine)
+
+        def per_request(user_id: int) -> None:
+            db = Session()
+            try:
+                open_shift(db, user_id, today, now)
+            finally:
+                db.close()
+
+        run("per-request", per_request, args.employees, args.threads)
+
+        queue = PunchQueue(os.path.join(directory, "punches.wal"), max_pending=args.employees)
+        queue.start(engine)
+        next_day = date(2025, 3, 4)
+        run("write-behind", lambda user_id: queue.check_in(user_id, next_day, now),
+            args.employees, args.threads, drain=queue.stop)
+
+        with engine.connect() as conn:
+            rows = conn.scalar(select(func.count()).select_from(Attendance))
+        print(f"rows written: {rows} (expected {args.employees * 2})")
+
+        lines = ["user_id,timestamp,direction"]
+        for offset in range(args.upload_days):
+            day = datetime(2025, 3, 10) + timedelta(days=offset)
+            for user_id in range(1, args.employees + 1):
+                lines.append(f"{user_id},{(day + timedelta(hours=9)).isoformat()},in")
+                lines.append(f"{user_id},{(day + timedelta(hours=17, minutes=30)).isoformat()},out")
+        content = "\n".join(lines).encode()
+
+        replay("bulk upload", Session, content)
+
+        check_outs = ["user_id,timestamp,direction"] + [
+            f"{user_id},{datetime.combine(next_day, dtime(17, 30)).isoformat()},out"
+            for user_id in range(1, args.employees + 1)
+        ]
+        replay("stored closes", Session, "\n".join(check_outs).encode())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+In-process caches shared by the API (principal lookups, dashboard snapshots, ...)
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire `ttl` seconds after being set."""
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+            }
+
+
+class SpillingLRUCache:
+    """
+    LRU cache of bytes values bounded by total size in memory. Entries evicted
+    from memory are written to `directory` and promoted back on their next hit,
+    so large, immutable artefacts (rendered PDFs) survive memory pressure. The
+    spill files are kept under `max_disk_bytes` by deleting the least recently
+    written or read ones; the directory is created on the first spill.
+    """
+
+    def __init__(self, directory: str, max_memory_bytes: int = 32 * 1024 * 1024,
+                 max_disk_bytes: int = 256 * 1024 * 1024):
+        self.directory = directory
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory_bytes = 0
+        self._data: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest() + ".bin")
+
+    def _spill_files(self) -> list:
+        """(mtime, size, path) of every spill file, oldest first."""
+        try:
+            entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return []
+        files = []
+        for entry in entries:
+            if entry.name.endswith(".bin"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        return sorted(files)
+
+    def _spill(self, key: str, value: bytes) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, "wb") as f:
+            f.write(value)
+        os.replace(tmp_path, self._path(key))
+        self._trim_disk()
+
+    def _trim_disk(self) -> None:
+        """Delete the oldest spill files until the rest fit in `max_disk_bytes`."""
+        files = self._spill_files()
+        disk_bytes = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if disk_bytes <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            disk_bytes -= size
+
+    def _store(self, key: str, value: bytes) -> list:
+        """Insert into memory; returns the (key, value) pairs evicted to make room."""
+        old = self._data.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        self._data[key] = value
+        self._memory_bytes += len(value)
+        evicted = []
+        while self._memory_bytes > self.max_memory_bytes and len(self._data) > 1:
+            old_key, old_value = self._data.popitem(last=False)
+            self._memory_bytes -= len(old_value)
+            evicted.append((old_key, old_value))
+        return evicted
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+        try:
+            with open(self._path(key), "rb") as f:
+                value = f.read()
+            os.utime(self._path(key))  # recently read files are trimmed last
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.disk_hits += 1
+            evicted = self._store(key, value)
+        for old_key, old_value in evicted:
+            self._spill(old_key, old_value)
+        return value
+
+    def set(self, key: str, value: bytes) -> None:
+        with self._lock:
+            evicted = self._store(key, value)
+        for old_key, old_value in evicted:
+            self._spill(old_key, old_value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._memory_bytes = 0
+        for _, _, path in self._spill_files():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_entries": len(self._data),
+                "memory_bytes": self._memory_bytes,
+                "max_memory_bytes": self.max_memory_bytes,
+                "max_disk_bytes": self.max_disk_bytes,
+            }
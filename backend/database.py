@@ -1,24 +1,112 @@
 """
 Database Configuration (Hybrid: Postgres for Prod, SQLite for Dev)
 """
-from sqlalchemy import create_engine
+from fastapi import Depends, Request
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import NullPool
+from contextlib import asynccontextmanager
+from typing import Callable, List, Optional
+import asyncio
+import hashlib
+import itertools
+import logging
 import os
+import threading
+import weakref
 from dotenv import load_dotenv
 
+from cache import TTLCache
+
 load_dotenv()
 
-# Check for Vercel Postgres URL
-DATABASE_URL = os.getenv("POSTGRES_URL")
+logger = logging.getLogger("hrms.database")
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).lower() in ("1", "true", "yes")
+
+
+# Connection pool. "null" opens a connection per checkout and closes it on
+# return: for serverless instances that would otherwise each keep a pool open
+# against Postgres, and for an external pooler such as pgbouncer.
+DB_POOL = os.getenv("DB_POOL", "null" if os.environ.get("VERCEL") else "queue").lower()
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Recycle before typical server/load-balancer idle timeouts close connections under us
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = _env_flag("DB_POOL_PRE_PING", True)
+
+# Applied to every new SQLite connection. WAL lets readers proceed while a
+# writer commits; NORMAL sync is durable across crashes of the app in WAL mode
+# (only an OS crash or power loss can lose the last commits).
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA journal_mode = {SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+    finally:
+        cursor.close()
+
+
+def create_db_engine(url: str, **overrides) -> Engine:
+    """
+    Engine for `url` configured from the DB_* / SQLITE_* settings above;
+    keyword arguments override them (e.g. `poolclass` in tests and benchmarks).
+    """
+    if url.startswith("sqlite"):
+        options = {"connect_args": {"check_same_thread": False}}
+        in_memory = url in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in url
+        if not in_memory and DB_POOL != "null":
+            options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+        elif not in_memory:
+            options.update(poolclass=NullPool)
+        options.update(overrides)
+        engine = create_engine(url, **options)
+        if not in_memory:
+            event.listen(engine, "connect", _apply_sqlite_pragmas)
+        return engine
+
+    if DB_POOL == "null":
+        options = {"poolclass": NullPool}
+    else:
+        options = {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+            "pool_recycle": DB_POOL_RECYCLE,
+            "pool_pre_ping": DB_POOL_PRE_PING,
+        }
+    options.update(overrides)
+    return create_engine(url, **options)
+
+
+def normalize_url(url: str) -> str:
+    # Vercel provides postgres:// but SQLAlchemy needs postgresql://, and the
+    # driver we ship (psycopg2) is only SQLAlchemy's default before 2.1
+    for scheme in ("postgres://", "postgresql://"):
+        if url.startswith(scheme):
+            return url.replace(scheme, "postgresql+psycopg2://", 1)
+    return url
+
+
+# An explicit DATABASE_URL wins over the Vercel Postgres URL
+DATABASE_URL = os.getenv("DATABASE_URL") or os.getenv("POSTGRES_URL")
 
 if DATABASE_URL:
-    # Vercel provides postgres:// but SQLAlchemy needs postgresql://
-    if DATABASE_URL.startswith("postgres://"):
-        DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
-    
-    # Postgres Connection
-    engine = create_engine(DATABASE_URL)
+    DATABASE_URL = normalize_url(DATABASE_URL)
 else:
     # Use /tmp on Vercel serverless (read-only filesystem workaround) or local hrms.db
     if os.environ.get("VERCEL"):
@@ -26,18 +114,187 @@ else:
     else:
         DATABASE_URL = "sqlite:///./hrms.db"
 
-    # check_same_thread needed for SQLite
-    engine = create_engine(
-        DATABASE_URL, connect_args={"check_same_thread": False}
-    )
+engine = create_db_engine(DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+# INSERT constructs that support ON CONFLICT, by dialect name
+dialect_inserts = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+# Route handlers run on FastAPI's threadpool. A request keeps its connection
+# between threadpool hops (dependency -> handler -> response validation), so if
+# more requests hold sessions than the pool has connections, every worker thread
+# can end up blocked on checkout while the owners wait for a thread: a deadlock.
+# Admitting at most pool-capacity sessions at once (waiting on the event loop,
+# not on a thread) rules that out. Defaults to the pool's capacity; a null pool
+# has no fixed capacity, so the same figure then caps connections per process.
+DB_MAX_SESSIONS = int(os.getenv("DB_MAX_SESSIONS", str(DB_POOL_SIZE + DB_MAX_OVERFLOW)))
+
+_session_slots = weakref.WeakKeyDictionary()
+_replica_session_slots = weakref.WeakKeyDictionary()
+
+
+def _slots_for_running_loop(registry=_session_slots) -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    slots = registry.get(loop)
+    if slots is None:
+        slots = registry[loop] = asyncio.Semaphore(DB_MAX_SESSIONS)
+    return slots
+
+
+@asynccontextmanager
+async def session_scope():
+    """`async with session_scope() as db`: a session holding a DB_MAX_SESSIONS slot for the block only."""
+    async with _slots_for_running_loop():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+
+async def get_db():
+    # Async generator on purpose: setup and cleanup run on the event loop, so
+    # closing the session never has to queue for a free worker thread.
+    async with session_scope() as db:
         yield db
-    finally:
-        db.close()
+
+
+def get_session_scope():
+    """
+    Dependency for handlers that wait on slow non-database work between queries
+    (login waiting on bcrypt): they open short `session_scope()` blocks instead
+    of holding a session, and its slot, for the whole request.
+    """
+    return session_scope
+
+
+# Optional read replicas (comma-separated URLs). Read-only endpoints use one
+# whose replication lag is within REPLICA_MAX_LAG_SECONDS, else the primary.
+REPLICA_URLS = [url.strip() for url in os.getenv("POSTGRES_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_LAG_CHECK_SECONDS = float(os.getenv("REPLICA_LAG_CHECK_SECONDS", "2"))
+
+# 0 when everything received has been replayed (an idle primary looks like that
+# too); NULL on a server that is not a standby, also read as no lag.
+POSTGRES_REPLICATION_LAG = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+def replication_lag(conn) -> float:
+    """Seconds the server behind `conn` is behind its primary."""
+    if conn.dialect.name != "postgresql":
+        return 0.0
+    return float(conn.execute(POSTGRES_REPLICATION_LAG).scalar() or 0)
+
+
+class ReplicaSet:
+    """
+    Read replicas and their last measured lag. A background thread probes each
+    replica every `check_interval` seconds, so picking one for a request never
+    waits on the network; replicas that failed their last probe or lag more
+    than `max_lag` seconds are skipped.
+    """
+
+    def __init__(self, engines: List[Engine], max_lag: float = REPLICA_MAX_LAG_SECONDS,
+                 check_interval: float = REPLICA_LAG_CHECK_SECONDS,
+                 probe: Callable[..., float] = replication_lag):
+        self.engines = engines
+        self.sessions = [sessionmaker(autocommit=False, autoflush=False, bind=e) for e in engines]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.probe = probe
+        self.lags: List[Optional[float]] = [None] * len(engines)  # None: unknown or unreachable
+        self._turn = itertools.count()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def refresh(self) -> None:
+        for i, replica in enumerate(self.engines):
+            try:
+                with replica.connect() as conn:
+                    self.lags[i] = self.probe(conn)
+            except Exception:
+                logger.warning("Replica %s failed its lag check", replica.url.render_as_string(), exc_info=True)
+                self.lags[i] = None
+
+    def pick(self) -> Optional[sessionmaker]:
+        """Session factory of the next healthy replica (round robin), or None."""
+        healthy = [i for i, lag in enumerate(self.lags) if lag is not None and lag <= self.max_lag]
+        if not healthy:
+            return None
+        return self.sessions[healthy[next(self._turn) % len(healthy)]]
+
+    def start(self) -> None:
+        self.refresh()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="replica-lag-probe", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.check_interval):
+            self.refresh()
+
+
+replicas = ReplicaSet([create_db_engine(normalize_url(url)) for url in REPLICA_URLS]) if REPLICA_URLS else None
+
+# Clients (by Authorization header) that wrote within the last
+# REPLICA_MAX_LAG_SECONDS read from the primary, so they see their own writes
+recent_writers = TTLCache(maxsize=10000, ttl=REPLICA_MAX_LAG_SECONDS)
+
+
+def client_key(request: Request) -> Optional[str]:
+    authorization = request.headers.get("authorization")
+    return hashlib.sha256(authorization.encode()).hexdigest() if authorization else None
+
+
+class ReadYourWritesMiddleware:
+    """ASGI middleware recording clients whose write requests (non-GET) succeeded in `recent_writers`."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if replicas is None or scope["type"] != "http" or scope["method"] in ("GET", "HEAD", "OPTIONS"):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_and_remember(message):
+            # The handler has committed by the time its response starts
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                key = client_key(Request(scope))
+                if key:
+                    recent_writers.set(key, True)
+            await send(message)
+
+        await self.app(scope, receive, send_and_remember)
+
+
+async def get_read_db(request: Request, db: Session = Depends(get_db)):
+    """
+    Session for read-only endpoints: a replica within the lag budget, else the
+    request's primary session (no second connection is taken then).
+    """
+    key = client_key(request)
+    factory = None
+    if replicas is not None and not (key and recent_writers.get(key)):
+        factory = replicas.pick()
+    if factory is None:
+        yield db
+        return
+    async with _slots_for_running_loop(_replica_session_slots):
+        replica_db = factory()
+        try:
+            yield replica_db
+        finally:
+            replica_db.close()
@@ -0,0 +1,79 @@
+"""
+Attendance Exports (streamed, constant memory)
+
+Rows are read with `yield_per` (a server-side cursor on Postgres) and encoded in
+chunks as they arrive, so a year of company-wide attendance never sits in memory
+as a list. Streaming outlives the request's injected session, so each export
+opens its own session on the same engine and closes it when the stream ends.
+"""
+import csv
+import io
+import json
+from datetime import date
+from typing import Callable, Iterator, List, Optional
+
+from sqlalchemy import Select, and_, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from models import Attendance, User
+
+EXPORT_CHUNK_ROWS = 1000
+
+EXPORT_COLUMNS = [
+    "date", "user_id", "name", "department", "status", "in_time", "out_time", "work_minutes"
+]
+
+
+def attendance_export_query(
+    from_date: date,
+    to_date: date,
+    department: Optional[str] = None,
+    user_id: Optional[int] = None,
+) -> Select:
+    conditions = [Attendance.date >= from_date, Attendance.date <= to_date]
+    if department is not None:
+        conditions.append(User.department == department)
+    if user_id is not None:
+        conditions.append(Attendance.user_id == user_id)
+    return select(
+        Attendance.date, Attendance.user_id, User.name, User.department,
+        Attendance.status, Attendance.in_time, Attendance.out_time, Attendance.work_minutes
+    ).join(User, User.id == Attendance.user_id).where(and_(*conditions)).order_by(
+        Attendance.date, Attendance.user_id
+    )
+
+
+def _stream(bind: Engine, stmt: Select, encode: Callable[[List], str], header: str = "") -> Iterator[bytes]:
+    session = Session(bind=bind)
+    try:
+        if header:
+            yield header.encode()
+        result = session.execute(stmt.execution_options(yield_per=EXPORT_CHUNK_ROWS))
+        for rows in result.partitions():
+            yield encode(rows).encode()
+    finally:
+        session.close()
+
+
+def _value(value):
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+def stream_attendance_csv(bind: Engine, stmt: Select) -> Iterator[bytes]:
+    def encode(rows) -> str:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerows([_value(v) if v is not None else "" for v in row] for row in rows)
+        return buffer.getvalue()
+
+    return _stream(bind, stmt, encode, header=",".join(EXPORT_COLUMNS) + "\r\n")
+
+
+def stream_attendance_ndjson(bind: Engine, stmt: Select) -> Iterator[bytes]:
+    def encode(rows) -> str:
+        return "".join(
+            json.dumps(dict(zip(EXPORT_COLUMNS, map(_value, row)))) + "\n" for row in rows
+        )
+
+    return _stream(bind, stmt, encode)
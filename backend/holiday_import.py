@@ -0,0 +1,162 @@
+"""
+Holiday Calendar Import (iCal or CSV)
+
+A year's holidays are uploaded as one file and applied in one transaction:
+entries are upserted by date and, when a `year` is given, that year's holidays
+missing from the file are removed, so re-importing a corrected calendar is safe.
+
+iCal support covers what calendar apps export for holidays: all-day (or timed)
+`VEVENT`s with `DTSTART`, optional `DTEND`, `SUMMARY` and `DESCRIPTION`. Multi-day
+events become one holiday per day; recurrence rules are not expanded.
+"""
+import csv
+import io
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, select
+from sqlalchemy.orm import Session
+
+from database import dialect_inserts
+from models import Holiday
+from work_calendar import invalidate_calendar
+
+MAX_EVENT_DAYS = 31
+
+
+class HolidayFileError(ValueError):
+    """The uploaded calendar could not be parsed; the message names the offending line."""
+
+
+@dataclass
+class HolidayEntry:
+    date: date
+    name: str
+    description: Optional[str] = None
+
+
+def _ical_date(value: str, line: int) -> date:
+    # 20250314 or 20250314T000000[Z]; only the calendar day matters for a holiday
+    try:
+        return date(int(value[0:4]), int(value[4:6]), int(value[6:8]))
+    except ValueError:
+        raise HolidayFileError(f"Line {line}: invalid date {value!r}")
+
+
+def _ical_text(value: str) -> str:
+    return (value.replace("\\n", "\n").replace("\\N", "\n")
+            .replace("\\,", ",").replace("\\;", ";").replace("\\\\", "\\").strip())
+
+
+def _unfold(text: str) -> List[Tuple[int, str]]:
+    """Physical lines -> (line number, logical line); continuation lines start with a space or tab."""
+    lines = []
+    for number, raw in enumerate(text.splitlines(), start=1):
+        if raw[:1] in (" ", "\t") and lines:
+            lines[-1] = (lines[-1][0], lines[-1][1] + raw[1:])
+        elif raw.strip():
+            lines.append((number, raw))
+    return lines
+
+
+def parse_ical(text: str) -> List[HolidayEntry]:
+    entries = []
+    event: Optional[Dict[str, Tuple[int, str]]] = None
+    for number, line in _unfold(text):
+        name, _, value = line.partition(":")
+        name = name.split(";")[0].upper()
+        if name == "BEGIN" and value.upper() == "VEVENT":
+            event = {"BEGIN": (number, value)}
+        elif name == "END" and value.upper() == "VEVENT" and event is not None:
+            entries += _ical_event(event)
+            event = None
+        elif event is not None:
+            event.setdefault(name, (number, value))
+    return entries
+
+
+def _ical_event(event: Dict[str, Tuple[int, str]]) -> List[HolidayEntry]:
+    begin_line = event["BEGIN"][0]
+    if "DTSTART" not in event:
+        raise HolidayFileError(f"Line {begin_line}: event without DTSTART")
+    if "SUMMARY" not in event or not _ical_text(event["SUMMARY"][1]):
+        raise HolidayFileError(f"Line {begin_line}: event without SUMMARY")
+    start = _ical_date(event["DTSTART"][1], event["DTSTART"][0])
+    days = 1
+    if "DTEND" in event:
+        # DTEND is exclusive, so a one-day all-day event ends on the next day
+        days = max(1, (_ical_date(event["DTEND"][1], event["DTEND"][0]) - start).days)
+        if days > MAX_EVENT_DAYS:
+            raise HolidayFileError(f"Line {event['DTEND'][0]}: event longer than {MAX_EVENT_DAYS} days")
+    name = _ical_text(event["SUMMARY"][1])
+    description = _ical_text(event["DESCRIPTION"][1]) if "DESCRIPTION" in event else None
+    return [HolidayEntry(start + timedelta(days=i), name, description or None) for i in range(days)]
+
+
+def parse_holiday_csv(text: str) -> List[HolidayEntry]:
+    """Rows of date (YYYY-MM-DD), name and optional description, with a header row."""
+    reader = csv.DictReader(io.StringIO(text))
+    if not reader.fieldnames or not {"date", "name"} <= {f.strip().lower() for f in reader.fieldnames}:
+        raise HolidayFileError("Line 1: header must contain date and name columns")
+    entries = []
+    for record in reader:
+        if None in record:
+            # DictReader keeps fields beyond the header as a list under None
+            raise HolidayFileError(f"Line {reader.line_num}: more fields than the header has columns")
+        record = {k.strip().lower(): (v or "").strip() for k, v in record.items()}
+        try:
+            day = date.fromisoformat(record["date"])
+        except ValueError:
+            raise HolidayFileError(f"Line {reader.line_num}: invalid date {record['date']!r}")
+        if not record["name"]:
+            raise HolidayFileError(f"Line {reader.line_num}: missing name")
+        entries.append(HolidayEntry(day, record["name"], record.get("description") or None))
+    return entries
+
+
+def parse_holiday_file(content: bytes, ical: bool) -> List[HolidayEntry]:
+    try:
+        text = content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HolidayFileError("Holiday file must be UTF-8 text")
+    entries = parse_ical(text) if ical else parse_holiday_csv(text)
+    seen = set()
+    for entry in entries:
+        if entry.date in seen:
+            raise HolidayFileError(f"More than one holiday on {entry.date}")
+        seen.add(entry.date)
+    return entries
+
+
+def import_holidays(db: Session, entries: List[HolidayEntry], year: Optional[int] = None) -> Dict[str, int]:
+    """
+    Upsert `entries` by date and, for a `year`, delete that year's other holidays,
+    all in one transaction. Returns created/updated/removed counts.
+    """
+    if year is not None:
+        outside = [e.date for e in entries if e.date.year != year]
+        if outside:
+            raise HolidayFileError(f"{outside[0]} is not in {year}")
+
+    dates = [e.date for e in entries]
+    existing = set(db.scalars(select(Holiday.date).where(Holiday.date.in_(dates)))) if dates else set()
+    removed = 0
+    if year is not None:
+        removed = db.execute(delete(Holiday).where(and_(
+            Holiday.date >= date(year, 1, 1),
+            Holiday.date <= date(year, 12, 31),
+            Holiday.date.not_in(dates)
+        )).execution_options(synchronize_session=False)).rowcount
+    if entries:
+        stmt = dialect_inserts[db.get_bind().dialect.name](Holiday).values([
+            {"date": e.date, "name": e.name, "description": e.description} for e in entries
+        ])
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["date"],
+            set_={"name": stmt.excluded.name, "description": stmt.excluded.description}
+        ))
+    db.commit()
+    # Core statements bypass the Holiday mapper events
+    invalidate_calendar()
+    return {"created": len(dates) - len(existing), "updated": len(existing), "removed": removed}
@@ -0,0 +1,65 @@
+"""
+Leave Intervals (overlap checks, who is off today, the team leave calendar)
+
+"Which leaves share a day with `start..end`?" is an interval query. The plain
+`start_date <= end AND end_date >= start` predicate can only use an index on one
+of its two bounds, so with years of history it scans every older leave.
+
+* Postgres: a GiST index on `daterange(start_date, end_date, '[]')`, queried with
+  the range overlap operator `&&`.
+* SQLite (no range types): the B-tree on (status, start_date, end_date) with a
+  lower bound on start_date as well. An overlapping leave cannot start more than
+  the longest stored span before `start`. That span is read from the database
+  once per session (so leaves written by other worker processes or by bulk SQL
+  are seen by the next request) and re-read after the session flushes a leave;
+  the `ix_leaves_span` expression index makes each read a single index seek
+  rather than a scan of every leave.
+"""
+from datetime import date, timedelta
+
+from sqlalchemy import and_, event, func, literal, literal_column, select
+from sqlalchemy.orm import Session
+
+from models import Leave
+
+# Session.info key holding the session's longest_leave_span
+_SPAN_KEY = "longest_leave_span"
+
+
+def leave_period(start, end):
+    """Inclusive Postgres daterange; matches the expression of the ix_leaves_period index."""
+    return func.daterange(start, end, literal_column("'[]'"))
+
+
+def leave_span(dialect_name: str):
+    """`end_date - start_date` in days; on SQLite, the expression of the ix_leaves_span index."""
+    if dialect_name == "sqlite":
+        return func.julianday(Leave.end_date) - func.julianday(Leave.start_date)
+    return Leave.end_date - Leave.start_date
+
+
+def longest_leave_span(db: Session) -> int:
+    """Longest span (in days) of any stored leave; one indexed query per session."""
+    if _SPAN_KEY not in db.info:
+        span = leave_span(db.get_bind().dialect.name)
+        db.info[_SPAN_KEY] = int(db.scalar(select(func.max(span))) or 0)
+    return db.info[_SPAN_KEY]
+
+
+def overlaps(db: Session, start: date, end: date):
+    """SQL condition: the leave covers at least one day of `start..end` (both inclusive)."""
+    if db.get_bind().dialect.name == "postgresql":
+        return leave_period(Leave.start_date, Leave.end_date).op("&&")(
+            leave_period(literal(start), literal(end))
+        )
+    return and_(
+        Leave.start_date >= start - timedelta(days=longest_leave_span(db)),
+        Leave.start_date <= end,
+        Leave.end_date >= start
+    )
+
+
+@event.listens_for(Session, "after_flush")
+def _leaves_flushed(session: Session, flush_context) -> None:
+    if any(isinstance(obj, Leave) for obj in (*session.new, *session.dirty)):
+        session.info.pop(_SPAN_KEY, None)
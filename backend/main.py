@@ -2,21 +2,46 @@
 HRMS Backend - FastAPI Application
 High-performance Python backend with Hybrid Database (Postgres/SQLite)
 """
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, File, HTTPException, Path, Query, Request, Response, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from fastapi.responses import StreamingResponse
+from fastapi.security import APIKeyHeader, OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import and_, or_, event, func, inspect, select
 from datetime import datetime, date, time, timedelta
 from typing import Optional, List
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, computed_field
 from jose import JWTError, jwt
-from passlib.context import CryptContext
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import base64
+import hashlib
+import hmac
+import json
 import logging
+import os
+import tempfile
 
 # New imports
-from database import get_db, engine, Base, SessionLocal
-from models import User, Attendance, Leave, Holiday, UserRole, LeaveStatus
+from database import get_db, get_read_db, get_session_scope, engine, SessionLocal, ReadYourWritesMiddleware, replicas
+from models import User, Attendance, AttendanceRollup, Leave, Holiday, UserRole, LeaveStatus
+from cache import TTLCache, SpillingLRUCache
+from passwords import verify_and_update, password_pool
+from workers import PoolSaturated
+from migrations import migrate, record_schema_version, schema_is_current
+from attendance import PunchRejected, open_shift, close_shift, parse_punch_file, replay_punches
+from punch_queue import PunchQueueFull, punch_queue
+from exports import attendance_export_query, stream_attendance_csv, stream_attendance_ndjson
+from analytics_export import COLUMNAR_FORMATS, DATASET_COLUMNS, ColumnarExportUnavailable, require_pyarrow, stream_dataset
+from rollup import attended_days_query
+from work_calendar import WorkCalendar, get_calendar
+from holiday_import import HolidayFileError, import_holidays, parse_holiday_file
+from leave_calendar import overlaps
+from payroll import finalize_payroll, get_month_payslips, get_payslip, previous_month, parse_month
+from payslip_pdf import (
+    render_payslip_pdf, render_many, stream_zip, payslip_filename, pdf_pool, PDF_TIMEOUT_SECONDS, PDF_WORKERS
+)
 
 # ============================================================
 # Configuration
@@ -26,8 +51,40 @@ SECRET_KEY = "hrms-super-secret-key-change-in-production-2024"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 480  # 8 hours
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
+
+# bcrypt hashes (12 rounds) of the demo passwords "admin123" and "user123", so
+# seeding an empty database does no hashing; a login re-hashes them if
+# BCRYPT_ROUNDS is set to a different cost
+SEED_ADMIN_PASSWORD_HASH = "$2b$12$wcIkidGULhMzRqyIMfPmXuahmulXPNfJgoG2vzgFor16Omd9zM3mi"
+SEED_EMPLOYEE_PASSWORD_HASH = "$2b$12$rVwuyykuO3CDehNiHI4YQuJ6guNRSFTfDxDmoO6II9mnkmPqxPLU6"
+
+# Shared secret that lets offline badge kiosks upload punches without a user token (unset = admins only)
+PUNCH_DEVICE_KEY = os.getenv("PUNCH_DEVICE_KEY")
+device_key_header = APIKeyHeader(name="X-Device-Key", auto_error=False)
+PUNCH_UPLOAD_MAX_ROWS = int(os.getenv("PUNCH_UPLOAD_MAX_ROWS", "100000"))
+
+# Browsers and other services may reuse a year's holiday list this long before revalidating its ETag
+HOLIDAYS_CACHE_MAX_AGE_SECONDS = int(os.getenv("HOLIDAYS_CACHE_MAX_AGE_SECONDS", "3600"))
+
+# Authenticated users keyed by token subject (email); saves a users lookup per request
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "1024"))
+principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL_SECONDS)
+
+# Dashboard snapshots are invalidated by the write paths that change them; the
+# TTL only bounds staleness from writes handled by other worker processes.
+DASHBOARD_CACHE_TTL_SECONDS = float(os.getenv("DASHBOARD_CACHE_TTL_SECONDS", "60"))
+dashboard_cache = TTLCache(maxsize=4096, ttl=DASHBOARD_CACHE_TTL_SECONDS)
+
+# Rendered payslip PDFs keyed by user/month/content hash; overflow spills to disk
+PAYSLIP_CACHE_DIR = os.getenv("PAYSLIP_CACHE_DIR", os.path.join(tempfile.gettempdir(), "hrms-payslip-cache"))
+PAYSLIP_CACHE_MEMORY_BYTES = int(os.getenv("PAYSLIP_CACHE_MEMORY_BYTES", str(32 * 1024 * 1024)))
+PAYSLIP_CACHE_DISK_BYTES = int(os.getenv("PAYSLIP_CACHE_DISK_BYTES", str(256 * 1024 * 1024)))
+payslip_pdf_cache = SpillingLRUCache(
+    PAYSLIP_CACHE_DIR, max_memory_bytes=PAYSLIP_CACHE_MEMORY_BYTES, max_disk_bytes=PAYSLIP_CACHE_DISK_BYTES
+)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -77,16 +134,24 @@ class EmployeeCreate(BaseModel):
     phone: Optional[str] = None
 
 class AttendanceResponse(BaseModel):
-    id: int
+    id: Optional[int]  # None while a punch is still queued (write-behind mode)
     date: date
     status: str
     in_time: Optional[time]
     out_time: Optional[time]
-    work_hours: Optional[str]
+    work_minutes: Optional[int] = None
     
     class Config:
         from_attributes = True
 
+    @computed_field
+    @property
+    def work_hours(self) -> Optional[str]:
+        """Display form of work_minutes, e.g. '8h 45m'."""
+        if self.work_minutes is None:
+            return None
+        return f"{self.work_minutes // 60}h {self.work_minutes % 60}m"
+
 class LeaveCreate(BaseModel):
     start_date: date
     end_date: date
@@ -103,6 +168,7 @@ class LeaveResponse(BaseModel):
     applied_at: datetime
     user_id: int
     user_name: Optional[str] = None
+    working_days: Optional[int] = None
     
     class Config:
         from_attributes = True
@@ -110,6 +176,36 @@ class LeaveResponse(BaseModel):
 class LeaveStatusUpdate(BaseModel):
     status: str
 
+class LeaveCalendarEntry(BaseModel):
+    leave_id: int
+    user_id: int
+    name: str
+    department: Optional[str] = None
+    start_date: date
+    end_date: date
+    leave_type: str
+    status: str
+    working_days_in_range: int
+
+class HolidayCreate(BaseModel):
+    name: str
+    date: date
+    description: Optional[str] = None
+
+class HolidayResponse(BaseModel):
+    id: int
+    name: str
+    date: date
+    description: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+class HolidayImportResponse(BaseModel):
+    created: int
+    updated: int
+    removed: int
+
 class DashboardStats(BaseModel):
     attendance_percentage: float
     pending_leaves: int
@@ -118,6 +214,33 @@ class DashboardStats(BaseModel):
     present_today: int
     on_leave_today: int
 
+class HoursWorked(BaseModel):
+    user_id: Optional[int] = None
+    name: Optional[str] = None
+    department: Optional[str] = None
+    month: Optional[str] = None
+    shifts: int
+    total_minutes: int
+    total_hours: float
+    average_shift_minutes: float
+    overtime_minutes: int
+
+class PunchResult(BaseModel):
+    line: int
+    user_id: Optional[int]
+    timestamp: Optional[datetime]
+    direction: Optional[str]
+    accepted: bool
+    detail: Optional[str]
+
+    class Config:
+        from_attributes = True
+
+class PunchUploadResponse(BaseModel):
+    accepted: int
+    rejected: int
+    results: List[PunchResult]
+
 class PayrollResponse(BaseModel):
     user_id: int
     name: str
@@ -129,6 +252,12 @@ class PayrollResponse(BaseModel):
     absent_days: int
     working_days: int
 
+class PayrollRunResponse(BaseModel):
+    month: str
+    employee_count: int
+    total_net_salary: float
+    payslips: List[PayrollResponse]
+
 # ============================================================
 # FastAPI App Setup
 # ============================================================
@@ -150,10 +279,18 @@ tags_metadata = [
         "name": "Leave Management",
         "description": "Employee leave submissions, conflict/overlap prevention, and administrator review/approval workflows.",
     },
+    {
+        "name": "Holidays",
+        "description": "Company holiday calendar: public year listing with HTTP caching, admin CRUD and iCal/CSV import.",
+    },
     {
         "name": "Payroll & Payslips",
         "description": "Previous-month boundary salary calculation, tax deductions, and ReportLab PDF payslip generation.",
     },
+    {
+        "name": "Analytics",
+        "description": "Bulk Parquet / Arrow IPC exports of attendance, leaves, users and computed payroll for analytics tools.",
+    },
     {
         "name": "System & Database",
         "description": "Database initialization and demo account seeding endpoint for cloud environments.",
@@ -189,18 +326,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Readable by the frontend: the /leaves pagination cursor
+    expose_headers=["X-Next-Cursor"],
 )
+# With read replicas configured, clients read from the primary for a while after a write
+app.add_middleware(ReadYourWritesMiddleware)
 
 # ============================================================
 # Helper Functions
 # ============================================================
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
-
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta if expires_delta else timedelta(minutes=15))
@@ -210,15 +345,13 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
 def get_user_by_email(db: Session, email: str) -> Optional[User]:
     return db.query(User).filter(User.email == email).first()
 
-def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
-    user = get_user_by_email(db, email)
-    if not user:
-        return None
-    if not verify_password(password, user.hashed_password):
-        return None
-    return user
+def store_password_hash(db: Session, user_id: int, hashed_password: str) -> None:
+    user = db.get(User, user_id)
+    if user is not None:
+        user.hashed_password = hashed_password
+        db.commit()
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -232,12 +365,61 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     except JWTError:
         raise credentials_exception
     
-    user = get_user_by_email(db, email)
+    user = principal_cache.get(email)
     if user is None:
-        raise credentials_exception
-    return user
-
-async def get_admin_user(current_user: User = Depends(get_current_user)) -> User:
+        user = get_user_by_email(db, email)
+        if user is None:
+            raise credentials_exception
+        # Cache a detached copy; each request gets its own session-bound instance
+        db.expunge(user)
+        principal_cache.set(email, user)
+    return db.merge(user, load=False)
+
+# Session.info key: emails whose cached principals this transaction has made stale
+_PRINCIPALS_KEY = "stale_principals"
+
+@event.listens_for(Session, "after_flush")
+def _principals_flushed(session: Session, flush_context) -> None:
+    """Collect the emails of users whose row (role, salary, profile) changed in this flush."""
+    changed = [obj for obj in session.dirty if isinstance(obj, User) and session.is_modified(obj)]
+    changed += [obj for obj in session.deleted if isinstance(obj, User)]
+    if changed:
+        stale = session.info.setdefault(_PRINCIPALS_KEY, set())
+        for user in changed:
+            stale.add(user.email)
+            stale.update(inspect(user).attrs.email.history.deleted)
+
+@event.listens_for(Session, "after_commit")
+def invalidate_principal(session: Session) -> None:
+    """Drop the cached principals once the change is visible to other sessions."""
+    for email in session.info.pop(_PRINCIPALS_KEY, ()):
+        principal_cache.invalidate(email)
+
+@event.listens_for(Session, "after_rollback")
+def _principals_rolled_back(session: Session) -> None:
+    session.info.pop(_PRINCIPALS_KEY, None)
+
+# Session.info flag: this transaction has flushed user inserts, updates or deletes
+_HEADCOUNT_KEY = "headcount_changed"
+
+@event.listens_for(Session, "after_flush")
+def _headcount_flushed(session: Session, flush_context) -> None:
+    """Employee creation, removal or role changes alter the company headcount."""
+    if any(isinstance(obj, User) for obj in (*session.new, *session.deleted)) or any(
+        isinstance(obj, User) and session.is_modified(obj) for obj in session.dirty
+    ):
+        session.info[_HEADCOUNT_KEY] = True
+
+@event.listens_for(Session, "after_commit")
+def invalidate_dashboard_headcount(session: Session) -> None:
+    if session.info.pop(_HEADCOUNT_KEY, False):
+        invalidate_dashboard()
+
+@event.listens_for(Session, "after_rollback")
+def _headcount_rolled_back(session: Session) -> None:
+    session.info.pop(_HEADCOUNT_KEY, None)
+
+def get_admin_user(current_user: User = Depends(get_current_user)) -> User:
     if current_user.role != UserRole.ADMIN.value:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -245,6 +427,22 @@ async def get_admin_user(current_user: User = Depends(get_current_user)) -> User
         )
     return current_user
 
+def get_punch_uploader(
+    device_key: Optional[str] = Depends(device_key_header),
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+    db: Session = Depends(get_db)
+) -> Optional[User]:
+    """An admin, or a time-clock device presenting PUNCH_DEVICE_KEY (returns None)."""
+    if PUNCH_DEVICE_KEY and device_key and hmac.compare_digest(device_key, PUNCH_DEVICE_KEY):
+        return None
+    if token is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return get_admin_user(get_current_user(token, db))
+
 # ============================================================
 # Startup Seeding (For Render Ephemeral Disk)
 # ============================================================
@@ -253,11 +451,16 @@ async def get_admin_user(current_user: User = Depends(get_current_user)) -> User
 def startup_db_check():
     """
     Check if DB is empty on startup (Render restarts wipe disk if using SQLite).
-    If empty, seed initial data.
+    If empty, seed initial data. A database already migrated to the current
+    models (see migrations.py) costs a single SELECT here.
     """
+    if schema_is_current(engine):
+        # The coming months' attendance partitions come from the monthly `python partitions.py` job
+        logger.info("Database already initialized.")
+        return
     db = SessionLocal()
     try:
-        Base.metadata.create_all(bind=engine)
+        migrate(engine)
         
         # Check if Admin exists
         if not db.query(User).filter(User.email == "admin@hrms.com").first():
@@ -267,7 +470,7 @@ def startup_db_check():
             admin = User(
                 email="admin@hrms.com",
                 name="Admin User",
-                hashed_password=get_password_hash("admin123"),
+                hashed_password=SEED_ADMIN_PASSWORD_HASH,
                 role=UserRole.ADMIN.value,
                 department="Management",
                 position="HR Administrator",
@@ -279,7 +482,7 @@ def startup_db_check():
             employee = User(
                 email="employee@hrms.com",
                 name="John Employee",
-                hashed_password=get_password_hash("user123"),
+                hashed_password=SEED_EMPLOYEE_PASSWORD_HASH,
                 role=UserRole.EMPLOYEE.value,
                 department="Engineering",
                 position="Software Developer",
@@ -298,83 +501,53 @@ def startup_db_check():
                     status="Present",
                     in_time=time(9,0),
                     out_time=time(18,0),
-                    work_hours="9h 0m"
+                    work_minutes=9 * 60
                 ))
             db.commit()
             logger.info("Seeding complete!")
         else:
             logger.info("Database already initialized.")
-            
+        record_schema_version(engine)
+
     except Exception as e:
         logger.error(f"Startup Seeding Failed: {e}")
     finally:
         db.close()
 
+@app.on_event("startup")
+def start_punch_queue():
+    if punch_queue is not None:
+        punch_queue.start(engine, on_flush=lambda user_ids: [invalidate_dashboard(u) for u in user_ids])
 
+@app.on_event("startup")
+def start_replica_lag_probe():
+    if replicas is not None:
+        replicas.start()
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
-
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
-    to_encode = data.copy()
-    expire = datetime.utcnow() + (expires_delta if expires_delta else timedelta(minutes=15))
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-
-def get_user_by_email(db: Session, email: str) -> Optional[User]:
-    return db.query(User).filter(User.email == email).first()
-
-def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
-    user = get_user_by_email(db, email)
-    if not user:
-        return None
-    if not verify_password(password, user.hashed_password):
-        return None
-    return user
-
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    
-    user = get_user_by_email(db, email)
-    if user is None:
-        raise credentials_exception
-    return user
+@app.on_event("shutdown")
+def shutdown_worker_pools():
+    if punch_queue is not None:
+        punch_queue.stop()
+    if replicas is not None:
+        replicas.stop()
+    password_pool.shutdown()
+    pdf_pool.shutdown()
 
-async def get_admin_user(current_user: User = Depends(get_current_user)) -> User:
-    if current_user.role != UserRole.ADMIN.value:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Admin access required"
-        )
-    return current_user
 
 # ============================================================
 # Database Initialization Endpoint
 # ============================================================
 
 @app.get("/init-db", tags=["System & Database"], summary="Initialize Database and Seed Initial Accounts")
-async def init_database(db: Session = Depends(get_db)):
+def init_database(db: Session = Depends(get_db)):
     """
     Initialize database tables and seed data.
     Useful for Vercel deployment where we can't run terminal commands easily.
     """
     try:
         # Create Tables
-        Base.metadata.create_all(bind=engine)
+        migrate(engine)
+        record_schema_version(engine)
         
         # Check if initialized
         if db.query(User).count() > 0:
@@ -384,7 +557,7 @@ async def init_database(db: Session = Depends(get_db)):
         admin = User(
             email="admin@hrms.com",
             name="Admin User",
-            hashed_password=get_password_hash("admin123"),
+            hashed_password=SEED_ADMIN_PASSWORD_HASH,
             role=UserRole.ADMIN.value,
             department="Management",
             position="HR Administrator",
@@ -396,7 +569,7 @@ async def init_database(db: Session = Depends(get_db)):
         employee = User(
             email="employee@hrms.com",
             name="John Employee",
-            hashed_password=get_password_hash("user123"),
+            hashed_password=SEED_EMPLOYEE_PASSWORD_HASH,
             role=UserRole.EMPLOYEE.value,
             department="Engineering",
             position="Software Developer",
@@ -411,14 +584,45 @@ async def init_database(db: Session = Depends(get_db)):
         logger.error(f"Init DB Error: {e}")
         return {"error": str(e)}
 
+@app.get("/system/cache-stats", tags=["System & Database"], summary="In-Process Cache Hit/Miss Counters (Admin Only)")
+def get_cache_stats(admin: User = Depends(get_admin_user)):
+    return {
+        "principal": principal_cache.stats(),
+        "dashboard": dashboard_cache.stats(),
+        "payslip_pdf": payslip_pdf_cache.stats(),
+    }
+
 # ============================================================
 # Endpoints (Restored SQLAlchemy Logic)
 # ============================================================
+# Handlers and dependencies are plain `def` on purpose: the SQLAlchemy
+# Session is synchronous, so FastAPI runs them on its worker threadpool
+# instead of blocking the event loop on every database round trip.
 
+# The one async handler: the bcrypt wait happens between two short sessions, so
+# a burst of logins queues on the bcrypt pool (and gets its 503s) instead of
+# holding every DB_MAX_SESSIONS slot. Blocking calls go to the threadpool.
 @app.post("/token", response_model=Token, tags=["Authentication"], summary="Login and Obtain JWT Access Token")
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = authenticate_user(db, form_data.username, form_data.password)
-    if not user:
+async def login_for_access_token(
+    form_data: OAuth2PasswordRequestForm = Depends(), session_scope=Depends(get_session_scope)
+):
+    async with session_scope() as db:
+        user = await run_in_threadpool(get_user_by_email, db, form_data.username)
+    matches = False
+    if user is not None:
+        try:
+            matches, new_hash = await run_in_threadpool(verify_and_update, form_data.password, user.hashed_password)
+        except (PoolSaturated, FutureTimeoutError):
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many concurrent logins, please retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        if matches and new_hash:
+            # Stored hash uses an outdated bcrypt cost; upgrade it transparently
+            async with session_scope() as db:
+                await run_in_threadpool(store_password_hash, db, user.id, new_hash)
+    if not matches:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -439,64 +643,126 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
         "email": user.email
     }
 
-@app.get("/dashboard/stats", response_model=DashboardStats, tags=["Dashboard Metrics"], summary="Get Role-Scoped Dashboard Statistics")
-async def get_dashboard_stats(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def _company_kpi_columns(db: Session, today: date, since: date) -> list:
+    return [
+        select(func.count(User.id)).where(User.role == UserRole.EMPLOYEE.value)
+            .scalar_subquery().label("total_employees"),
+        attended_days_query(since, today).scalar_subquery().label("company_attendance"),
+        select(func.count(Leave.id)).where(Leave.status == LeaveStatus.PENDING.value)
+            .scalar_subquery().label("company_pending"),
+        select(func.count(Attendance.id)).where(and_(
+            Attendance.date == today,
+            Attendance.status == "Present"
+        )).scalar_subquery().label("present_today"),
+        select(func.count(Leave.id)).where(and_(
+            Leave.status == LeaveStatus.APPROVED.value,
+            overlaps(db, today, today)
+        )).scalar_subquery().label("on_leave_today"),
+    ]
+
+def _personal_kpi_columns(user_id: int, today: date, since: date) -> list:
+    return [
+        attended_days_query(since, today).where(AttendanceRollup.user_id == user_id)
+            .scalar_subquery().label("attendance"),
+        select(func.count(Leave.id)).where(and_(
+            Leave.user_id == user_id,
+            Leave.status == LeaveStatus.PENDING.value
+        )).scalar_subquery().label("pending"),
+    ]
+
+def invalidate_dashboard(user_id: Optional[int] = None) -> None:
+    """Drop the company-wide snapshot and, when given, one employee's personal snapshot."""
+    today = date.today()
+    dashboard_cache.invalidate(("company", today))
+    if user_id is not None:
+        dashboard_cache.invalidate(("user", user_id, today))
+
+def compute_dashboard_stats(db: Session, current_user: User, read_db: Optional[Session] = None) -> DashboardStats:
+    """
+    Dashboard KPIs from write-invalidated snapshots: one company-wide snapshot
+    (headcount, today's presence/leave, admin-scope totals) shared by everyone,
+    plus a per-employee snapshot of their own figures. Whatever is missing is
+    rebuilt in a single SELECT of scalar subqueries, on `read_db` (a replica)
+    when given. Working days and the next holiday come from the cached work
+    calendar, which is always loaded from the primary.
+    """
+    read_db = read_db or db
     today = date.today()
     thirty_days_ago = today - timedelta(days=30)
-    
-    if current_user.role == UserRole.ADMIN.value:
-        total_employees = db.query(User).filter(User.role == UserRole.EMPLOYEE.value).count()
-        total_attendance = db.query(Attendance).filter(Attendance.date >= thirty_days_ago).count()
-        working_days = 22
-        expected = total_employees * working_days if total_employees > 0 else 1
-        att_pct = min(100, (total_attendance / expected) * 100)
+    is_admin = current_user.role == UserRole.ADMIN.value
+
+    company = dashboard_cache.get(("company", today))
+    personal = None if is_admin else dashboard_cache.get(("user", current_user.id, today))
+
+    columns = []
+    if company is None:
+        columns += _company_kpi_columns(read_db, today, thirty_days_ago)
+    if not is_admin and personal is None:
+        columns += _personal_kpi_columns(current_user.id, today, thirty_days_ago)
+    if columns:
+        row = read_db.execute(select(*columns)).one()._mapping
+        if company is None:
+            company = {
+                "total_employees": row["total_employees"],
+                "attendance": row["company_attendance"],
+                "pending": row["company_pending"],
+                "present_today": row["present_today"],
+                "on_leave_today": row["on_leave_today"],
+            }
+            dashboard_cache.set(("company", today), company)
+        if not is_admin and personal is None:
+            personal = {"attendance": row["attendance"], "pending": row["pending"]}
+            dashboard_cache.set(("user", current_user.id, today), personal)
+
+    work_calendar = get_calendar(db)
+    working_days = max(1, work_calendar.working_days_between(thirty_days_ago, today))
+    next_holiday = work_calendar.next_holiday(today)
+    if is_admin:
+        expected = company["total_employees"] * working_days if company["total_employees"] > 0 else 1
+        att_pct = min(100, (company["attendance"] / expected) * 100)
+        pending = company["pending"]
     else:
-        total_employees = 1
-        user_att = db.query(Attendance).filter(and_(
-            Attendance.user_id == current_user.id,
-            Attendance.date >= thirty_days_ago
-        )).count()
-        att_pct = min(100, (user_att / 22) * 100)
-    
-    # Pending Leaves
-    if current_user.role == UserRole.ADMIN.value:
-        pending = db.query(Leave).filter(Leave.status == LeaveStatus.PENDING.value).count()
-    else:
-        pending = db.query(Leave).filter(and_(
-            Leave.user_id == current_user.id,
-            Leave.status == LeaveStatus.PENDING.value
-        )).count()
-    
-    # Next Holiday
-    next_nav = db.query(Holiday).filter(Holiday.date >= today).order_by(Holiday.date).first()
-    next_holiday_str = f"{next_nav.name} ({next_nav.date.strftime('%b %d, %Y')})" if next_nav else None
-
-    # Present Today
-    present_today = db.query(Attendance).filter(and_(
-        Attendance.date == today,
-        Attendance.status == "Present"
-    )).count()
-    
-    # On Leave Today
-    on_leave_today = db.query(Leave).filter(and_(
-        Leave.start_date <= today,
-        Leave.end_date >= today,
-        Leave.status == LeaveStatus.APPROVED.value
-    )).count()
-    
-    total_emp_count = db.query(User).filter(User.role == UserRole.EMPLOYEE.value).count()
+        att_pct = min(100, (personal["attendance"] / working_days) * 100)
+        pending = personal["pending"]
 
     return DashboardStats(
         attendance_percentage=round(att_pct, 1),
         pending_leaves=pending,
-        next_holiday=next_holiday_str,
-        total_employees=total_emp_count,
-        present_today=present_today,
-        on_leave_today=on_leave_today
+        next_holiday=f"{next_holiday[1]} ({next_holiday[0].strftime('%b %d, %Y')})" if next_holiday else None,
+        total_employees=company["total_employees"],
+        present_today=company["present_today"],
+        on_leave_today=company["on_leave_today"]
+    )
+
+@app.get("/dashboard/stats", response_model=DashboardStats, tags=["Dashboard Metrics"], summary="Get Role-Scoped Dashboard Statistics")
+def get_dashboard_stats(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    read_db: Session = Depends(get_read_db)
+):
+    return compute_dashboard_stats(db, current_user, read_db)
+
+def queued_punch(response: Response, punch) -> AttendanceResponse:
+    """202 acknowledgement of a write-behind punch; the row is written within a flush interval."""
+    response.status_code = status.HTTP_202_ACCEPTED
+    return AttendanceResponse(
+        id=None,
+        date=punch.date,
+        status=punch.status,
+        in_time=punch.in_time,
+        out_time=punch.out_time,
+        work_minutes=punch.work_minutes
+    )
+
+def punch_queue_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many punches pending, please retry shortly",
+        headers={"Retry-After": "1"},
     )
 
 @app.post("/attendance/check-in", response_model=AttendanceResponse, tags=["Attendance Tracking"], summary="Check In for Today's Shift")
-async def check_in(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def check_in(response: Response, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     today = date.today()
     now = datetime.now().time()
     
@@ -504,72 +770,33 @@ async def check_in(current_user: User = Depends(get_current_user), db: Session =
     # if today.weekday() >= 5: 
     #     raise HTTPException(status.HTTP_400_BAD_REQUEST, "Cannot check in on weekends (Saturday/Sunday).")
 
-    # Last attendance logic (find last one for user)
-    last_attendance = db.query(Attendance).filter(
-        Attendance.user_id == current_user.id
-    ).order_by(Attendance.date.desc(), Attendance.id.desc()).first()
-
-    if last_attendance and last_attendance.out_time is None and last_attendance.date == today:
-         raise HTTPException(status.HTTP_400_BAD_REQUEST, "You are already checked in! Please check out first.")
-    
-    existing_today = db.query(Attendance).filter(and_(
-        Attendance.user_id == current_user.id,
-        Attendance.date == today
-    )).first()
-    
-    if existing_today and existing_today.out_time:
-         raise HTTPException(status.HTTP_400_BAD_REQUEST, "You have already completed your shift for today.")
-    
-    status_val = "Present" if now <= time(9, 30, 0) else "Late"
-    
-    new_att = Attendance(
-        user_id=current_user.id,
-        date=today,
-        status=status_val,
-        in_time=now
-    )
-    db.add(new_att)
-    db.commit()
-    db.refresh(new_att)
+    try:
+        if punch_queue is not None:
+            return queued_punch(response, punch_queue.check_in(current_user.id, today, now))
+        new_att = open_shift(db, current_user.id, today, now)
+    except PunchRejected as e:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, str(e))
+    except PunchQueueFull:
+        raise punch_queue_busy()
+    invalidate_dashboard(new_att.user_id)
     return new_att
 
 @app.post("/attendance/check-out", response_model=AttendanceResponse, tags=["Attendance Tracking"], summary="Check Out and Finalize Shift")
-async def check_out(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def check_out(response: Response, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     today = date.today()
     now = datetime.now().time()
     
-    # Find active check-in
-    attendance = db.query(Attendance).filter(and_(
-        Attendance.user_id == current_user.id,
-        Attendance.date == today,
-        Attendance.out_time.is_(None)
-    )).first()
-    
-    if not attendance:
-        completed = db.query(Attendance).filter(and_(
-            Attendance.user_id == current_user.id,
-            Attendance.date == today,
-            Attendance.out_time.is_not(None)
-        )).first()
-        if completed:
-             raise HTTPException(status.HTTP_400_BAD_REQUEST, "You have already checked out today.")
-        raise HTTPException(status.HTTP_400_BAD_REQUEST, "You are not checked in. Please check in first.")
-    
-    # Calculate hours
-    if attendance.in_time:
-        in_datetime = datetime.combine(today, attendance.in_time)
-        out_datetime = datetime.combine(today, now)
-        dur = out_datetime - in_datetime
-        h, m = dur.seconds // 3600, (dur.seconds % 3600) // 60
-        attendance.work_hours = f"{h}h {m}m"
-    
-    attendance.out_time = now
-    db.commit()
-    db.refresh(attendance)
-    return attendance
+    try:
+        if punch_queue is not None:
+            return queued_punch(response, punch_queue.check_out(current_user.id, today, now))
+        return close_shift(db, current_user.id, today, now)
+    except PunchRejected as e:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, str(e))
+    except PunchQueueFull:
+        raise punch_queue_busy()
 
 @app.get("/attendance/my-history", response_model=List[AttendanceResponse], tags=["Attendance Tracking"], summary="Get 7-Day Attendance History")
-async def get_my_attendance_history(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_my_attendance_history(current_user: User = Depends(get_current_user), db: Session = Depends(get_read_db)):
     today = date.today()
     start_date = today - timedelta(days=7)
     
@@ -580,7 +807,7 @@ async def get_my_attendance_history(current_user: User = Depends(get_current_use
     return records
 
 @app.get("/attendance/today", tags=["Attendance Tracking"], summary="Get Today's Shift Status")
-async def get_today_attendance(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_today_attendance(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     today = date.today()
     att = db.query(Attendance).filter(and_(
         Attendance.user_id == current_user.id,
@@ -596,21 +823,150 @@ async def get_today_attendance(current_user: User = Depends(get_current_user), d
         "attendance": AttendanceResponse.model_validate(att)
     }
 
+@app.post("/attendance/punches/bulk", response_model=PunchUploadResponse, tags=["Attendance Tracking"], summary="Replay Offline Time-Clock Punches (Admin / Device)")
+def upload_punches(
+    file: UploadFile = File(..., description="user_id,timestamp,direction rows as CSV (with header) or JSON lines"),
+    uploader: Optional[User] = Depends(get_punch_uploader),
+    db: Session = Depends(get_db)
+):
+    csv_format = (file.filename or "").lower().endswith(".csv") or file.content_type == "text/csv"
+    try:
+        rows = parse_punch_file(file.file.read(), csv_format)
+    except UnicodeDecodeError:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Punch file must be UTF-8 text")
+    if len(rows) > PUNCH_UPLOAD_MAX_ROWS:
+        raise HTTPException(
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            f"At most {PUNCH_UPLOAD_MAX_ROWS} punches per upload"
+        )
+
+    try:
+        replay_punches(db, rows)
+    except IntegrityError:
+        # A live check-in created one of the shifts mid-upload; nothing was written
+        db.rollback()
+        raise HTTPException(status.HTTP_409_CONFLICT, "Attendance changed during the upload, please retry")
+
+    if punch_queue is not None:
+        punch_queue.mark_stale()
+    invalidate_dashboard()
+    for user_id in {row.user_id for row in rows if row.accepted}:
+        invalidate_dashboard(user_id)
+    accepted = sum(row.accepted for row in rows)
+    return PunchUploadResponse(
+        accepted=accepted,
+        rejected=len(rows) - accepted,
+        results=[PunchResult.model_validate(row) for row in rows]
+    )
+
+EXPORT_FORMATS = {
+    "csv": (stream_attendance_csv, "text/csv"),
+    "ndjson": (stream_attendance_ndjson, "application/x-ndjson"),
+}
+
+@app.get("/attendance/export", tags=["Attendance Tracking"], summary="Stream Attendance Records as CSV or NDJSON")
+def export_attendance(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    from_date: Optional[date] = Query(None, description="Defaults to 30 days before to_date"),
+    to_date: Optional[date] = Query(None, description="Defaults to today"),
+    department: Optional[str] = None,
+    user_id: Optional[int] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    to_date = to_date or date.today()
+    from_date = from_date or to_date - timedelta(days=30)
+    if from_date > to_date:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "from_date must not be after to_date")
+
+    # Employees can only export their own records
+    if current_user.role != UserRole.ADMIN.value:
+        if user_id is not None and user_id != current_user.id:
+            raise HTTPException(status.HTTP_403_FORBIDDEN, "You can only export your own attendance")
+        user_id = current_user.id
+
+    stream, media_type = EXPORT_FORMATS[format]
+    return StreamingResponse(
+        stream(db.get_bind(), attendance_export_query(from_date, to_date, department, user_id)),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="attendance_{from_date}_{to_date}.{format}"'},
+    )
+
+def _hours_worked_columns():
+    """Completed-shift totals summed over monthly rollup rows."""
+    return (
+        func.sum(AttendanceRollup.completed_shifts).label("shifts"),
+        func.sum(AttendanceRollup.minutes_worked).label("total_minutes"),
+        func.sum(AttendanceRollup.overtime_minutes).label("overtime_minutes"),
+    )
+
+def _hours_worked(row, **keys) -> HoursWorked:
+    return HoursWorked(
+        **keys,
+        shifts=row.shifts,
+        total_minutes=row.total_minutes,
+        total_hours=round(row.total_minutes / 60, 2),
+        average_shift_minutes=round(row.total_minutes / row.shifts, 1) if row.shifts else 0.0,
+        overtime_minutes=row.overtime_minutes
+    )
+
+@app.get("/attendance/hours", response_model=List[HoursWorked], tags=["Attendance Tracking"], summary="Hours Worked per Employee or Department for a Month (Admin Only)")
+def get_hours_worked(
+    month: Optional[str] = Query(None, description="YYYY-MM; defaults to the current month"),
+    group_by: str = Query("user", pattern="^(user|department)$"),
+    admin: User = Depends(get_admin_user),
+    db: Session = Depends(get_read_db)
+):
+    if month:
+        try:
+            month_first = parse_month(month)
+        except ValueError:
+            raise HTTPException(status.HTTP_400_BAD_REQUEST, "Month must be in YYYY-MM format")
+    else:
+        month_first = date.today().replace(day=1)
+    in_month = and_(
+        AttendanceRollup.month == month_first,
+        AttendanceRollup.completed_shifts > 0
+    )
+
+    if group_by == "department":
+        rows = db.query(User.department, *_hours_worked_columns()).join(
+            AttendanceRollup, AttendanceRollup.user_id == User.id
+        ).filter(in_month).group_by(User.department).order_by(User.department).all()
+        return [_hours_worked(row, department=row.department) for row in rows]
+
+    rows = db.query(User.id, User.name, User.department, *_hours_worked_columns()).join(
+        AttendanceRollup, AttendanceRollup.user_id == User.id
+    ).filter(in_month).group_by(User.id, User.name, User.department).order_by(User.id).all()
+    return [_hours_worked(row, user_id=row.id, name=row.name, department=row.department) for row in rows]
+
+@app.get("/attendance/hours/me", response_model=List[HoursWorked], tags=["Attendance Tracking"], summary="My Hours Worked per Month")
+def get_my_hours_worked(
+    year: Optional[int] = Query(None, description="Defaults to the current year"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    year = year or date.today().year
+    rows = db.query(AttendanceRollup.month, *_hours_worked_columns()).filter(and_(
+        AttendanceRollup.user_id == current_user.id,
+        AttendanceRollup.month >= date(year, 1, 1),
+        AttendanceRollup.month <= date(year, 12, 1),
+        AttendanceRollup.completed_shifts > 0
+    )).group_by(AttendanceRollup.month).order_by(AttendanceRollup.month).all()
+    return [_hours_worked(row, month=row.month.strftime("%Y-%m")) for row in rows]
+
 @app.post("/leaves", response_model=LeaveResponse, tags=["Leave Management"], summary="Apply for Leave")
-async def apply_for_leave(leave_data: LeaveCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def apply_for_leave(leave_data: LeaveCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     if leave_data.end_date < leave_data.start_date:
         raise HTTPException(status.HTTP_400_BAD_REQUEST, "End date must be after start date")
     
     if leave_data.start_date < date.today():
         raise HTTPException(status.HTTP_400_BAD_REQUEST, "Cannot apply for leave in the past")
-    
-    # Overlap
-    # (StartA <= EndB) and (EndA >= StartB)
+
     overlap = db.query(Leave).filter(and_(
         Leave.user_id == current_user.id,
         Leave.status.in_([LeaveStatus.PENDING.value, LeaveStatus.APPROVED.value]),
-        Leave.start_date <= leave_data.end_date,
-        Leave.end_date >= leave_data.start_date
+        overlaps(db, leave_data.start_date, leave_data.end_date)
     )).first()
     
     if overlap:
@@ -626,34 +982,138 @@ async def apply_for_leave(leave_data: LeaveCreate, current_user: User = Depends(
     )
     db.add(new_leave)
     db.commit()
+    invalidate_dashboard(current_user.id)
     db.refresh(new_leave)
-    return new_leave
+    return leave_response(new_leave, current_user.name, get_calendar(db))
+
+def leave_response(leave: Leave, user_name: Optional[str], work_calendar: WorkCalendar) -> LeaveResponse:
+    return LeaveResponse(
+        id=leave.id,
+        start_date=leave.start_date,
+        end_date=leave.end_date,
+        reason=leave.reason,
+        leave_type=leave.leave_type,
+        status=leave.status,
+        applied_at=leave.applied_at,
+        user_id=leave.user_id,
+        user_name=user_name,
+        working_days=work_calendar.working_days_between(leave.start_date, leave.end_date)
+    )
+
+LEAVES_PAGE_SIZE = 100
+LEAVE_CALENDAR_MAX_DAYS = 366
+LEAVES_MAX_PAGE_SIZE = 500
+
+def encode_leave_cursor(applied_at: datetime, leave_id: int) -> str:
+    raw = f"{applied_at.isoformat()}|{leave_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_leave_cursor(cursor: str) -> tuple:
+    try:
+        applied_at, leave_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(applied_at), int(leave_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Invalid cursor")
 
 @app.get("/leaves", response_model=List[LeaveResponse], tags=["Leave Management"], summary="Get Leave Requests (Role-Scoped)")
-async def get_leaves(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    if current_user.role == UserRole.ADMIN.value:
-        res = db.query(Leave).order_by(Leave.applied_at.desc()).all()
-    else:
-        res = db.query(Leave).filter(Leave.user_id == current_user.id).order_by(Leave.applied_at.desc()).all()
-        
-    result = []
-    for leave in res:
-        user = db.query(User).filter(User.id == leave.user_id).first()
-        result.append(LeaveResponse(
-            id=leave.id,
-            start_date=leave.start_date,
-            end_date=leave.end_date,
-            reason=leave.reason,
-            leave_type=leave.leave_type,
-            status=leave.status,
-            applied_at=leave.applied_at,
-            user_id=leave.user_id,
-            user_name=user.name if user else None
+def get_leaves(
+    response: Response,
+    status_filter: Optional[str] = Query(None, alias="status", description="Pending, Approved or Rejected"),
+    from_date: Optional[date] = Query(None, description="Only leaves ending on or after this date"),
+    to_date: Optional[date] = Query(None, description="Only leaves starting on or before this date"),
+    user_id: Optional[int] = Query(None, description="Admin only: leaves of one employee"),
+    cursor: Optional[str] = Query(None, description="Value of X-Next-Cursor from the previous page"),
+    limit: int = Query(LEAVES_PAGE_SIZE, ge=1, le=LEAVES_MAX_PAGE_SIZE),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    read_db: Session = Depends(get_read_db)
+):
+    """
+    Newest first, keyset-paginated on (applied_at, id). When more rows exist the
+    `X-Next-Cursor` response header carries the cursor for the next page.
+    """
+    query = read_db.query(Leave, User.name).outerjoin(User, User.id == Leave.user_id)
+
+    if current_user.role != UserRole.ADMIN.value:
+        query = query.filter(Leave.user_id == current_user.id)
+    elif user_id is not None:
+        query = query.filter(Leave.user_id == user_id)
+    if status_filter:
+        query = query.filter(Leave.status == status_filter)
+    if from_date:
+        query = query.filter(Leave.end_date >= from_date)
+    if to_date:
+        query = query.filter(Leave.start_date <= to_date)
+    if cursor:
+        cursor_at, cursor_id = decode_leave_cursor(cursor)
+        query = query.filter(or_(
+            Leave.applied_at < cursor_at,
+            and_(Leave.applied_at == cursor_at, Leave.id < cursor_id)
         ))
-    return result
+
+    rows = query.order_by(Leave.applied_at.desc(), Leave.id.desc()).limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1][0]
+        response.headers["X-Next-Cursor"] = encode_leave_cursor(last.applied_at, last.id)
+
+    work_calendar = get_calendar(db)
+    return [leave_response(leave, user_name, work_calendar) for leave, user_name in rows]
+
+@app.get("/leaves/calendar", response_model=List[LeaveCalendarEntry], tags=["Leave Management"], summary="Who Is Off Between Two Dates (Team Leave Calendar)")
+def get_leave_calendar(
+    from_date: Optional[date] = Query(None, description="Defaults to today"),
+    to_date: Optional[date] = Query(None, description="Defaults to 30 days after from_date"),
+    department: Optional[str] = Query(None, description="Admins: any department (default all); employees: their own"),
+    include_pending: bool = Query(True, description="Also list leaves still awaiting approval"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    read_db: Session = Depends(get_read_db)
+):
+    """Approved (and optionally pending) leaves overlapping the range, by start date. Reasons are not exposed."""
+    from_date = from_date or date.today()
+    to_date = to_date or from_date + timedelta(days=30)
+    if from_date > to_date:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "from_date must not be after to_date")
+    if (to_date - from_date).days >= LEAVE_CALENDAR_MAX_DAYS:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, f"The range cannot exceed {LEAVE_CALENDAR_MAX_DAYS} days")
+
+    statuses = [LeaveStatus.APPROVED.value] + ([LeaveStatus.PENDING.value] if include_pending else [])
+    conditions = [Leave.status.in_(statuses), overlaps(read_db, from_date, to_date)]
+    if current_user.role != UserRole.ADMIN.value:
+        if department is not None and department != current_user.department:
+            raise HTTPException(status.HTTP_403_FORBIDDEN, "Employees can only view their own department")
+        # Without a department an employee's team is just themselves
+        conditions.append(User.department == current_user.department if current_user.department
+                          else Leave.user_id == current_user.id)
+    elif department is not None:
+        conditions.append(User.department == department)
+
+    rows = read_db.query(
+        Leave.id, Leave.user_id, User.name, User.department,
+        Leave.start_date, Leave.end_date, Leave.leave_type, Leave.status
+    ).join(User, User.id == Leave.user_id).filter(and_(*conditions)).order_by(Leave.start_date, Leave.id).all()
+
+    work_calendar = get_calendar(db)
+    return [
+        LeaveCalendarEntry(
+            leave_id=row.id,
+            user_id=row.user_id,
+            name=row.name,
+            department=row.department,
+            start_date=row.start_date,
+            end_date=row.end_date,
+            leave_type=row.leave_type,
+            status=row.status,
+            working_days_in_range=work_calendar.working_days_between(
+                max(row.start_date, from_date), min(row.end_date, to_date)
+            )
+        )
+        for row in rows
+    ]
 
 @app.put("/leaves/{leave_id}/status", response_model=LeaveResponse, tags=["Leave Management"], summary="Update Leave Request Status (Admin Only)")
-async def update_leave_status(leave_id: int, status_update: LeaveStatusUpdate, admin: User = Depends(get_admin_user), db: Session = Depends(get_db)):
+def update_leave_status(leave_id: int, status_update: LeaveStatusUpdate, admin: User = Depends(get_admin_user), db: Session = Depends(get_db)):
     leave = db.query(Leave).filter(Leave.id == leave_id).first()
     if not leave:
         raise HTTPException(status.HTTP_404_NOT_FOUND, "Leave request not found")
@@ -666,176 +1126,209 @@ async def update_leave_status(leave_id: int, status_update: LeaveStatusUpdate, a
     leave.reviewed_by = admin.id
     
     db.commit()
+    invalidate_dashboard(leave.user_id)
     db.refresh(leave)
     
     user = db.query(User).filter(User.id == leave.user_id).first()
     
-    return LeaveResponse(
-        id=leave.id,
-        start_date=leave.start_date,
-        end_date=leave.end_date,
-        reason=leave.reason,
-        leave_type=leave.leave_type,
-        status=leave.status,
-        applied_at=leave.applied_at,
-        user_id=leave.user_id,
-        user_name=user.name if user else None
+    return leave_response(leave, user.name if user else None, get_calendar(db))
+
+@app.get("/holidays", response_model=List[HolidayResponse], tags=["Holidays"], summary="List a Year's Company Holidays (Public, Cacheable)")
+def list_holidays(
+    request: Request,
+    year: Optional[int] = Query(None, ge=1900, le=9999, description="Defaults to the current year"),
+    db: Session = Depends(get_db)
+):
+    """Served from the cached work calendar; the strong ETag changes only when that year's holidays do."""
+    year = year or date.today().year
+    holidays = [HolidayResponse.model_validate(row).model_dump(mode="json")
+                for row in get_calendar(db).holidays_in_year(year)]
+    body = json.dumps(holidays, separators=(",", ":")).encode()
+    etag = f'"{hashlib.sha256(body).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={HOLIDAYS_CACHE_MAX_AGE_SECONDS}"}
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.post("/holidays", response_model=HolidayResponse, status_code=status.HTTP_201_CREATED, tags=["Holidays"], summary="Add a Company Holiday (Admin Only)")
+def create_holiday(holiday_data: HolidayCreate, admin: User = Depends(get_admin_user), db: Session = Depends(get_db)):
+    holiday = Holiday(**holiday_data.model_dump())
+    db.add(holiday)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status.HTTP_409_CONFLICT, f"A holiday already exists on {holiday_data.date}")
+    db.refresh(holiday)
+    return holiday
+
+@app.put("/holidays/{holiday_id}", response_model=HolidayResponse, tags=["Holidays"], summary="Update a Company Holiday (Admin Only)")
+def update_holiday(holiday_id: int, holiday_data: HolidayCreate, admin: User = Depends(get_admin_user), db: Session = Depends(get_db)):
+    holiday = db.query(Holiday).filter(Holiday.id == holiday_id).first()
+    if not holiday:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Holiday not found")
+    for field, value in holiday_data.model_dump().items():
+        setattr(holiday, field, value)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status.HTTP_409_CONFLICT, f"A holiday already exists on {holiday_data.date}")
+    db.refresh(holiday)
+    return holiday
+
+@app.delete("/holidays/{holiday_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["Holidays"], summary="Delete a Company Holiday (Admin Only)")
+def delete_holiday(holiday_id: int, admin: User = Depends(get_admin_user), db: Session = Depends(get_db)):
+    holiday = db.query(Holiday).filter(Holiday.id == holiday_id).first()
+    if not holiday:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Holiday not found")
+    db.delete(holiday)
+    db.commit()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+@app.post("/holidays/import", response_model=HolidayImportResponse, tags=["Holidays"], summary="Import a Holiday Calendar from iCal or CSV (Admin Only)")
+def import_holiday_calendar(
+    file: UploadFile = File(..., description="An .ics calendar, or CSV with date,name[,description] columns"),
+    year: Optional[int] = Query(None, ge=1900, le=9999, description="Replace this year's calendar: its holidays missing from the file are removed"),
+    admin: User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    filename = (file.filename or "").lower()
+    ical = filename.endswith((".ics", ".ical")) or file.content_type == "text/calendar"
+    try:
+        entries = parse_holiday_file(file.file.read(), ical)
+        counts = import_holidays(db, entries, year)
+    except HolidayFileError as e:
+        db.rollback()
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, str(e))
+    return HolidayImportResponse(**counts)
+
+def calculate_previous_month_payroll(user: User, db: Session, read_db: Optional[Session] = None) -> dict:
+    """Helper to fetch (or on first read, compute and store) payroll for previous month"""
+    return get_payslip(db, user, previous_month(), read_db)
+
+def closed_payroll_month(month: Optional[str]) -> date:
+    """Validate a YYYY-MM query value (default: previous month) and reject open months."""
+    if month:
+        try:
+            month_first = parse_month(month)
+        except ValueError:
+            raise HTTPException(status.HTTP_400_BAD_REQUEST, "Month must be in YYYY-MM format")
+    else:
+        month_first = previous_month()
+
+    if month_first >= date(date.today().year, date.today().month, 1):
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Payroll can only be run for completed months")
+    return month_first
+
+@app.post("/payroll/run", response_model=PayrollRunResponse, tags=["Payroll & Payslips"], summary="Run (or Re-run) Payroll for All Employees (Admin Only)")
+def run_payroll(
+    month: Optional[str] = Query(None, description="YYYY-MM of a completed month; defaults to the previous month"),
+    admin: User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    month_first = closed_payroll_month(month)
+
+    # An explicit run always recomputes and replaces the month's stored payslips
+    payslips = finalize_payroll(db, month_first)
+    return PayrollRunResponse(
+        month=month_first.strftime("%B %Y"),
+        employee_count=len(payslips),
+        total_net_salary=round(sum(p["net_salary"] for p in payslips), 2),
+        payslips=[PayrollResponse(**p) for p in payslips]
     )
 
-from fastapi.responses import StreamingResponse
-import io
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-
-# ... [imports] ...
-
-def calculate_previous_month_payroll(user: User, db: Session) -> dict:
-    """Helper to calculate payroll for previous month"""
-    today = date.today()
-    this_month_first = date(today.year, today.month, 1)
-    prev_month_last = this_month_first - timedelta(days=1)
-    prev_month_first = date(prev_month_last.year, prev_month_last.month, 1)
-    
-    # DEBUG: Log the calculated dates
-    logger.info(f"PAYROLL DEBUG: today={today}, prev_month_first={prev_month_first}, prev_month_last={prev_month_last}")
-    
-    month_label = prev_month_first.strftime("%B %Y")
-    days_in_month = (prev_month_last - prev_month_first).days + 1
-    
-    attendance_records = db.query(Attendance).filter(and_(
-        Attendance.user_id == user.id,
-        Attendance.date >= prev_month_first,
-        Attendance.date <= prev_month_last,
-        Attendance.status.in_(["Present", "Late", "Half-day"])
-    )).all()
-    present_dates = {rec.date for rec in attendance_records}
-    
-    leaves = db.query(Leave).filter(and_(
-        Leave.user_id == user.id,
-        Leave.status == LeaveStatus.APPROVED.value,
-        Leave.end_date >= prev_month_first,
-        Leave.start_date <= prev_month_last
-    )).all()
-    
-    holidays = db.query(Holiday).filter(and_(
-        Holiday.date >= prev_month_first,
-        Holiday.date <= prev_month_last
-    )).all()
-    holiday_dates = {h.date for h in holidays}
-    
-    unpaid_absences = 0
-    working_days_count = 0
-    iter_date = prev_month_first
-    while iter_date <= prev_month_last:
-        is_weekend = iter_date.weekday() >= 5
-        is_holiday = iter_date in holiday_dates
-        is_working_day = not (is_weekend or is_holiday)
-        
-        if is_working_day:
-            working_days_count += 1
-            if iter_date in present_dates:
-                pass 
-            else:
-                is_on_leave = False
-                for l in leaves:
-                    if l.start_date <= iter_date <= l.end_date:
-                        is_on_leave = True
-                        break
-                if not is_on_leave:
-                    unpaid_absences += 1
-        iter_date += timedelta(days=1)
-        
-    base = float(user.base_salary) if hasattr(user, 'base_salary') and user.base_salary else 50000.0
-    per_day_salary = base / days_in_month
-    deductions = per_day_salary * unpaid_absences
-    tax = base * 0.12
-    net = base - deductions - tax
-    if net < 0: net = 0
-    
-    return {
-        "user_id": user.id,
-        "name": user.name,
-        "month": month_label,
-        "base_salary": round(base, 2),
-        "tax": round(tax, 2),
-        "deductions": round(deductions, 2),
-        "net_salary": round(net, 2),
-        "absent_days": unpaid_absences,
-        "working_days": working_days_count
-    }
-
 @app.get("/payroll/me", response_model=PayrollResponse, tags=["Payroll & Payslips"], summary="Get Previous Month Payroll Breakdown")
-async def get_my_payroll(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    data = calculate_previous_month_payroll(current_user, db)
+def get_my_payroll(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    read_db: Session = Depends(get_read_db)
+):
+    data = calculate_previous_month_payroll(current_user, db, read_db)
     return PayrollResponse(**data)
 
 @app.get("/payroll/download", tags=["Payroll & Payslips"], summary="Download Official Payslip PDF")
-async def download_payslip(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    data = calculate_previous_month_payroll(current_user, db)
-    
-    # Generate PDF
-    buffer = io.BytesIO()
-    c = canvas.Canvas(buffer, pagesize=letter)
-    width, height = letter
-    
-    # Header
-    c.setFont("Helvetica-Bold", 24)
-    c.drawCentredString(width/2, height - 50, "NexusHR Systems")
-    
-    c.setFont("Helvetica", 16)
-    c.drawCentredString(width/2, height - 80, f"Payslip for {data['month']}")
-    
-    # Employee Details
-    c.setFont("Helvetica", 12)
-    c.drawString(50, height - 130, f"Employee Name: {data['name']}")
-    c.drawString(50, height - 150, f"Employee ID: {data['user_id']}")
-    c.drawString(50, height - 170, f"Designation: {current_user.position}")
-    
-    # Table Header
-    y = height - 220
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(50, y, "Description")
-    c.drawRightString(width - 50, y, "Amount (INR)")
-    c.line(50, y - 5, width - 50, y - 5)
-    
-    # Table Content
-    y -= 30
-    c.setFont("Helvetica", 12)
-    
-    # Basic
-    c.drawString(50, y, "Basic Salary")
-    c.drawRightString(width - 50, y, f"{data['base_salary']:,.2f}")
-    y -= 25
-    
-    # Tax
-    c.drawString(50, y, "Tax Deductions (12%)")
-    c.drawRightString(width - 50, y, f"- {data['tax']:,.2f}")
-    y -= 25
-    
-    # Absences
-    c.drawString(50, y, f"Unpaid Leaves ({data['absent_days']} days)")
-    c.drawRightString(width - 50, y, f"- {data['deductions']:,.2f}")
-    y -= 25
-    
-    c.line(50, y + 5, width - 50, y + 5)
-    y -= 10
-    
-    # Net
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(50, y, "Net Salary Payable")
-    c.drawRightString(width - 50, y, f"{data['net_salary']:,.2f}")
-    
-    # Footer
-    c.setFont("Helvetica-Oblique", 10)
-    c.drawCentredString(width/2, 50, "System Generated Document - NexusHR Systems")
-    
-    c.showPage()
-    c.save()
-    
-    buffer.seek(0)
+def download_payslip(
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    read_db: Session = Depends(get_read_db)
+):
+    data = calculate_previous_month_payroll(current_user, db, read_db)
+    position = current_user.position
+
+    # Payslips of a closed month never change, so the content hash is a strong validator
+    fingerprint = hashlib.sha256(json.dumps([data, position], sort_keys=True).encode()).hexdigest()
+    etag = f'"{fingerprint}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, no-cache",
+        "Content-Disposition": f'attachment; filename="Payslip_{data["month"]}.pdf"',
+    }
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    cache_key = f"{data['user_id']}-{data['month']}-{fingerprint}"
+    pdf = payslip_pdf_cache.get(cache_key)
+    if pdf is None:
+        try:
+            pdf = pdf_pool.run(render_payslip_pdf, data, position, timeout=PDF_TIMEOUT_SECONDS)
+        except (PoolSaturated, FutureTimeoutError):
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Payslip rendering is busy, please retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        payslip_pdf_cache.set(cache_key, pdf)
+
+    return Response(content=pdf, media_type="application/pdf", headers=headers)
+
+@app.get("/payroll/export/payslips", tags=["Payroll & Payslips"], summary="Download Every Employee's Payslip PDF as a ZIP (Admin Only)")
+def export_payslips(
+    month: Optional[str] = Query(None, description="YYYY-MM of a completed month; defaults to the previous month"),
+    admin: User = Depends(get_admin_user),
+    db: Session = Depends(get_db),
+    read_db: Session = Depends(get_read_db)
+):
+    month_first = closed_payroll_month(month)
+    # Everything is read up front; the stream itself never touches the session
+    payslips = get_month_payslips(db, month_first, read_db)
+
+    # PDFs render on the worker pool a few at a time and are zipped as they complete
+    pdfs = render_many(payslips, window=max(1, PDF_WORKERS * 2))
+    entries = ((payslip_filename(data), pdf) for (data, _), pdf in zip(payslips, pdfs))
+    return StreamingResponse(
+        stream_zip(entries),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="Payslips_{month_first:%Y-%m}.zip"'},
+    )
+
+@app.get("/analytics/export/{dataset}", tags=["Analytics"], summary="Stream a Dataset as Parquet or Arrow IPC (Admin Only)")
+def export_analytics_dataset(
+    dataset: str = Path(..., pattern=f"^({'|'.join(DATASET_COLUMNS)})$"),
+    format: str = Query("parquet", pattern=f"^({'|'.join(COLUMNAR_FORMATS)})$"),
+    from_date: Optional[date] = Query(None, description="Defaults to 365 days before to_date; ignored for users"),
+    to_date: Optional[date] = Query(None, description="Defaults to today; ignored for users"),
+    admin: User = Depends(get_admin_user),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Attendance by date, leaves overlapping the range, every user (without password
+    hashes) or payroll computed for each month of the range, written in chunks of
+    ANALYTICS_CHUNK_ROWS rows as they are read.
+    """
+    to_date = to_date or date.today()
+    from_date = from_date or to_date - timedelta(days=365)
+    if from_date > to_date:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "from_date must not be after to_date")
+    try:
+        require_pyarrow()
+    except ColumnarExportUnavailable as e:
+        raise HTTPException(status.HTTP_501_NOT_IMPLEMENTED, str(e))
+
+    extension, media_type = COLUMNAR_FORMATS[format]
     return StreamingResponse(
-        buffer, 
-        media_type="application/pdf",
-        headers={"Content-Disposition": f'attachment; filename="Payslip_{data["month"]}.pdf"'}
+        stream_dataset(db.get_bind(), dataset, format, from_date, to_date),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{dataset}_{from_date}_{to_date}.{extension}"'},
     )
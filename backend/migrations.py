@@ -0,0 +1,202 @@
+"""
+Schema upgrades for databases created before the current models
+
+`Base.metadata.create_all` only creates missing tables, so columns and indexes
+added to existing tables are created here (idempotently, on Postgres and SQLite
+alike), and derived tables such as the monthly attendance rollups are backfilled.
+
+A migrated database records a fingerprint of the models in `schema_version`,
+so startup can tell with one SELECT that there is nothing to do. Deployments
+can also migrate ahead of time with `python migrations.py`.
+"""
+import hashlib
+import logging
+import re
+from functools import lru_cache
+from typing import Optional, Set
+
+from sqlalchemy import delete, insert, inspect, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+
+from database import Base
+from models import Attendance, AttendanceRollup, Leave, SchemaVersion
+from partitions import maintain_partitions, partition_existing_table
+from rollup import rebuild_rollups
+
+logger = logging.getLogger(__name__)
+
+# Bump when upgrade_schema gains a step that the models alone do not reveal
+MIGRATIONS_REVISION = 3
+
+# Duplicates are removed before any of these is created (the unique attendance index needs it)
+MANAGED_INDEXES = sorted(
+    (index for table in (Attendance.__table__, Leave.__table__) for index in table.indexes),
+    key=lambda index: index.name,
+)
+
+
+# Indexes older releases created that no query uses any more; dropped on upgrade.
+# ix_attendances_open_shift: every open-shift lookup also filters on (user_id, date)
+OBSOLETE_INDEXES = {"attendances": ["ix_attendances_open_shift"]}
+
+
+def applies_to(index, dialect_name: str) -> bool:
+    """False for dialect-specific indexes (`.ddl_if(dialect=...)`) of another backend."""
+    condition = index._ddl_if
+    if condition is None or condition.dialect is None:
+        return True
+    dialects = (condition.dialect,) if isinstance(condition.dialect, str) else condition.dialect
+    return dialect_name in dialects
+
+
+def dedupe_attendance(conn) -> int:
+    """Keep the first row of each (user_id, date) pair; returns the number of rows removed."""
+    result = conn.execute(text(
+        "DELETE FROM attendances WHERE id NOT IN ("
+        "SELECT MIN(id) FROM attendances GROUP BY user_id, date)"
+    ))
+    return result.rowcount
+
+
+def parse_work_hours(value: str) -> Optional[int]:
+    """Legacy 'Xh Ym' work_hours text -> minutes (None if unparseable)."""
+    match = re.fullmatch(r"\s*(\d+)h\s*(\d+)m\s*", value or "")
+    return int(match.group(1)) * 60 + int(match.group(2)) if match else None
+
+
+def backfill_work_minutes(conn) -> int:
+    """Fill attendances.work_minutes from the legacy work_hours text; returns rows updated."""
+    rows = conn.execute(text(
+        "SELECT id, work_hours FROM attendances WHERE work_minutes IS NULL AND work_hours IS NOT NULL"
+    )).all()
+    updates = [
+        {"id": row_id, "minutes": minutes}
+        for row_id, work_hours in rows
+        if (minutes := parse_work_hours(work_hours)) is not None
+    ]
+    if updates:
+        conn.execute(text("UPDATE attendances SET work_minutes = :minutes WHERE id = :id"), updates)
+    return len(updates)
+
+
+def add_work_minutes(engine: Engine, inspector) -> None:
+    if not inspector.has_table("attendances"):
+        return
+    columns = {column["name"] for column in inspector.get_columns("attendances")}
+    if "work_minutes" in columns:
+        return
+    with engine.begin() as conn:
+        logger.info("Adding attendances.work_minutes")
+        conn.execute(text("ALTER TABLE attendances ADD COLUMN work_minutes INTEGER"))
+        # work_hours is left in place (unmapped) so older deployments keep working
+        if "work_hours" in columns:
+            logger.info(f"Backfilled work_minutes for {backfill_work_minutes(conn)} attendance rows")
+
+
+def existing_indexes(engine: Engine, inspector, table: str) -> Set[str]:
+    """Index names on `table`; SQLite's reflection leaves out expression indexes, so ask sqlite_master."""
+    if engine.dialect.name == "sqlite":
+        with engine.connect() as conn:
+            return set(conn.scalars(
+                text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table"),
+                {"table": table},
+            ))
+    return {ix["name"] for ix in inspector.get_indexes(table)}
+
+
+def upgrade_schema(engine: Engine) -> None:
+    """
+    Bring an existing database up to the current columns, indexes and (on
+    Postgres) attendance partitions. Safe to run on every startup.
+    """
+    inspector = inspect(engine)
+    add_work_minutes(engine, inspector)
+    with engine.begin() as conn:
+        if partition_existing_table(conn):
+            inspector = inspect(engine)
+    existing = {
+        table: existing_indexes(engine, inspector, table)
+        for table in ("attendances", "leaves")
+        if inspector.has_table(table)
+    }
+    # Tables that do not exist yet get their indexes from create_all
+    missing = [
+        ix for ix in MANAGED_INDEXES
+        if ix.table.name in existing and ix.name not in existing[ix.table.name]
+        and applies_to(ix, engine.dialect.name)
+    ]
+    obsolete = [
+        name for table, names in OBSOLETE_INDEXES.items() if table in existing
+        for name in names if name in existing[table]
+    ]
+    if obsolete:
+        with engine.begin() as conn:
+            for name in obsolete:
+                logger.info(f"Dropping unused index {name}")
+                conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    if missing:
+        with engine.begin() as conn:
+            if any(ix.name == "uq_attendances_user_date" for ix in missing):
+                removed = dedupe_attendance(conn)
+                if removed:
+                    logger.warning(f"Removed {removed} duplicate attendance rows before adding the unique index")
+            for index in missing:
+                logger.info(f"Creating index {index.name}")
+                index.create(conn, checkfirst=True)
+    if inspector.has_table("attendances") and inspector.has_table("attendance_rollups"):
+        backfill_rollups(engine)
+    maintain_partitions(engine)
+
+
+def backfill_rollups(engine: Engine) -> None:
+    """Build the monthly rollups once for a database that has attendance but none yet."""
+    with engine.begin() as conn:
+        if conn.scalar(select(AttendanceRollup.id).limit(1)) is not None:
+            return
+        if conn.scalar(select(Attendance.id).limit(1)) is None:
+            return
+        logger.info(f"Backfilled {rebuild_rollups(conn)} attendance rollup rows")
+
+
+@lru_cache(maxsize=1)
+def schema_fingerprint() -> str:
+    """Hash of every table's columns, indexes and constraints (plus MIGRATIONS_REVISION)."""
+    parts = [f"revision:{MIGRATIONS_REVISION}"]
+    for table in sorted(Base.metadata.tables.values(), key=lambda t: t.name):
+        parts.append(f"table:{table.name}")
+        parts += [f"column:{c.name}:{c.type!r}:{c.nullable}" for c in table.columns]
+        parts += sorted(f"index:{ix.name}" for ix in table.indexes)
+        parts += sorted(f"constraint:{c.name}" for c in table.constraints if c.name)
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+def schema_is_current(engine: Engine) -> bool:
+    """Whether the database was migrated to the current models (one SELECT)."""
+    try:
+        with engine.connect() as conn:
+            stored = conn.scalar(select(SchemaVersion.fingerprint).order_by(SchemaVersion.id.desc()).limit(1))
+    except DBAPIError:
+        # No schema_version table: a new database or one from before the marker
+        return False
+    return stored == schema_fingerprint()
+
+
+def migrate(engine: Engine) -> None:
+    """Create missing tables, then upgrade existing ones to the current columns and indexes."""
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+
+
+def record_schema_version(engine: Engine) -> None:
+    with engine.begin() as conn:
+        conn.execute(delete(SchemaVersion))
+        conn.execute(insert(SchemaVersion).values(fingerprint=schema_fingerprint()))
+
+
+if __name__ == "__main__":
+    from database import engine
+
+    migrate(engine)
+    record_schema_version(engine)
+    print(f"Schema migrated ({schema_fingerprint()[:12]})")
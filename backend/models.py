@@ -1,13 +1,26 @@
 """
 SQLAlchemy Models for HRMS Backend
 """
-from sqlalchemy import Column, Integer, String, Date, Time, DateTime, ForeignKey
+from sqlalchemy import (
+    DDL, Column, Integer, Float, String, Date, Time, DateTime, ForeignKey, Index, PrimaryKeyConstraint,
+    UniqueConstraint, event
+)
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, literal_column
 from database import Base
 import enum
 
 
+# SQLite's CURRENT_TIMESTAMP has whole-second precision and no fractional part.
+# Binding datetimes in that same text format keeps server-defaulted columns
+# comparable with Python values (e.g. keyset pagination cursors).
+SQLiteSecondsDateTime = sqlite.DATETIME(
+    storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"
+)
+
+
 class UserRole(str, enum.Enum):
     ADMIN = "admin"
     EMPLOYEE = "employee"
@@ -40,7 +53,10 @@ class User(Base):
 
 
 class Attendance(Base):
-    """Attendance records for employees"""
+    """
+    Attendance records for employees. On Postgres the table is partitioned by
+    month on `date` (see partitions.py); on SQLite it is a single table.
+    """
     __tablename__ = "attendances"
 
     id = Column(Integer, primary_key=True, index=True)
@@ -49,12 +65,40 @@ class Attendance(Base):
     status = Column(String(50), default="Present")  # Present, Absent, Late, Half-day
     in_time = Column(Time, nullable=True)
     out_time = Column(Time, nullable=True)
-    work_hours = Column(String(20), nullable=True)
+    work_minutes = Column(Integer, nullable=True)  # Set at check-out
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
     user = relationship("User", back_populates="attendances")
 
+    __table_args__ = (
+        # One row per user and day; also serves every per-user lookup by date
+        Index("uq_attendances_user_date", "user_id", "date", unique=True),
+        {"postgresql_partition_by": "RANGE (date)", "info": {"partition_key": ("date",)}},
+    )
+
+
+# Rows for months without a partition of their own land here, so an insert never fails
+event.listen(
+    Attendance.__table__,
+    "after_create",
+    DDL("CREATE TABLE attendances_default PARTITION OF attendances DEFAULT").execute_if(dialect="postgresql"),
+)
+
+
+@compiles(PrimaryKeyConstraint, "postgresql")
+def _primary_key_with_partition_key(constraint, compiler, **kw):
+    """Postgres requires the partition key in the primary key of a partitioned table."""
+    table = constraint.table
+    partition_key = table.info.get("partition_key", ()) if table.dialect_options["postgresql"]["partition_by"] else ()
+    missing = [name for name in partition_key if name not in constraint.columns]
+    if not missing:
+        return compiler.visit_primary_key_constraint(constraint, **kw)
+    columns = [compiler.preparer.quote(c.name) for c in constraint.columns]
+    columns += [compiler.preparer.quote(name) for name in missing]
+    prefix = f"CONSTRAINT {compiler.preparer.format_constraint(constraint)} " if constraint.name else ""
+    return f"{prefix}PRIMARY KEY ({', '.join(columns)})"
+
 
 class Leave(Base):
     """Leave requests from employees"""
@@ -67,13 +111,27 @@ class Leave(Base):
     reason = Column(String(500), nullable=False)
     leave_type = Column(String(50), default="Annual")  # Annual, Sick, Personal, etc.
     status = Column(String(50), default=LeaveStatus.PENDING.value)
-    applied_at = Column(DateTime(timezone=True), server_default=func.now())
+    applied_at = Column(DateTime(timezone=True).with_variant(SQLiteSecondsDateTime, "sqlite"), server_default=func.now())
     reviewed_at = Column(DateTime(timezone=True), nullable=True)
     reviewed_by = Column(Integer, nullable=True)
     
     # Relationships
     user = relationship("User", back_populates="leaves", foreign_keys=[user_id])
 
+    __table_args__ = (
+        Index("ix_leaves_user_status_dates", "user_id", "status", "start_date", "end_date"),
+        Index("ix_leaves_status_applied_at", "status", "applied_at"),
+        # Interval lookups (see leave_calendar.py): range overlap on Postgres, bounded start_date scan elsewhere
+        Index("ix_leaves_status_start_end", "status", "start_date", "end_date"),
+        Index(
+            "ix_leaves_period",
+            func.daterange(start_date, end_date, literal_column("'[]'")),
+            postgresql_using="gist",
+        ).ddl_if(dialect="postgresql"),
+        # Turns the longest-span lookup of the SQLite interval scan into an index seek
+        Index("ix_leaves_span", func.julianday(end_date) - func.julianday(start_date)).ddl_if(dialect="sqlite"),
+    )
+
 
 class Holiday(Base):
     """Company holidays"""
@@ -83,3 +141,50 @@ class Holiday(Base):
     name = Column(String(255), nullable=False)
     date = Column(Date, nullable=False, unique=True)
     description = Column(String(500), nullable=True)
+
+
+class Payslip(Base):
+    """Finalized payroll result for one user and one closed month"""
+    __tablename__ = "payslips"
+    __table_args__ = (
+        UniqueConstraint("user_id", "month", name="uq_payslips_user_month"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    month = Column(Date, nullable=False)  # First day of the payroll month
+    base_salary = Column(Float, nullable=False)
+    tax = Column(Float, nullable=False)
+    deductions = Column(Float, nullable=False)
+    net_salary = Column(Float, nullable=False)
+    absent_days = Column(Integer, nullable=False)
+    working_days = Column(Integer, nullable=False)
+    computed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class AttendanceRollup(Base):
+    """Per-user monthly attendance totals, kept in step with `attendances` (see rollup.py)"""
+    __tablename__ = "attendance_rollups"
+    __table_args__ = (
+        UniqueConstraint("user_id", "month", name="uq_attendance_rollups_user_month"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    month = Column(Date, nullable=False)  # First day of the month
+    present_days = Column(Integer, nullable=False, default=0)
+    late_days = Column(Integer, nullable=False, default=0)
+    half_days = Column(Integer, nullable=False, default=0)
+    days_mask = Column(Integer, nullable=False, default=0)  # Bit d-1 set if attended on day d
+    completed_shifts = Column(Integer, nullable=False, default=0)
+    minutes_worked = Column(Integer, nullable=False, default=0)
+    overtime_minutes = Column(Integer, nullable=False, default=0)
+
+
+class SchemaVersion(Base):
+    """Fingerprint of the models the database was last migrated to (see migrations.py)"""
+    __tablename__ = "schema_version"
+
+    id = Column(Integer, primary_key=True)
+    fingerprint = Column(String(64), nullable=False)
+    migrated_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,299 @@
+"""
+Attendance Partitioning and Archival (Postgres)
+
+On Postgres `attendances` is partitioned by month on `date` (e.g.
+`attendances_y2025m03` holds March 2025), so date-filtered queries only touch
+the months they ask for and the hot months' indexes stay small.
+
+* Partitions for the current month and ATTENDANCE_PARTITION_MONTHS_AHEAD months
+  ahead are created by schema upgrades and by the monthly archival job (not by
+  every startup, which stays a single SELECT). Rows for any other month go to
+  the DEFAULT partition and are moved out when their month gets a partition of
+  its own.
+* `archive_closed_months` folds the months of a closed year into one
+  `attendances_archive_yYYYY` partition. A month may be folded once it is older
+  than ATTENDANCE_HOT_MONTHS and its payroll is finalized (every employee with
+  attendance that month has a stored payslip); a year is folded once all of its
+  months may be. Each archive partition is created with its explicit bounds, so
+  folding never detaches, re-validates or rewrites the archives before it. The
+  archives are still partitions of `attendances`, so queries keep reading
+  archived rows through the parent table. A fold writes the year in
+  (user_id, date) order, so the archive stays clustered for per-employee scans.
+  (Databases archived before this scheme keep their single `attendances_archive`
+  partition; later years are archived after it.)
+
+SQLite has no partitioning: `attendances` stays a single table and both
+operations do nothing. Run the archival job monthly with `python partitions.py`.
+"""
+import logging
+import os
+import re
+from datetime import date
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, exists, func, select, text
+from sqlalchemy.engine import Connection, Engine
+
+from models import Attendance, Payslip
+
+logger = logging.getLogger(__name__)
+
+ATTENDANCE_PARTITION_MONTHS_AHEAD = int(os.getenv("ATTENDANCE_PARTITION_MONTHS_AHEAD", "3"))
+# The current month and the ones before it that stay in monthly partitions
+ATTENDANCE_HOT_MONTHS = int(os.getenv("ATTENDANCE_HOT_MONTHS", "3"))
+
+PARENT = Attendance.__table__.name
+DEFAULT_PARTITION = f"{PARENT}_default"
+ARCHIVE_PARTITION = f"{PARENT}_archive"
+# Rows of archived dates found in the DEFAULT partition, held while their archive is created
+STRAYS_TABLE = f"{ARCHIVE_PARTITION}_strays"
+MONTH_PARTITION = re.compile(rf"^{PARENT}_y(\d{{4}})m(\d{{2}})$")
+# One per archived year, plus the single archive of databases archived before yearly archives
+ARCHIVE_NAME = re.compile(rf"^{ARCHIVE_PARTITION}(_y\d{{4}})?$")
+# Serialises partition maintenance across worker processes (pg_advisory_xact_lock key)
+MAINTENANCE_LOCK = 0x68726D73
+
+
+def add_months(month_first: date, months: int) -> date:
+    index = month_first.year * 12 + month_first.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month_first: date) -> str:
+    return f"{PARENT}_y{month_first.year}m{month_first.month:02d}"
+
+
+def archive_name(year: int) -> str:
+    return f"{ARCHIVE_PARTITION}_y{year}"
+
+
+def is_partitioned(conn: Connection) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    relkind = conn.scalar(text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)"), {"name": PARENT})
+    return relkind == "p"
+
+
+def partition_bounds(conn: Connection) -> Dict[str, str]:
+    """Partition name -> bound expression (e.g. "FOR VALUES FROM ('2025-03-01') TO ('2025-04-01')")."""
+    rows = conn.execute(text(
+        "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = to_regclass(:name)"
+    ), {"name": PARENT})
+    return dict(rows.all())
+
+
+def month_partitions(bounds: Dict[str, str]) -> List[date]:
+    months = []
+    for name in bounds:
+        match = MONTH_PARTITION.match(name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+def archived_before(bounds: Dict[str, str]) -> Optional[date]:
+    """Upper bound of the newest archive partition: every date before it is archived."""
+    ends = [
+        date.fromisoformat(match.group(1))
+        for name, bound in bounds.items()
+        if ARCHIVE_NAME.match(name) and (match := re.search(r"TO \('(\d{4}-\d{2}-\d{2})'\)", bound))
+    ]
+    return max(ends, default=None)
+
+
+def create_month_partition(conn: Connection, month_first: date) -> None:
+    """
+    Add the month's partition, moving its rows out of the DEFAULT partition. The
+    CHECK constraint matching the bounds lets ATTACH skip its validation scan.
+    """
+    name, lo, hi = partition_name(month_first), month_first.isoformat(), add_months(month_first, 1).isoformat()
+    conn.execute(text(f"CREATE TABLE {name} (LIKE {PARENT} INCLUDING DEFAULTS)"))
+    conn.execute(text(f"ALTER TABLE {name} ADD CONSTRAINT {name}_bounds CHECK (\"date\" >= '{lo}' AND \"date\" < '{hi}')"))
+    conn.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE \"date\" >= '{lo}' AND \"date\" < '{hi}' RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ))
+    conn.execute(text(f"ALTER TABLE {PARENT} ATTACH PARTITION {name} FOR VALUES FROM ('{lo}') TO ('{hi}')"))
+    conn.execute(text(f"ALTER TABLE {name} DROP CONSTRAINT {name}_bounds"))
+
+
+def ensure_partitions(conn: Connection, today: Optional[date] = None, months: Optional[List[date]] = None) -> List[str]:
+    """
+    Create the DEFAULT partition and any missing month partitions from the current
+    month to ATTENDANCE_PARTITION_MONTHS_AHEAD months ahead (plus `months`, if
+    given). Returns the names created; does nothing unless `attendances` is a
+    partitioned Postgres table.
+    """
+    if not is_partitioned(conn):
+        return []
+    conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MAINTENANCE_LOCK})
+    bounds = partition_bounds(conn)
+    created = []
+    if DEFAULT_PARTITION not in bounds:
+        conn.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {PARENT} DEFAULT"))
+        created.append(DEFAULT_PARTITION)
+
+    current = (today or date.today()).replace(day=1)
+    wanted = {add_months(current, i) for i in range(ATTENDANCE_PARTITION_MONTHS_AHEAD + 1)} | set(months or ())
+    archived = archived_before(bounds)
+    for month_first in sorted(wanted):
+        if partition_name(month_first) in bounds or (archived is not None and month_first < archived):
+            continue
+        create_month_partition(conn, month_first)
+        created.append(partition_name(month_first))
+    if created:
+        logger.info(f"Created attendance partitions: {', '.join(created)}")
+    return created
+
+
+def maintain_partitions(engine: Engine) -> List[str]:
+    """`ensure_partitions` in a transaction of its own (Postgres only)."""
+    if engine.dialect.name != "postgresql":
+        return []
+    with engine.begin() as conn:
+        return ensure_partitions(conn)
+
+
+def partition_existing_table(conn: Connection) -> bool:
+    """
+    Convert a plain Postgres `attendances` table (from before partitioning) into the
+    partitioned one, one partition per month of its rows. Returns True if converted.
+    """
+    if conn.dialect.name != "postgresql":
+        return False
+    relkind = conn.scalar(text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)"), {"name": PARENT})
+    if relkind != "r":
+        return False
+
+    old = f"{PARENT}_unpartitioned"
+    logger.info("Partitioning attendances by month")
+    conn.execute(text(f"LOCK TABLE {PARENT} IN ACCESS EXCLUSIVE MODE"))
+    conn.execute(text(f"ALTER TABLE {PARENT} RENAME TO {old}"))
+    # Free the index and sequence names for the new table
+    for (index_name,) in conn.execute(text("SELECT indexname FROM pg_indexes WHERE tablename = :name"), {"name": old}).all():
+        conn.execute(text(f'ALTER INDEX "{index_name}" RENAME TO "{index_name[:50]}_unpartitioned"'))
+    sequence = conn.scalar(text("SELECT pg_get_serial_sequence(:name, 'id')"), {"name": old})
+    if sequence:
+        conn.execute(text(f"ALTER SEQUENCE {sequence} RENAME TO {old}_id_seq"))
+
+    Attendance.__table__.create(conn)
+    months = conn.scalars(text(f"SELECT DISTINCT date_trunc('month', \"date\")::date FROM {old}")).all()
+    ensure_partitions(conn, months=months)
+    # Databases from before the unique (user_id, date) index may hold duplicates;
+    # keep the first row of each pair, as migrations.dedupe_attendance does
+    columns = ", ".join(f'"{column.name}"' for column in Attendance.__table__.columns)
+    copied = conn.execute(text(
+        f"INSERT INTO {PARENT} ({columns}) SELECT {columns} FROM {old} "
+        f"WHERE id IN (SELECT MIN(id) FROM {old} GROUP BY user_id, \"date\")"
+    )).rowcount
+    logger.info(f"Copied {copied} attendance rows into the partitioned table")
+    conn.execute(text(
+        f"SELECT setval(pg_get_serial_sequence('{PARENT}', 'id'), COALESCE(MAX(id), 0) + 1, false) FROM {PARENT}"
+    ))
+    conn.execute(text(f"DROP TABLE {old}"))
+    return True
+
+
+def hot_months_start(today: Optional[date] = None) -> date:
+    """First day of the oldest month that stays in a monthly partition."""
+    return add_months((today or date.today()).replace(day=1), -(ATTENDANCE_HOT_MONTHS - 1))
+
+
+def archivable_months(conn: Connection, candidates: List[date], today: Optional[date] = None) -> List[date]:
+    """
+    The leading run of `candidates` (ascending month starts) that may be archived:
+    older than the hot months and with every attending employee paid. Stops at the
+    first month that is not, since the archive only ever covers a prefix of time.
+    """
+    cutoff = hot_months_start(today)
+    eligible = []
+    for month_first in candidates:
+        if month_first >= cutoff:
+            break
+        unpaid = conn.scalar(select(func.count()).select_from(Attendance).where(and_(
+            Attendance.date >= month_first,
+            Attendance.date < add_months(month_first, 1),
+            ~exists().where(and_(Payslip.user_id == Attendance.user_id, Payslip.month == month_first))
+        )))
+        if unpaid:
+            break
+        eligible.append(month_first)
+    return eligible
+
+
+def archivable_years(bounds: Dict[str, str], today: Optional[date] = None, eligible: Optional[List[date]] = None) -> Dict[int, List[date]]:
+    """
+    Year -> its month partitions, for the leading run of years that are over
+    (December is past the hot months) and whose every month partition is in
+    `eligible` (see `archivable_months`).
+    """
+    partitions = month_partitions(bounds)
+    eligible = set(partitions if eligible is None else eligible)
+    years: Dict[int, List[date]] = {}
+    for month_first in partitions:
+        years.setdefault(month_first.year, []).append(month_first)
+    closed = {}
+    for year, months in sorted(years.items()):
+        if date(year + 1, 1, 1) > hot_months_start(today) or not eligible.issuperset(months):
+            break
+        closed[year] = months
+    return closed
+
+
+def archive_year(conn: Connection, year: int, months: List[date], archived: Optional[date]) -> None:
+    """
+    Move `months` (the year's month partitions) and any DEFAULT-partition rows of
+    the year into a new archive partition bounded FROM `archived` (or MINVALUE for
+    the first archive) TO the next January. Created with its bounds, the archive
+    needs no validation scan; only the DEFAULT partition is checked for overlap.
+    """
+    name, hi = archive_name(year), date(year + 1, 1, 1).isoformat()
+    lower = f"'{archived.isoformat()}'" if archived else "MINVALUE"
+    in_range = f"\"date\" >= {lower} AND \"date\" < '{hi}'" if archived else f"\"date\" < '{hi}'"
+    for month_first in months:
+        conn.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {partition_name(month_first)}"))
+    # Stray rows of the archived dates would block the CREATE below
+    conn.execute(text(f"CREATE TEMPORARY TABLE {STRAYS_TABLE} (LIKE {PARENT}) ON COMMIT DROP"))
+    conn.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE {in_range} RETURNING *) "
+        f"INSERT INTO {STRAYS_TABLE} SELECT * FROM moved"
+    ))
+    conn.execute(text(f"CREATE TABLE {name} PARTITION OF {PARENT} FOR VALUES FROM ({lower}) TO ('{hi}')"))
+    sources = " UNION ALL ".join(f"SELECT * FROM {table}" for table in (*map(partition_name, months), STRAYS_TABLE))
+    conn.execute(text(f"INSERT INTO {name} SELECT * FROM ({sources}) AS archived ORDER BY user_id, \"date\""))
+    conn.execute(text(f"DROP TABLE {', '.join((*map(partition_name, months), STRAYS_TABLE))}"))
+
+
+def archive_closed_months(engine: Engine, today: Optional[date] = None) -> List[date]:
+    """
+    Fold the month partitions of closed, fully paid years into yearly archive
+    partitions in one transaction (readers of `attendances` wait for it to
+    commit), then create the coming months' partitions. Returns the months archived.
+    """
+    if engine.dialect.name != "postgresql":
+        logger.info("attendances is a single table on this database; nothing to archive")
+        return []
+    archived_months = []
+    with engine.begin() as conn:
+        if not is_partitioned(conn):
+            return []
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MAINTENANCE_LOCK})
+        bounds = partition_bounds(conn)
+        eligible = archivable_months(conn, month_partitions(bounds), today)
+        archived = archived_before(bounds)
+        for year, months in archivable_years(bounds, today, eligible).items():
+            archive_year(conn, year, months, archived)
+            archived = date(year + 1, 1, 1)
+            archived_months += months
+            logger.info(f"Archived attendance for {year} into {archive_name(year)}")
+        ensure_partitions(conn, today)
+    return archived_months
+
+
+if __name__ == "__main__":
+    from database import engine
+
+    logging.basicConfig(level=logging.INFO)
+    archived = archive_closed_months(engine)
+    print(f"Archived {len(archived)} month(s): {', '.join(f'{m:%Y-%m}' for m in archived) or 'none'}")
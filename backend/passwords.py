@@ -0,0 +1,61 @@
+"""
+Password Hashing (bcrypt via passlib, verified on a bounded process pool)
+
+passlib is imported on first use (a login, in the worker processes), not when
+the API starts.
+"""
+import os
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from workers import BoundedProcessPool
+
+# Hashes whose cost differs from BCRYPT_ROUNDS are re-hashed on the next
+# successful login, so the cost can be tuned up or down without resets.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Serverless instances (Vercel) cannot keep worker processes: verify inline there
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", "0" if os.environ.get("VERCEL") else str(min(4, os.cpu_count() or 1))))
+BCRYPT_MAX_PENDING = int(os.getenv("BCRYPT_MAX_PENDING", "64"))
+BCRYPT_TIMEOUT_SECONDS = float(os.getenv("BCRYPT_TIMEOUT_SECONDS", "10"))
+
+
+@lru_cache(maxsize=1)
+def _context():
+    from passlib.context import CryptContext
+
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=BCRYPT_ROUNDS,
+        bcrypt__min_rounds=BCRYPT_ROUNDS,
+        bcrypt__max_rounds=BCRYPT_ROUNDS,
+    )
+
+
+def __getattr__(name: str):
+    # `passwords.pwd_context` stays importable without loading passlib up front
+    if name == "pwd_context":
+        return _context()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+password_pool = BoundedProcessPool("bcrypt", max_workers=BCRYPT_WORKERS, max_pending=BCRYPT_MAX_PENDING)
+
+
+def get_password_hash(password: str) -> str:
+    return _context().hash(password)
+
+
+def _verify_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return _context().verify_and_update(plain_password, hashed_password)
+
+
+def verify_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password on the bcrypt pool.
+    Returns (matches, new_hash); new_hash is set when the stored hash should be replaced.
+    Raises workers.PoolSaturated when too many verifications are already queued.
+    """
+    return password_pool.run(
+        _verify_and_update, plain_password, hashed_password, timeout=BCRYPT_TIMEOUT_SECONDS
+    )
@@ -0,0 +1,197 @@
+"""
+Payroll Calculation (one employee or a whole-company run in a constant number of queries)
+
+Each month is handled as day bitmasks: bit `d - 1` stands for day `d`. Working
+days, attendance and approved-leave coverage become plain integers, so the
+unpaid absences of one employee are a single popcount instead of a walk over
+the calendar with a nested loop over leaves. Attendance masks are read ready-made
+from the monthly rollup (see rollup.py).
+
+Results for closed months are persisted as `Payslip` rows and served from
+there; later edits to old attendance only show up after an explicit re-run.
+"""
+import logging
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import User, AttendanceRollup, Leave, LeaveStatus, Payslip
+from work_calendar import get_calendar, month_last_day, span_mask
+
+logger = logging.getLogger(__name__)
+
+PAYSLIP_FIELDS = ["base_salary", "tax", "deductions", "net_salary", "absent_days", "working_days"]
+TAX_RATE = 0.12
+DEFAULT_BASE_SALARY = 50000.0
+
+
+def previous_month(today: Optional[date] = None) -> date:
+    """First day of the month before `today`."""
+    today = today or date.today()
+    prev_month_last = date(today.year, today.month, 1) - timedelta(days=1)
+    return date(prev_month_last.year, prev_month_last.month, 1)
+
+
+def parse_month(value: str) -> date:
+    """'YYYY-MM' -> first day of that month. Raises ValueError on bad input."""
+    year, month = value.split("-")
+    return date(int(year), int(month), 1)
+
+
+def compute_payroll(db: Session, month_first: date, users: Optional[List[User]] = None) -> List[Dict]:
+    """
+    Payroll for `month_first`'s month for `users` (default: every user) in three queries
+    (users, monthly attendance rollups, approved leaves) plus the cached working-day
+    calendar, whatever the headcount.
+    """
+    month_last = month_last_day(month_first)
+    days_in_month = month_last.day
+
+    if users is None:
+        users = db.query(User).order_by(User.id).all()
+        user_filter = None
+    else:
+        user_filter = [u.id for u in users]
+
+    attendance_q = db.query(AttendanceRollup.user_id, AttendanceRollup.days_mask).filter(
+        AttendanceRollup.month == month_first
+    )
+    leaves_q = db.query(Leave.user_id, Leave.start_date, Leave.end_date).filter(and_(
+        Leave.status == LeaveStatus.APPROVED.value,
+        Leave.end_date >= month_first,
+        Leave.start_date <= month_last
+    ))
+    if user_filter is not None:
+        attendance_q = attendance_q.filter(AttendanceRollup.user_id.in_(user_filter))
+        leaves_q = leaves_q.filter(Leave.user_id.in_(user_filter))
+
+    covered = defaultdict(int)
+    for user_id, days_mask in attendance_q:
+        covered[user_id] |= days_mask
+    for user_id, start, end in leaves_q:
+        covered[user_id] |= span_mask(start, end, month_first, month_last)
+
+    working = get_calendar(db).month_mask(month_first)
+    working_days_count = working.bit_count()
+    month_label = month_first.strftime("%B %Y")
+    logger.debug(f"Payroll {month_label}: {len(users)} users, {working_days_count} working days")
+
+    results = []
+    for user in users:
+        unpaid_absences = (working & ~covered[user.id]).bit_count()
+
+        base = float(user.base_salary) if user.base_salary else DEFAULT_BASE_SALARY
+        deductions = base / days_in_month * unpaid_absences
+        tax = base * TAX_RATE
+        net = max(0, base - deductions - tax)
+
+        results.append({
+            "user_id": user.id,
+            "name": user.name,
+            "month": month_label,
+            "base_salary": round(base, 2),
+            "tax": round(tax, 2),
+            "deductions": round(deductions, 2),
+            "net_salary": round(net, 2),
+            "absent_days": unpaid_absences,
+            "working_days": working_days_count
+        })
+    return results
+
+
+def _payslip_dict(slip: Payslip, name: str) -> Dict:
+    data = {field: getattr(slip, field) for field in PAYSLIP_FIELDS}
+    data.update(user_id=slip.user_id, name=name, month=slip.month.strftime("%B %Y"))
+    return data
+
+
+def _payslip_row(month_first: date, data: Dict) -> Dict:
+    row = {field: data[field] for field in PAYSLIP_FIELDS}
+    row.update(user_id=data["user_id"], month=month_first)
+    return row
+
+
+def finalize_payroll(db: Session, month_first: date) -> List[Dict]:
+    """(Re)compute a closed month for every user and replace its stored payslips."""
+    results = compute_payroll(db, month_first)
+    db.query(Payslip).filter(Payslip.month == month_first).delete(synchronize_session=False)
+    if results:
+        db.execute(insert(Payslip), [_payslip_row(month_first, data) for data in results])
+    db.commit()
+    return results
+
+
+def get_payslip(db: Session, user: User, month_first: date, read_db: Optional[Session] = None) -> Dict:
+    """
+    Stored payslip for a closed month via the (user_id, month) unique index.
+    The first read of a month computes and persists it. The lookup goes to
+    `read_db` (a replica) when given; computing and storing always use `db`.
+    """
+    name = user.name
+    slip = (read_db or db).query(Payslip).filter(and_(
+        Payslip.user_id == user.id,
+        Payslip.month == month_first
+    )).first()
+    if slip is not None:
+        return _payslip_dict(slip, name)
+
+    data = compute_payroll(db, month_first, [user])[0]
+    db.add(Payslip(**_payslip_row(month_first, data)))
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent request stored this month first; serve its snapshot
+        db.rollback()
+        slip = db.query(Payslip).filter(and_(
+            Payslip.user_id == data["user_id"],
+            Payslip.month == month_first
+        )).one()
+        return _payslip_dict(slip, name)
+    return data
+
+
+def stored_month_payroll(db: Session, month_first: date) -> List[Dict]:
+    """
+    Every user's payroll for a closed month, ordered by user id: stored payslips in
+    one query, and users without one computed in a single batch (but not stored).
+    """
+    rows = db.query(User, Payslip).outerjoin(Payslip, and_(
+        Payslip.user_id == User.id,
+        Payslip.month == month_first
+    )).order_by(User.id).all()
+    missing = [user for user, slip in rows if slip is None]
+    computed = {data["user_id"]: data for data in compute_payroll(db, month_first, missing)} if missing else {}
+    return [_payslip_dict(slip, user.name) if slip is not None else computed[user.id] for user, slip in rows]
+
+
+def get_month_payslips(db: Session, month_first: date, read_db: Optional[Session] = None) -> List[Tuple[Dict, Optional[str]]]:
+    """
+    Every user's payslip for a closed month as (payslip, position) pairs ordered by user id.
+    Stored payslips are reused (read from `read_db` when given); users without one
+    are computed in a single batch and persisted through `db`.
+    """
+    rows = (read_db or db).query(User, Payslip).outerjoin(Payslip, and_(
+        Payslip.user_id == User.id,
+        Payslip.month == month_first
+    )).order_by(User.id).all()
+
+    missing = [user for user, slip in rows if slip is None]
+    computed = {}
+    if missing:
+        computed = {data["user_id"]: data for data in compute_payroll(db, month_first, missing)}
+        db.execute(insert(Payslip), [_payslip_row(month_first, data) for data in computed.values()])
+        try:
+            db.commit()
+        except IntegrityError:
+            # A concurrent read stored some of them first; start over from the stored rows
+            db.rollback()
+            return get_month_payslips(db, month_first)
+
+    return [
+        (_payslip_dict(slip, user.name) if slip is not None else computed[user.id], user.position)
+        for user, slip in rows
+    ]
@@ -0,0 +1,151 @@
+"""
+Payslip PDF Rendering (ReportLab), run on a bounded worker process pool
+
+ReportLab is imported on first render (in the worker processes), not when the
+API starts, so cold starts that never serve a payslip do not pay for it.
+"""
+import io
+import os
+import re
+import zipfile
+from collections import deque
+from typing import Iterable, Iterator, Tuple
+
+from workers import BoundedProcessPool, PoolSaturated
+
+# Serverless instances (Vercel) cannot keep worker processes: render inline there
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "0" if os.environ.get("VERCEL") else str(min(2, os.cpu_count() or 1))))
+PDF_MAX_PENDING = int(os.getenv("PDF_MAX_PENDING", "32"))
+PDF_TIMEOUT_SECONDS = float(os.getenv("PDF_TIMEOUT_SECONDS", "30"))
+
+pdf_pool = BoundedProcessPool("pdf", max_workers=PDF_WORKERS, max_pending=PDF_MAX_PENDING)
+
+
+def render_payslip_pdf(data: dict, position: str) -> bytes:
+    """Render one payslip (a payroll result dict) to PDF bytes."""
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import letter
+
+    # Generate PDF
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=letter)
+    width, height = letter
+    
+    # Header
+    c.setFont("Helvetica-Bold", 24)
+    c.drawCentredString(width/2, height - 50, "NexusHR Systems")
+    
+    c.setFont("Helvetica", 16)
+    c.drawCentredString(width/2, height - 80, f"Payslip for {data['month']}")
+    
+    # Employee Details
+    c.setFont("Helvetica", 12)
+    c.drawString(50, height - 130, f"Employee Name: {data['name']}")
+    c.drawString(50, height - 150, f"Employee ID: {data['user_id']}")
+    c.drawString(50, height - 170, f"Designation: {position}")
+    
+    # Table Header
+    y = height - 220
+    c.setFont("Helvetica-Bold", 12)
+    c.drawString(50, y, "Description")
+    c.drawRightString(width - 50, y, "Amount (INR)")
+    c.line(50, y - 5, width - 50, y - 5)
+    
+    # Table Content
+    y -= 30
+    c.setFont("Helvetica", 12)
+    
+    # Basic
+    c.drawString(50, y, "Basic Salary")
+    c.drawRightString(width - 50, y, f"{data['base_salary']:,.2f}")
+    y -= 25
+    
+    # Tax
+    c.drawString(50, y, "Tax Deductions (12%)")
+    c.drawRightString(width - 50, y, f"- {data['tax']:,.2f}")
+    y -= 25
+    
+    # Absences
+    c.drawString(50, y, f"Unpaid Leaves ({data['absent_days']} days)")
+    c.drawRightString(width - 50, y, f"- {data['deductions']:,.2f}")
+    y -= 25
+    
+    c.line(50, y + 5, width - 50, y + 5)
+    y -= 10
+    
+    # Net
+    c.setFont("Helvetica-Bold", 14)
+    c.drawString(50, y, "Net Salary Payable")
+    c.drawRightString(width - 50, y, f"{data['net_salary']:,.2f}")
+    
+    # Footer
+    c.setFont("Helvetica-Oblique", 10)
+    c.drawCentredString(width/2, 50, "System Generated Document - NexusHR Systems")
+    
+    c.showPage()
+    c.save()
+    
+    return buffer.getvalue()
+
+
+def payslip_filename(data: dict) -> str:
+    safe_name = re.sub(r"[^A-Za-z0-9]+", "_", data["name"]).strip("_")
+    return f"Payslip_{data['user_id']}_{safe_name}.pdf"
+
+
+def render_many(jobs: Iterable[Tuple[dict, str]], window: int) -> Iterator[bytes]:
+    """
+    Render (data, position) jobs on the pool, keeping at most `window` in flight,
+    and yield the PDFs in job order. When the shared pool is saturated by other
+    requests, wait on our own oldest job, or render inline if we have none queued.
+    """
+    in_flight = deque()
+    try:
+        for data, position in jobs:
+            while len(in_flight) >= window:
+                yield in_flight.popleft().result(timeout=PDF_TIMEOUT_SECONDS)
+            while True:
+                try:
+                    in_flight.append(pdf_pool.submit(render_payslip_pdf, data, position))
+                    break
+                except PoolSaturated:
+                    if in_flight:
+                        yield in_flight.popleft().result(timeout=PDF_TIMEOUT_SECONDS)
+                    else:
+                        # Nothing of ours is queued, so rendering here keeps the order
+                        yield render_payslip_pdf(data, position)
+                        break
+        while in_flight:
+            yield in_flight.popleft().result(timeout=PDF_TIMEOUT_SECONDS)
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+
+class _ZipStream:
+    """Write-only, non-seekable file object; zipfile falls back to data descriptors."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(entries: Iterable[Tuple[str, bytes]]) -> Iterator[bytes]:
+    """Yield a ZIP archive of (filename, content) entries one member at a time."""
+    sink = _ZipStream()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for filename, content in entries:
+            archive.writestr(filename, content)
+            yield sink.drain()
+    yield sink.drain()
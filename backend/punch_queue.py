@@ -0,0 +1,346 @@
+"""
+Write-Behind Punch Ingestion (optional, PUNCH_QUEUE_ENABLED=1)
+
+At shift start nearly every employee checks in within minutes and each request
+would otherwise pay for its own commit. In this mode a punch is validated
+against an in-memory copy of today's shift states, appended to a write-ahead
+file, acknowledged, and written to `attendances` by a background thread in
+multi-row batches.
+
+The in-memory state is only authoritative within one API process, so the mode
+is meant for single-worker deployments. Writes are idempotent (`ON CONFLICT DO
+NOTHING` inserts, check-outs only touch open shifts), so on start the whole
+write-ahead file is replayed, and it is truncated whenever everything it holds
+has been committed. A batch the database rejects outright (e.g. a punch of a
+user deleted since) is written one punch at a time and the punches it still
+rejects go to a dead-letter file, so one bad row cannot hold up the rest.
+"""
+import json
+import logging
+import os
+import queue
+import tempfile
+import threading
+import time as clock
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from datetime import date, time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import and_, bindparam, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DataError, IntegrityError
+
+from attendance import (
+    ALREADY_CHECKED_IN, ALREADY_CHECKED_OUT, NOT_CHECKED_IN, SHIFT_COMPLETED,
+    PunchRejected, check_in_status, worked_minutes
+)
+from database import dialect_inserts
+from models import Attendance
+from rollup import rebuild_rollups
+
+logger = logging.getLogger(__name__)
+
+PUNCH_QUEUE_ENABLED = os.getenv("PUNCH_QUEUE_ENABLED", "false").lower() in ("1", "true", "yes")
+PUNCH_QUEUE_MAX_PENDING = int(os.getenv("PUNCH_QUEUE_MAX_PENDING", "10000"))
+PUNCH_QUEUE_BATCH_SIZE = int(os.getenv("PUNCH_QUEUE_BATCH_SIZE", "500"))
+PUNCH_QUEUE_FLUSH_INTERVAL_MS = float(os.getenv("PUNCH_QUEUE_FLUSH_INTERVAL_MS", "50"))
+PUNCH_QUEUE_WAL_PATH = os.getenv("PUNCH_QUEUE_WAL_PATH", os.path.join(tempfile.gettempdir(), "hrms-punches.wal"))
+PUNCH_QUEUE_DEAD_LETTER_PATH = os.getenv("PUNCH_QUEUE_DEAD_LETTER_PATH", PUNCH_QUEUE_WAL_PATH + ".rejected")
+# Without fsync an acknowledged punch survives a process crash but not a power loss
+PUNCH_QUEUE_FSYNC = os.getenv("PUNCH_QUEUE_FSYNC", "false").lower() in ("1", "true", "yes")
+
+# Errors retrying cannot fix; anything else (lost connection, locked database) is retried
+REJECTED_ERRORS = (IntegrityError, DataError)
+
+
+class PunchQueueFull(Exception):
+    """Raised when the queue already holds its maximum number of unwritten punches."""
+
+
+@dataclass
+class Punch:
+    """One accepted punch; doubles as the in-memory shift state of its user and day."""
+    user_id: int
+    date: date
+    in_time: time
+    status: str
+    out_time: Optional[time] = None
+    work_minutes: Optional[int] = None
+
+    def to_json(self) -> str:
+        return json.dumps({k: v.isoformat() if isinstance(v, (date, time)) else v for k, v in asdict(self).items()})
+
+    @classmethod
+    def from_json(cls, line: str) -> "Punch":
+        data = json.loads(line)
+        data["date"] = date.fromisoformat(data["date"])
+        data["in_time"] = time.fromisoformat(data["in_time"])
+        if data["out_time"] is not None:
+            data["out_time"] = time.fromisoformat(data["out_time"])
+        return cls(**data)
+
+
+class PunchQueue:
+    def __init__(
+        self,
+        wal_path: str,
+        max_pending: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 0.05,
+        fsync: bool = False,
+        dead_letter_path: Optional[str] = None,
+    ):
+        self.wal_path = wal_path
+        self.dead_letter_path = dead_letter_path or wal_path + ".rejected"
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.flushed = 0
+        self.rejected = 0
+        self._queue: "queue.Queue[Punch]" = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._unflushed = 0
+        self._shifts: Dict[int, Punch] = {}
+        self._shifts_date: Optional[date] = None
+        # mark_stale bumps _generation; the shifts are current while _loaded_generation matches
+        self._generation = 0
+        self._loaded_generation = 0
+        self._bind: Optional[Engine] = None
+        self._on_flush: Optional[Callable[[List[int]], None]] = None
+        self._wal = None
+        self._writer: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    @property
+    def pending(self) -> int:
+        return self._unflushed
+
+    def start(self, bind: Engine, on_flush: Optional[Callable[[List[int]], None]] = None) -> None:
+        """Replay any punches left in the write-ahead file, then start the writer thread."""
+        self._bind = bind
+        self._on_flush = on_flush
+        replayed = self._replay()
+        if replayed:
+            logger.warning(f"Replayed {replayed} punches from {self.wal_path}")
+        self._wal = open(self.wal_path, "a", encoding="utf-8")
+        self._stopping.clear()
+        self._writer = threading.Thread(target=self._run, name="punch-writer", daemon=True)
+        self._writer.start()
+
+    def stop(self) -> None:
+        """Write everything still queued and close the write-ahead file."""
+        if self._writer is None:
+            return
+        self._stopping.set()
+        self._writer.join()
+        self._writer = None
+        with self._lock:
+            self._wal.close()
+            self._wal = None
+
+    # ---- punches (request threads) ----
+
+    def mark_stale(self) -> None:
+        """Reload shift states on the next punch (after another path wrote attendance)."""
+        with self._lock:
+            self._generation += 1
+
+    def _load_shifts(self, today: date) -> None:
+        """Load today's shift states in one query, run without holding self._lock."""
+        with self._lock:
+            generation = self._generation
+        table = Attendance.__table__
+        with self._bind.connect() as conn:
+            rows = conn.execute(
+                select(table.c.user_id, table.c.in_time, table.c.status, table.c.out_time, table.c.work_minutes)
+                .where(table.c.date == today)
+            ).all()
+        with self._lock:
+            if self._shifts_date == today and self._loaded_generation == self._generation:
+                return  # another request thread loaded them meanwhile
+            shifts = {
+                row.user_id: Punch(row.user_id, today, row.in_time, row.status, row.out_time, row.work_minutes)
+                for row in rows
+            }
+            if self._shifts_date == today:
+                # Punches accepted here may not be written yet
+                shifts.update(self._shifts)
+            self._shifts = shifts
+            self._shifts_date = today
+            self._loaded_generation = generation
+
+    @contextmanager
+    def _shifts_for(self, today: date) -> Iterator[Dict[int, Punch]]:
+        """Hold self._lock over today's shift states, loading them first on the first punch of a day."""
+        while True:
+            with self._lock:
+                if self._shifts_date == today and self._loaded_generation == self._generation:
+                    yield self._shifts
+                    return
+            self._load_shifts(today)
+
+    def _accept(self, punch: Punch) -> None:
+        # Caller holds self._lock, so nothing else can fill the queue in between
+        if self._queue.full():
+            raise PunchQueueFull(f"punch queue is full ({self._queue.maxsize} punches pending)")
+        self._wal.write(punch.to_json() + "\n")
+        self._wal.flush()
+        if self.fsync:
+            os.fsync(self._wal.fileno())
+        self._queue.put_nowait(punch)
+        self._unflushed += 1
+
+    def check_in(self, user_id: int, today: date, now: time) -> Punch:
+        """Same rules and messages as attendance.open_shift; returns the queued shift."""
+        with self._shifts_for(today) as shifts:
+            current = shifts.get(user_id)
+            if current is not None:
+                raise PunchRejected(SHIFT_COMPLETED if current.out_time is not None else ALREADY_CHECKED_IN)
+            punch = Punch(user_id, today, now, check_in_status(now))
+            self._accept(punch)
+            shifts[user_id] = punch
+            return punch
+
+    def check_out(self, user_id: int, today: date, now: time) -> Punch:
+        """Same rules and messages as attendance.close_shift; returns the queued shift."""
+        with self._shifts_for(today) as shifts:
+            current = shifts.get(user_id)
+            if current is None:
+                raise PunchRejected(NOT_CHECKED_IN)
+            if current.out_time is not None:
+                raise PunchRejected(ALREADY_CHECKED_OUT)
+            minutes = worked_minutes(today, current.in_time, now) if current.in_time else None
+            punch = Punch(user_id, today, current.in_time, current.status, now, minutes)
+            self._accept(punch)
+            shifts[user_id] = punch
+            return punch
+
+    # ---- writer thread ----
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch:
+                self._flush(batch)
+            elif self._stopping.is_set():
+                return
+
+    def _next_batch(self) -> List[Punch]:
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch: List[Punch]) -> None:
+        while True:
+            try:
+                self._write_isolating(batch)
+                break
+            except Exception as e:
+                if self._stopping.is_set():
+                    # Still in the write-ahead file; replayed on the next start
+                    logger.error(f"Dropping {len(batch)} punches from memory on shutdown: {e}")
+                    return
+                logger.error(f"Punch flush failed, retrying: {e}")
+                clock.sleep(1)
+
+        with self._lock:
+            self._unflushed -= len(batch)
+            self.flushed += len(batch)
+            if self._unflushed == 0:
+                self._wal.seek(0)
+                self._wal.truncate()
+        if self._on_flush is not None:
+            self._on_flush(sorted({punch.user_id for punch in batch}))
+
+    def _write_isolating(self, punches: List[Punch]) -> None:
+        """
+        `write`, but when the database rejects the batch outright, write its punches
+        one at a time and dead-letter those it still rejects. Other errors propagate
+        (the caller retries; writes are idempotent).
+        """
+        try:
+            self.write(punches)
+        except REJECTED_ERRORS as e:
+            if len(punches) > 1:
+                logger.error(f"Punch batch rejected, writing its {len(punches)} punches one by one: {e}")
+                for punch in punches:
+                    self._write_isolating([punch])
+            else:
+                self._dead_letter(punches[0], e)
+
+    def _dead_letter(self, punch: Punch, error: Exception) -> None:
+        logger.error(f"Punch rejected by the database, moved to {self.dead_letter_path}: {punch.to_json()}: {error}")
+        with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"punch": json.loads(punch.to_json()), "error": str(error).splitlines()[0]}) + "\n")
+        with self._lock:
+            self.rejected += 1
+            # Forget the punch in memory and reload the shift states from the database
+            if self._shifts_date == punch.date:
+                self._shifts.pop(punch.user_id, None)
+            self._generation += 1
+
+    def write(self, punches: Iterable[Punch]) -> None:
+        """
+        Apply punches in one transaction: one multi-row insert for the shifts, one
+        executemany update for the check-outs, then the touched monthly rollups are
+        recomputed. Idempotent, so replaying is safe.
+        """
+        # A check-out in the batch may close a shift opened in the same batch
+        rows = {(p.user_id, p.date): p for p in punches}
+        table = Attendance.__table__
+        with self._bind.begin() as conn:
+            insert = dialect_inserts[conn.dialect.name]
+            conn.execute(insert(table).values([
+                {"user_id": p.user_id, "date": p.date, "status": p.status, "in_time": p.in_time}
+                for p in rows.values()
+            ]).on_conflict_do_nothing(index_elements=["user_id", "date"]))
+
+            closed = [p for p in rows.values() if p.out_time is not None]
+            if closed:
+                conn.execute(update(table).where(and_(
+                    table.c.user_id == bindparam("b_user_id"),
+                    table.c.date == bindparam("b_date"),
+                    table.c.out_time.is_(None)
+                )).values(
+                    out_time=bindparam("b_out_time"),
+                    work_minutes=bindparam("b_work_minutes")
+                ), [
+                    {"b_user_id": p.user_id, "b_date": p.date, "b_out_time": p.out_time, "b_work_minutes": p.work_minutes}
+                    for p in closed
+                ])
+            rebuild_rollups(conn, rows.keys())
+
+    def _replay(self) -> int:
+        punches = []
+        try:
+            with open(self.wal_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        punches.append(Punch.from_json(line))
+                    except (ValueError, KeyError, TypeError):
+                        # Torn final write from a crash; it was never acknowledged
+                        logger.warning(f"Skipping unreadable line in {self.wal_path}")
+        except FileNotFoundError:
+            return 0
+        for start in range(0, len(punches), self.batch_size):
+            self._write_isolating(punches[start:start + self.batch_size])
+        open(self.wal_path, "w").close()
+        return len(punches)
+
+
+punch_queue = PunchQueue(
+    PUNCH_QUEUE_WAL_PATH,
+    max_pending=PUNCH_QUEUE_MAX_PENDING,
+    batch_size=PUNCH_QUEUE_BATCH_SIZE,
+    flush_interval=PUNCH_QUEUE_FLUSH_INTERVAL_MS / 1000,
+    fsync=PUNCH_QUEUE_FSYNC,
+    dead_letter_path=PUNCH_QUEUE_DEAD_LETTER_PATH,
+) if PUNCH_QUEUE_ENABLED else None
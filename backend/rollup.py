@@ -0,0 +1,161 @@
+"""
+Monthly Attendance Rollup (one row per user and month)
+
+Dashboards, payroll and hour reports read `attendance_rollups` instead of
+scanning raw attendance. Rows are kept current in three ways:
+
+* check-in / check-out add their increments with a single upsert in the same
+  transaction as the punch (`bump_rollup`);
+* batch writers (punch queue, bulk upload) and ORM flushes recompute just the
+  user-months they touched (`rebuild_rollups`);
+* a full rebuild backfills everything: `python rollup.py` (from backend/).
+
+`days_mask` has bit d-1 set when the user attended on day d, the same day-bitmask
+representation payroll uses, so leave/holiday overlap stays exact.
+"""
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import Select, and_, case, delete, event, func, insert, inspect, select
+
+from database import dialect_inserts
+from models import Attendance, AttendanceRollup
+from work_calendar import month_last_day, span_mask
+
+PRESENT_STATUSES = ["Present", "Late", "Half-day"]
+OVERTIME_AFTER_MINUTES = 8 * 60
+COUNTERS = ["present_days", "late_days", "half_days", "completed_shifts", "minutes_worked", "overtime_minutes"]
+
+
+def month_of(day: date) -> date:
+    return day.replace(day=1)
+
+
+def _increments(day: date, status: Optional[str] = None, work_minutes: Optional[int] = None) -> Dict:
+    """Rollup contribution of one attendance row (or of one punch's changes to it)."""
+    return {
+        "present_days": int(status == "Present"),
+        "late_days": int(status == "Late"),
+        "half_days": int(status == "Half-day"),
+        "days_mask": 1 << (day.day - 1) if status in PRESENT_STATUSES else 0,
+        "completed_shifts": int(work_minutes is not None),
+        "minutes_worked": work_minutes or 0,
+        "overtime_minutes": max(0, (work_minutes or 0) - OVERTIME_AFTER_MINUTES),
+    }
+
+
+def bump_rollup(conn, user_id: int, day: date, status: Optional[str] = None, work_minutes: Optional[int] = None) -> None:
+    """Add one punch's effect: `status` for a check-in, `work_minutes` for a check-out."""
+    table = AttendanceRollup.__table__
+    stmt = dialect_inserts[conn.dialect.name](table).values(
+        user_id=user_id, month=month_of(day), **_increments(day, status, work_minutes)
+    )
+    set_ = {name: table.c[name] + stmt.excluded[name] for name in COUNTERS}
+    set_["days_mask"] = table.c.days_mask.op("|")(stmt.excluded.days_mask)
+    conn.execute(stmt.on_conflict_do_update(index_elements=["user_id", "month"], set_=set_))
+
+
+def _aggregate(rows) -> Dict[Tuple[int, date], Dict]:
+    totals = defaultdict(lambda: dict.fromkeys(COUNTERS + ["days_mask"], 0))
+    for user_id, day, status, work_minutes in rows:
+        total = totals[(user_id, month_of(day))]
+        for name, value in _increments(day, status, work_minutes).items():
+            total[name] = total[name] | value if name == "days_mask" else total[name] + value
+    return totals
+
+
+def rebuild_rollups(conn, pairs: Optional[Iterable[Tuple[int, date]]] = None) -> int:
+    """
+    Recompute rollups from `attendances`: for every user and month in `pairs`
+    (any date within the month will do), or for everything when `pairs` is None.
+    Returns the number of rollup rows written.
+    """
+    table = AttendanceRollup.__table__
+    source = select(Attendance.user_id, Attendance.date, Attendance.status, Attendance.work_minutes)
+    if pairs is None:
+        conn.execute(delete(table))
+    else:
+        # Rebuilt as users x months, so the delete never drops a row that is not recomputed
+        pairs = list(pairs)
+        users = {user_id for user_id, _ in pairs}
+        months = {month_of(day) for _, day in pairs}
+        if not users:
+            return 0
+        first, last = min(months), max(months)
+        last_day = date(last.year + last.month // 12, last.month % 12 + 1, 1)
+        conn.execute(delete(table).where(and_(table.c.user_id.in_(users), table.c.month.in_(months))))
+        source = source.where(and_(
+            Attendance.user_id.in_(users),
+            Attendance.date >= first,
+            Attendance.date < last_day
+        ))
+
+    totals = {
+        key: total for key, total in _aggregate(conn.execute(source)).items()
+        if pairs is None or key[1] in months
+    }
+    if totals:
+        conn.execute(insert(table), [
+            {"user_id": user_id, "month": month, **total} for (user_id, month), total in totals.items()
+        ])
+    return len(totals)
+
+
+def attended_days_query(since: date, until: date) -> Select:
+    """
+    SELECT of the number of attended days in [since, until] summed over the rollup
+    rows (one per user and month it spans); add a `user_id` filter for one employee.
+    """
+    months = []
+    month = month_of(since)
+    while month <= until:
+        months.append(month)
+        month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+    in_window = case(
+        *[(AttendanceRollup.month == m, AttendanceRollup.days_mask.op("&")(span_mask(since, until, m, month_last_day(m))))
+          for m in months],
+        else_=0
+    )
+    return select(func.coalesce(func.sum(sql_popcount(in_window)), 0)).where(
+        AttendanceRollup.month.in_(months)
+    )
+
+
+def sql_popcount(x):
+    """
+    Number of set bits of a non-negative 31-bit integer SQL expression. Neither
+    SQLite nor Postgres has a portable popcount, so this is the SWAR bit count
+    with a final `% 255` (sums the four byte counts without a 32-bit multiply).
+    """
+    x = x - x.op(">>")(1).op("&")(0x55555555)
+    x = x.op("&")(0x33333333) + x.op(">>")(2).op("&")(0x33333333)
+    x = (x + x.op(">>")(4)).op("&")(0x0F0F0F0F)
+    return x % 255
+
+
+@event.listens_for(Attendance.user_id, "set", active_history=True, retval=True)
+@event.listens_for(Attendance.date, "set", active_history=True, retval=True)
+def _load_previous_key(target, value, oldvalue, initiator):
+    # Only here for active_history: after_update needs the month a row moved out of
+    return value
+
+
+# Attendance written through the ORM unit of work (seeding, admin edits, fixtures)
+@event.listens_for(Attendance, "after_insert")
+@event.listens_for(Attendance, "after_update")
+@event.listens_for(Attendance, "after_delete")
+def _rebuild_for_attendance(mapper, connection, target: Attendance) -> None:
+    state = inspect(target)
+    old_users = state.attrs.user_id.history.deleted or [target.user_id]
+    old_days = state.attrs.date.history.deleted or [target.date]
+    pairs = {(target.user_id, target.date)} | {(u, d) for u in old_users for d in old_days}
+    rebuild_rollups(connection, pairs)
+
+
+if __name__ == "__main__":
+    from database import Base, engine
+
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        print(f"Rebuilt {rebuild_rollups(conn)} attendance rollup rows")
@@ -10,6 +10,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from database import SessionLocal, Base, engine
 from models import User, Attendance, Leave, UserRole, LeaveStatus
+from migrations import upgrade_schema
 
 # Password hashing setup
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -100,7 +101,7 @@ def seed_attendance(db):
             status = "Present"
             in_time = time(9, 30)
             out_time = time(18, 30)
-            work_hours = "9h 0m"
+            work_minutes = 9 * 60
             
             att = Attendance(
                 user_id=rahul.id,
@@ -108,7 +109,7 @@ def seed_attendance(db):
                 status=status,
                 in_time=in_time,
                 out_time=out_time,
-                work_hours=work_hours
+                work_minutes=work_minutes
             )
             db.add(att)
             print(f"Marked Present for Rahul on {d}")
@@ -117,7 +118,7 @@ def seed_attendance(db):
             status = "Late"
             in_time = time(10, 45)
             out_time = time(18, 30)
-            work_hours = "7h 45m"
+            work_minutes = 7 * 60 + 45
             
             att = Attendance(
                 user_id=rahul.id,
@@ -125,7 +126,7 @@ def seed_attendance(db):
                 status=status,
                 in_time=in_time,
                 out_time=out_time,
-                work_hours=work_hours
+                work_minutes=work_minutes
             )
             db.add(att)
             print(f"Marked Late for Rahul on {d}")
@@ -190,6 +191,7 @@ def seed_leaves(db):
 def main():
     print("Initializing Database Seeding...")
     Base.metadata.create_all(bind=engine) # Ensure tables exist
+    upgrade_schema(engine)
     
     db = SessionLocal()
     try:
@@ -0,0 +1,126 @@
+"""
+Company Working-Day Calendar
+
+A working day is a weekday that is not a company holiday. The `holidays` table
+changes a few times a year, so it is read once into a `WorkCalendar` snapshot
+that keeps each month as a day bitmask (bit `d - 1` stands for day `d`, as in
+payroll); counting the working days between two dates is then one popcount per
+month. Holiday writes through the ORM drop the snapshot when their transaction
+commits (dropping it at flush would let a concurrent reload cache the old rows);
+writes handled by other worker processes show up after at most
+CALENDAR_CACHE_TTL_SECONDS.
+"""
+import bisect
+import calendar
+import os
+from datetime import date, timedelta
+from typing import Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from cache import TTLCache
+from models import Holiday
+
+CALENDAR_CACHE_TTL_SECONDS = float(os.getenv("CALENDAR_CACHE_TTL_SECONDS", "3600"))
+_snapshots = TTLCache(maxsize=1, ttl=CALENDAR_CACHE_TTL_SECONDS)
+
+
+def month_last_day(month_first: date) -> date:
+    return date(month_first.year, month_first.month, calendar.monthrange(month_first.year, month_first.month)[1])
+
+
+def span_mask(start: date, end: date, month_first: date, month_last: date) -> int:
+    """Bitmask of the days of `start..end` that fall inside the month."""
+    start, end = max(start, month_first), min(end, month_last)
+    if start > end:
+        return 0
+    return ((1 << (end.day - start.day + 1)) - 1) << (start.day - 1)
+
+
+def working_day_mask(month_first: date, holiday_dates) -> int:
+    """Bitmask of the month's weekdays that are not company holidays."""
+    mask = 0
+    for day in range(1, month_last_day(month_first).day + 1):
+        d = month_first.replace(day=day)
+        if d.weekday() < 5 and d not in holiday_dates:
+            mask |= 1 << (day - 1)
+    return mask
+
+
+class WorkCalendar:
+    """Working-day lookups over one snapshot of the holidays table."""
+
+    def __init__(self, holidays: Dict[date, str], rows: Sequence = ()):
+        self.holidays = holidays
+        self.rows = sorted(rows, key=lambda row: row.date)
+        self._dates = sorted(holidays)
+        self._masks: Dict[date, int] = {}
+
+    def month_mask(self, month_first: date) -> int:
+        mask = self._masks.get(month_first)
+        if mask is None:
+            mask = self._masks[month_first] = working_day_mask(month_first, self.holidays)
+        return mask
+
+    def is_working_day(self, day: date) -> bool:
+        return day.weekday() < 5 and day not in self.holidays
+
+    def working_days_between(self, start: date, end: date) -> int:
+        """Working days in `start..end`, both inclusive (0 if end < start)."""
+        count = 0
+        month_first = start.replace(day=1)
+        while month_first <= end:
+            month_last = month_last_day(month_first)
+            count += (self.month_mask(month_first) & span_mask(start, end, month_first, month_last)).bit_count()
+            month_first = month_last + timedelta(days=1)
+        return count
+
+    def next_holiday(self, day: date) -> Optional[Tuple[date, str]]:
+        """The first holiday on or after `day`."""
+        i = bisect.bisect_left(self._dates, day)
+        if i == len(self._dates):
+            return None
+        return self._dates[i], self.holidays[self._dates[i]]
+
+    def holidays_in_year(self, year: int) -> list:
+        """Full holiday rows (id, date, name, description) of one year, by date."""
+        dates = [row.date for row in self.rows]
+        start = bisect.bisect_left(dates, date(year, 1, 1))
+        end = bisect.bisect_right(dates, date(year, 12, 31))
+        return self.rows[start:end]
+
+
+def get_calendar(db: Session) -> WorkCalendar:
+    """The current snapshot, loaded with one query when missing or expired."""
+    snapshot = _snapshots.get("calendar")
+    if snapshot is None:
+        rows = db.query(Holiday.id, Holiday.date, Holiday.name, Holiday.description).all()
+        snapshot = WorkCalendar({row.date: row.name for row in rows}, rows)
+        _snapshots.set("calendar", snapshot)
+    return snapshot
+
+
+def invalidate_calendar() -> None:
+    _snapshots.clear()
+
+
+# Session.info flag: this transaction has flushed holiday changes
+_CHANGED_KEY = "holidays_changed"
+
+
+@event.listens_for(Session, "after_flush")
+def _holidays_flushed(session: Session, flush_context) -> None:
+    if any(isinstance(obj, Holiday) for obj in (*session.new, *session.dirty, *session.deleted)):
+        session.info[_CHANGED_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _holidays_committed(session: Session) -> None:
+    if session.info.pop(_CHANGED_KEY, False):
+        invalidate_calendar()
+
+
+@event.listens_for(Session, "after_rollback")
+def _holidays_rolled_back(session: Session) -> None:
+    session.info.pop(_CHANGED_KEY, None)
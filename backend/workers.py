@@ -0,0 +1,106 @@
+"""
+Bounded process pools for CPU-heavy work (bcrypt verification, PDF rendering)
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PoolSaturated(Exception):
+    """Raised when a pool already has its maximum number of tasks queued or running."""
+
+
+class BoundedProcessPool:
+    """
+    Lazily started process pool that refuses work beyond `max_pending` tasks.
+
+    Callers turn `PoolSaturated` into back-pressure (HTTP 503) instead of letting
+    an unbounded queue build up. With `max_workers == 0` tasks run inline in the
+    calling thread, which suits serverless instances that cannot keep workers.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_pending: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        executor = self._executor
+        if executor is None:
+            with self._lock:
+                # Another thread may have started it while we waited for the lock
+                if self._executor is None:
+                    # spawn, not fork: the API process is multi-threaded
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+                executor = self._executor
+        return executor
+
+    def _restart(self, broken: ProcessPoolExecutor) -> ProcessPoolExecutor:
+        """Replace `broken` with a fresh executor, unless another thread already did."""
+        with self._lock:
+            if self._executor is broken:
+                logger.warning(f"{self.name} pool broken; restarting workers")
+                self._executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+        return self._get_executor()
+
+    def _release(self, _future: Future = None) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def submit(self, fn: Callable, *args: Any) -> Future:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise PoolSaturated(f"{self.name} pool is saturated ({self._pending} tasks pending)")
+            self._pending += 1
+
+        try:
+            future = None
+            if self.max_workers > 0:
+                try:
+                    executor = self._get_executor()
+                    try:
+                        future = executor.submit(fn, *args)
+                    except BrokenProcessPool:
+                        future = self._restart(executor).submit(fn, *args)
+                except OSError:
+                    # e.g. no /dev/shm for the pool's semaphores (AWS Lambda): run inline from now on
+                    logger.exception(f"{self.name} pool cannot start worker processes; running tasks inline")
+                    self.max_workers = 0
+            if future is None:
+                future = Future()
+                try:
+                    future.set_result(fn(*args))
+                except BaseException as exc:
+                    future.set_exception(exc)
+        except BaseException:
+            self._release()
+            raise
+
+        future.add_done_callback(self._release)
+        return future
+
+    def run(self, fn: Callable, *args: Any, timeout: Optional[float] = None) -> Any:
+        """Run `fn(*args)` on the pool and block the calling thread until it finishes."""
+        return self.submit(fn, *args).result(timeout=timeout)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
@@ -117,6 +117,23 @@ export const AuthProvider = ({ children }) => {
     return response;
   };
 
+  // GET every page of a keyset-paginated list (e.g. /leaves), following the
+  // X-Next-Cursor header until the last page
+  const authFetchAll = async (url) => {
+    const items = [];
+    let cursor = null;
+    do {
+      const separator = url.includes('?') ? '&' : '?';
+      const response = await authFetch(cursor ? `${url}${separator}cursor=${encodeURIComponent(cursor)}` : url);
+      if (!response.ok) {
+        throw new Error(`Request failed: ${response.status}`);
+      }
+      items.push(...(await response.json()));
+      cursor = response.headers.get('X-Next-Cursor');
+    } while (cursor);
+    return items;
+  };
+
   const value = {
     user,
     token,
@@ -126,6 +143,7 @@ export const AuthProvider = ({ children }) => {
     isAdmin: user?.role === 'admin',
     getAuthHeaders,
     authFetch,
+    authFetchAll,
     API_BASE_URL
   };
 
@@ -5,12 +5,14 @@ import { Badge } from '../components/ui/badge';
 import { Avatar, AvatarFallback } from '../components/ui/avatar';
 import { CheckCircle, XCircle, Clock, FileText, Calendar, User, Loader2 } from 'lucide-react';
 import { toast } from 'sonner';
+import { useAuth } from '../contexts/AuthContext';
 
 const API_BASE_URL = process.env.REACT_APP_API_URL !== undefined 
   ? process.env.REACT_APP_API_URL 
   : (process.env.NODE_ENV === 'production' ? '' : 'http://localhost:8000');
 
 export default function ApprovalCenter() {
+  const { authFetchAll } = useAuth();
   const [requests, setRequests] = useState([]);
   const [loading, setLoading] = useState(true);
   const [processingIds, setProcessingIds] = useState(new Set());
@@ -19,26 +21,14 @@ export default function ApprovalCenter() {
   // Fetch leaves from backend on mount
   useEffect(() => {
     fetchLeaves();
+    // eslint-disable-next-line react-hooks/exhaustive-deps
   }, []);
 
   const fetchLeaves = async () => {
     try {
       setLoading(true);
-      const token = localStorage.getItem('token');
-
-      const response = await fetch(`${API_BASE_URL}/leaves`, {
-        headers: {
-          'Authorization': `Bearer ${token}`,
-          'Content-Type': 'application/json'
-        }
-      });
-
-      if (!response.ok) {
-        throw new Error('Failed to fetch leaves');
-      }
-
-      const data = await response.json();
-      setRequests(data);
+      // /leaves is paginated: follow the cursor so older pending requests are not dropped
+      setRequests(await authFetchAll('/leaves?limit=500'));
     } catch (error) {
       console.error('Error fetching leaves:', error);
       toast.error('Failed to load leave requests');
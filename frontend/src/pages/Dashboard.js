@@ -47,12 +47,10 @@ function AdminDashboard() {
         setStats(statsData);
       }
 
-      // Fetch pending leaves
-      const leavesResponse = await authFetch('/leaves');
+      // Fetch the newest pending leaves (the card shows three)
+      const leavesResponse = await authFetch('/leaves?status=Pending&limit=3');
       if (leavesResponse.ok) {
-        const leavesData = await leavesResponse.json();
-        const pending = leavesData.filter(l => l.status === 'Pending');
-        setPendingLeaves(pending);
+        setPendingLeaves(await leavesResponse.json());
       }
     } catch (error) {
       console.error('Error fetching dashboard data:', error);
@@ -11,7 +11,7 @@ import { Calendar, FileText, Plus, Loader2 } from 'lucide-react';
 import { toast } from 'sonner';
 
 export default function Leaves() {
-  const { authFetch } = useAuth();
+  const { authFetch, authFetchAll } = useAuth();
   const [showForm, setShowForm] = useState(false);
   const [loading, setLoading] = useState(true);
   const [submitting, setSubmitting] = useState(false);
@@ -32,11 +32,7 @@ export default function Leaves() {
   const fetchMyLeaves = async () => {
     try {
       setLoading(true);
-      const response = await authFetch('/leaves');
-      if (response.ok) {
-        const data = await response.json();
-        setMyLeaves(data);
-      }
+      setMyLeaves(await authFetchAll('/leaves?limit=500'));
     } catch (error) {
       console.error('Error fetching leaves:', error);
       toast.error('Failed to load leave requests');
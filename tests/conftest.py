@@ -4,20 +4,31 @@ Uses an isolated in-memory SQLite database with StaticPool for test execution.
 """
 import sys
 import os
+import shutil
+import tempfile
+from contextlib import asynccontextmanager
 import pytest
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 from fastapi.testclient import TestClient
 
+# The app's own engine (used by its startup hook) gets a throwaway database
+# instead of ./hrms.db; set before `database` is imported
+app_db_dir = tempfile.mkdtemp(prefix="hrms-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(app_db_dir, 'hrms.db')}"
+
 # Add backend directory to sys.path
 backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend"))
 if backend_dir not in sys.path:
     sys.path.insert(0, backend_dir)
 
-from database import Base, get_db
+from database import Base, get_db, get_session_scope
 from models import User, Attendance, Leave, Holiday, UserRole, LeaveStatus
-from main import app, get_password_hash
+import main
+from main import app, principal_cache, dashboard_cache
+from passwords import get_password_hash
+from work_calendar import invalidate_calendar
 
 # Single in-memory SQLite engine with StaticPool so all sessions share the DB
 test_engine = create_engine(
@@ -28,10 +39,21 @@ test_engine = create_engine(
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=test_engine)
 
 
+@pytest.fixture(scope="session", autouse=True)
+def app_database():
+    """Remove the app engine's throwaway database after the run."""
+    yield
+    main.engine.dispose()
+    shutil.rmtree(app_db_dir, ignore_errors=True)
+
+
 @pytest.fixture(autouse=True)
 def setup_test_db():
     """Create and seed the test database before each test, drop after."""
     Base.metadata.create_all(bind=test_engine)
+    principal_cache.clear()
+    dashboard_cache.clear()
+    invalidate_calendar()
     session = TestingSessionLocal()
 
     # Seed Admin User
@@ -64,6 +86,45 @@ def setup_test_db():
     Base.metadata.drop_all(bind=test_engine)
 
 
+@pytest.fixture
+def db_session():
+    """Direct session on the test database for arranging or inspecting rows."""
+    session = TestingSessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@asynccontextmanager
+async def override_session_scope():
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def count_statements(db_session):
+    """count_statements(fn): run fn() and return the SQL statements it sent to the test database."""
+    engine = db_session.get_bind()
+
+    def run(fn):
+        statements = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", count)
+        try:
+            fn()
+        finally:
+            event.remove(engine, "before_cursor_execute", count)
+        return statements
+    return run
+
+
 @pytest.fixture
 def client():
     """FastAPI TestClient with overridden get_db dependency."""
@@ -75,6 +136,7 @@ def client():
             db.close()
 
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_session_scope] = lambda: override_session_scope
     with TestClient(app) as test_client:
         yield test_client
     app.dependency_overrides.clear()
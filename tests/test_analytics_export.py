@@ -0,0 +1,117 @@
+"""
+Columnar Analytics Export Test Suite (Parquet / Arrow IPC over HTTP and to files).
+"""
+import io
+from datetime import date, time
+
+import pytest
+
+import analytics_export
+import main
+import payroll
+from analytics_export import ColumnarExportUnavailable, write_dataset_files
+from models import Attendance, Leave, Payslip
+
+EXPORT_RANGE = {"from_date": "2025-01-01", "to_date": "2025-02-28"}
+
+
+@pytest.fixture
+def history(db_session):
+    """Two employees' weekday attendance for January and February 2025, and one leave."""
+    for day in (6, 7, 8, 9, 10):
+        for month in (1, 2):
+            for user_id in (1, 2):
+                db_session.add(Attendance(user_id=user_id, date=date(2025, month, day), status="Present",
+                                          in_time=time(9, 0), out_time=time(18, 0), work_minutes=540))
+    db_session.add(Leave(user_id=2, start_date=date(2025, 2, 17), end_date=date(2025, 2, 18),
+                         leave_type="Sick", reason="Flu", status="Approved"))
+    db_session.commit()
+
+
+def export(client, token, dataset, **params):
+    return client.get(f"/analytics/export/{dataset}", params={**EXPORT_RANGE, **params},
+                      headers={"Authorization": f"Bearer {token}"})
+
+
+def test_parquet_export_over_http(client, admin_token, employee_token, history):
+    """Test a typed Parquet attendance dump for admins only."""
+    pq = pytest.importorskip("pyarrow.parquet")
+    assert export(client, employee_token, "attendances").status_code == 403
+
+    response = export(client, admin_token, "attendances")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/vnd.apache.parquet"
+    assert 'filename="attendances_2025-01-01_2025-02-28.parquet"' in response.headers["content-disposition"]
+    table = pq.read_table(io.BytesIO(response.content))
+    assert table.num_rows == 20
+    assert str(table.schema.field("date").type) == "date32[day]"
+    assert table.column("work_minutes").to_pylist() == [540] * 20
+
+    leaves = pq.read_table(io.BytesIO(export(client, admin_token, "leaves").content))
+    assert leaves.column("reason").to_pylist() == ["Flu"]
+
+
+def test_arrow_export_of_payroll_and_users(client, admin_token, history):
+    """Test computed payroll per month and users without password hashes as Arrow IPC streams."""
+    pa = pytest.importorskip("pyarrow")
+    response = export(client, admin_token, "payroll", format="arrow")
+    assert response.headers["content-type"] == "application/vnd.apache.arrow.stream"
+    payroll = pa.ipc.open_stream(response.content).read_all()
+    assert payroll.num_rows == 4  # two users x two months
+    assert payroll.column("month").to_pylist() == [date(2025, 1, 1)] * 2 + [date(2025, 2, 1)] * 2
+
+    users = pa.ipc.open_stream(export(client, admin_token, "users", format="arrow").content).read_all()
+    assert users.column("email").to_pylist() == ["admin@hrms.com", "rahul@hrms.com"]
+    assert "hashed_password" not in users.schema.names
+
+
+def test_payroll_export_reads_stored_payslips(client, admin_token, db_session, history, monkeypatch):
+    """Test that closed months come from the stored payslips and only the open month is computed."""
+    pa = pytest.importorskip("pyarrow")
+    db_session.add(Payslip(user_id=2, month=date(2025, 1, 1), base_salary=1, tax=0, deductions=0,
+                           net_salary=12345.0, absent_days=0, working_days=20))
+    db_session.commit()
+    computed = []
+    compute = payroll.compute_payroll
+
+    def recording_compute(db, month_first, users=None):
+        computed.append((month_first, users and [user.id for user in users]))
+        return compute(db, month_first, users)
+    monkeypatch.setattr(payroll, "compute_payroll", recording_compute)
+    monkeypatch.setattr(analytics_export, "compute_payroll", recording_compute)
+
+    table = pa.ipc.open_stream(export(client, admin_token, "payroll", format="arrow").content).read_all()
+    assert table.column("net_salary").to_pylist()[1] == 12345.0
+    # January: only the admin lacks a stored payslip; February: nobody has one
+    assert computed == [(date(2025, 1, 1), [1]), (date(2025, 2, 1), [1, 2])]
+
+    computed.clear()
+    this_month = date.today().replace(day=1)
+    table = pa.ipc.open_stream(export(
+        client, admin_token, "payroll", format="arrow", from_date=str(this_month), to_date=str(this_month)
+    ).content).read_all()
+    assert table.num_rows == 2
+    assert computed == [(this_month, None)]
+
+
+def test_files_are_written_one_row_group_per_chunk(db_session, history, tmp_path, monkeypatch):
+    """Test writing every dataset to a directory, reading ANALYTICS_CHUNK_ROWS rows at a time."""
+    pq = pytest.importorskip("pyarrow.parquet")
+    monkeypatch.setattr(analytics_export, "ANALYTICS_CHUNK_ROWS", 8)
+    paths = write_dataset_files(db_session.get_bind(), str(tmp_path), date(2025, 1, 1), date(2025, 2, 28))
+    assert sorted(p.rsplit("/", 1)[-1] for p in paths) == [
+        f"{name}_2025-01-01_2025-02-28.parquet" for name in ("attendances", "leaves", "payroll", "users")
+    ]
+    attendance = pq.ParquetFile(paths[0])
+    assert attendance.metadata.num_rows == 20
+    assert attendance.metadata.num_row_groups == 3
+
+
+def test_export_without_pyarrow(client, admin_token, monkeypatch):
+    """Test a 501 explaining the missing optional dependency."""
+    def unavailable():
+        raise ColumnarExportUnavailable("Columnar exports need pyarrow (pip install pyarrow)")
+    monkeypatch.setattr(main, "require_pyarrow", unavailable)
+    response = export(client, admin_token, "attendances")
+    assert response.status_code == 501
+    assert "pyarrow" in response.json()["detail"]
@@ -1,8 +1,16 @@
 """
 Attendance State Machine and Shift Tracking Test Suite.
 """
+import json
+
 import pytest
-from datetime import date
+from datetime import date, time
+from sqlalchemy import event, update
+
+import attendance
+import main
+from models import User, Attendance
+from attendance import PunchRejected, open_shift, close_shift, parse_punch_file, replay_punches
 
 
 def test_today_status_initial(client, employee_token):
@@ -60,7 +68,8 @@ def test_check_out_flow(client, employee_token):
     assert out_res.status_code == 200
     out_data = out_res.json()
     assert out_data["out_time"] is not None
-    assert out_data["work_hours"] is not None
+    assert out_data["work_minutes"] is not None
+    assert out_data["work_hours"] == f"{out_data['work_minutes'] // 60}h {out_data['work_minutes'] % 60}m"
 
     # Check today status reflects completed shift
     today_res = client.get("/attendance/today", headers=headers)
@@ -103,3 +112,235 @@ def test_attendance_history(client, employee_token):
     records = res.json()
     assert isinstance(records, list)
     assert len(records) >= 1
+
+
+def test_punches_are_single_statements(client, employee_token, count_statements):
+    """Test that an accepted punch is one attendance statement plus one rollup upsert."""
+    headers = {"Authorization": f"Bearer {employee_token}"}
+    client.get("/attendance/today", headers=headers)  # warm the principal cache
+
+    statements = count_statements(lambda: client.post("/attendance/check-in", headers=headers))
+    assert len(statements) == 2
+    assert "ON CONFLICT" in statements[0] and "RETURNING" in statements[0]
+    assert statements[1].startswith("INSERT INTO attendance_rollups")
+
+    statements = count_statements(lambda: client.post("/attendance/check-out", headers=headers))
+    assert len(statements) == 2
+    assert statements[0].startswith("UPDATE") and "RETURNING" in statements[0]
+    assert statements[1].startswith("INSERT INTO attendance_rollups")
+
+
+def test_shift_state_machine_in_sql(db_session):
+    """Test check-in status, work hours computed by the database, and rejected punches."""
+    employee = db_session.query(User).filter(User.email == "rahul@hrms.com").first()
+    day = date(2025, 3, 3)
+
+    with pytest.raises(PunchRejected, match="not checked in"):
+        close_shift(db_session, employee.id, day, time(18, 0))
+
+    opened = open_shift(db_session, employee.id, day, time(9, 40, 15))
+    assert opened.status == "Late"
+    with pytest.raises(PunchRejected, match="already checked in"):
+        open_shift(db_session, employee.id, day, time(9, 45))
+
+    closed = close_shift(db_session, employee.id, day, time(18, 25, 10))
+    assert closed.out_time == time(18, 25, 10)
+    assert closed.work_minutes == 8 * 60 + 44
+    with pytest.raises(PunchRejected, match="completed your shift"):
+        open_shift(db_session, employee.id, day, time(19, 0))
+    with pytest.raises(PunchRejected, match="already checked out"):
+        close_shift(db_session, employee.id, day, time(19, 0))
+
+    assert db_session.query(Attendance).filter(Attendance.user_id == employee.id).count() == 1
+
+
+@pytest.fixture
+def march_shifts(db_session):
+    """Completed March 2025 shifts for both seeded users plus one open shift."""
+    admin = db_session.query(User).filter(User.email == "admin@hrms.com").first()
+    employee = db_session.query(User).filter(User.email == "rahul@hrms.com").first()
+    db_session.add_all([
+        Attendance(user_id=employee.id, date=date(2025, 3, 3), in_time=time(9, 0), out_time=time(18, 0), work_minutes=540),
+        Attendance(user_id=employee.id, date=date(2025, 3, 4), in_time=time(9, 0), out_time=time(16, 0), work_minutes=420),
+        Attendance(user_id=employee.id, date=date(2025, 3, 5), in_time=time(9, 0)),
+        Attendance(user_id=employee.id, date=date(2025, 4, 1), in_time=time(9, 0), out_time=time(17, 0), work_minutes=480),
+        Attendance(user_id=admin.id, date=date(2025, 3, 3), in_time=time(8, 0), out_time=time(18, 30), work_minutes=630),
+    ])
+    db_session.commit()
+    return employee
+
+
+def test_hours_worked_by_user_and_department(client, admin_token, march_shifts):
+    """Test per-user and per-department monthly totals, averages and overtime."""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    response = client.get("/attendance/hours", params={"month": "2025-03"}, headers=headers)
+    assert response.status_code == 200
+    by_user = {row["user_id"]: row for row in response.json()}
+    rahul = by_user[march_shifts.id]
+    assert rahul["shifts"] == 2
+    assert rahul["total_minutes"] == 960
+    assert rahul["total_hours"] == 16.0
+    assert rahul["average_shift_minutes"] == 480.0
+    assert rahul["overtime_minutes"] == 60
+
+    response = client.get("/attendance/hours", params={"month": "2025-03", "group_by": "department"}, headers=headers)
+    by_department = {row["department"]: row for row in response.json()}
+    assert by_department["Management"]["overtime_minutes"] == 150
+    assert by_department["Engineering"]["total_minutes"] == 960
+
+
+def test_hours_worked_admin_only(client, employee_token):
+    """Test that employees cannot read company-wide hours."""
+    response = client.get("/attendance/hours", headers={"Authorization": f"Bearer {employee_token}"})
+    assert response.status_code == 403
+
+
+def test_my_hours_worked_per_month(client, employee_token, march_shifts):
+    """Test the employee's own monthly breakdown for a year."""
+    headers = {"Authorization": f"Bearer {employee_token}"}
+    response = client.get("/attendance/hours/me", params={"year": 2025}, headers=headers)
+    assert response.status_code == 200
+    assert [(row["month"], row["total_minutes"]) for row in response.json()] == [("2025-03", 960), ("2025-04", 480)]
+
+
+def upload(client, headers, content: str, filename: str = "punches.csv"):
+    return client.post("/attendance/punches/bulk", headers=headers, files={"file": (filename, content.encode())})
+
+
+def test_bulk_punch_upload_replays_state_machine(client, admin_token, db_session):
+    """Test that CSV punches are replayed in time order with per-row results."""
+    employee = db_session.query(User).filter(User.email == "rahul@hrms.com").first()
+    admin = db_session.query(User).filter(User.email == "admin@hrms.com").first()
+    csv_content = "\n".join([
+        "user_id,timestamp,direction",
+        f"{employee.id},2025-03-03T18:15:00,out",   # uploaded out of order
+        f"{employee.id},2025-03-03T09:10:00,in",
+        f"{employee.id},2025-03-03T09:20:00,in",    # already checked in
+        f"{admin.id},2025-03-03T09:45:00,IN",
+        f"{employee.id},2025-03-04T18:00:00,out",   # never checked in that day
+        "9999,2025-03-03T09:00:00,in",
+        f"{employee.id},yesterday,in",
+        f"{employee.id},2025-03-05T09:00:00,sideways",
+    ])
+    response = upload(client, {"Authorization": f"Bearer {admin_token}"}, csv_content)
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["accepted"], body["rejected"]) == (3, 5)
+
+    results = {r["line"]: r for r in body["results"]}
+    assert results[2]["accepted"] and results[3]["accepted"] and results[5]["accepted"]
+    assert "already checked in" in results[4]["detail"].lower()
+    assert "not checked in" in results[6]["detail"].lower()
+    assert results[7]["detail"] == "Unknown user"
+    assert results[8]["detail"].startswith("Invalid punch")
+    assert results[9]["detail"].startswith("Invalid punch")
+
+    rows = {r.user_id: r for r in db_session.query(Attendance).filter(Attendance.date == date(2025, 3, 3))}
+    assert (rows[employee.id].status, rows[employee.id].work_minutes) == ("Present", 545)
+    assert (rows[admin.id].status, rows[admin.id].out_time) == ("Late", None)
+
+
+def test_bulk_punch_upload_closes_stored_shift(client, admin_token, db_session):
+    """Test JSON lines that check out a shift opened through the API."""
+    employee = db_session.query(User).filter(User.email == "rahul@hrms.com").first()
+    open_shift(db_session, employee.id, date(2025, 3, 3), time(9, 0))
+    jsonl = "\n".join([
+        f'{{"user_id": {employee.id}, "timestamp": "2025-03-03T17:30:00", "direction": "out"}}',
+        "not json",
+        "",
+    ])
+    response = upload(client, {"Authorization": f"Bearer {admin_token}"}, jsonl, "punches.jsonl")
+    assert response.json()["accepted"] == 1
+    assert response.json()["results"][1]["detail"].startswith("Invalid JSON")
+
+    row = db_session.query(Attendance).filter(Attendance.user_id == employee.id).one()
+    db_session.refresh(row)
+    assert (row.out_time, row.work_minutes) == (time(17, 30), 510)
+
+
+def test_bulk_punch_replay_skips_shift_closed_meanwhile(db_session, monkeypatch):
+    """Test that a punch closing a shift checked out live since it was read is reported, not counted."""
+    monkeypatch.setattr(attendance, "REPLAY_CLOSE_CHUNK_ROWS", 1)
+    employee = db_session.query(User).filter(User.email == "rahul@hrms.com").first()
+    admin = db_session.query(User).filter(User.email == "admin@hrms.com").first()
+    for user in (employee, admin):
+        open_shift(db_session, user.id, date(2025, 3, 3), time(9, 0))
+    rows = parse_punch_file("\n".join([
+        "user_id,timestamp,direction",
+        f"{employee.id},2025-03-03T17:30:00,out",
+        f"{admin.id},2025-03-03T18:00:00,out",
+    ]).encode(), csv_format=True)
+
+    def live_check_out(state):
+        if str(state.statement).startswith("WITH closing") and not state.execution_options.get("live"):
+            state.session.execute(update(Attendance).where(Attendance.user_id == employee.id)
+                                  .values(out_time=time(17, 0), work_minutes=480).execution_options(live=True))
+    event.listen(db_session, "do_orm_execute", live_check_out)
+    try:
+        replay_punches(db_session, rows)
+    finally:
+        event.remove(db_session, "do_orm_execute", live_check_out)
+
+    assert (rows[0].accepted, rows[0].detail) == (False, "You have already checked out today.")
+    assert rows[1].accepted
+    shifts = {r.user_id: r for r in db_session.query(Attendance)}
+    assert (shifts[employee.id].out_time, shifts[employee.id].work_minutes) == (time(17, 0), 480)
+    assert (shifts[admin.id].out_time, shifts[admin.id].work_minutes) == (time(18, 0), 540)
+
+
+def test_bulk_punch_replay_rejects_check_out_before_check_in(db_session):
+    """Test that an out punch earlier than the stored check-in leaves the shift open."""
+    employee = db_session.query(User).filter(User.email == "rahul@hrms.com").first()
+    open_shift(db_session, employee.id, date(2025, 3, 3), time(9, 0))
+    rows = parse_punch_file(f"user_id,timestamp,direction\n{employee.id},2025-03-03T08:00:00,out".encode(),
+                            csv_format=True)
+    replay_punches(db_session, rows)
+
+    assert (rows[0].accepted, rows[0].detail) == (False, "Check-out time is earlier than the check-in time.")
+    shift = db_session.query(Attendance).filter(Attendance.user_id == employee.id).one()
+    assert (shift.out_time, shift.work_minutes) == (None, None)
+
+
+def test_bulk_punch_upload_auth(client, employee_token, monkeypatch):
+    """Test that only admins or devices holding PUNCH_DEVICE_KEY may upload."""
+    content = "user_id,timestamp,direction\n"
+    assert upload(client, {"Authorization": f"Bearer {employee_token}"}, content).status_code == 403
+    assert upload(client, {}, content).status_code == 401
+
+    monkeypatch.setattr(main, "PUNCH_DEVICE_KEY", "kiosk-secret")
+    assert upload(client, {"X-Device-Key": "wrong"}, content).status_code == 401
+    assert upload(client, {"X-Device-Key": "kiosk-secret"}, content).status_code == 200
+
+
+def test_export_attendance_csv_and_ndjson(client, admin_token, march_shifts, monkeypatch):
+    """Test that the export streams every matching row across chunk boundaries in both formats."""
+    import exports
+    monkeypatch.setattr(exports, "EXPORT_CHUNK_ROWS", 2)
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    params = {"from_date": "2025-03-01", "to_date": "2025-03-31"}
+
+    response = client.get("/attendance/export", params=params, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    lines = response.text.strip().splitlines()
+    assert lines[0] == "date,user_id,name,department,status,in_time,out_time,work_minutes"
+    assert len(lines) == 1 + 4
+    assert lines[1].startswith("2025-03-03,")
+
+    response = client.get("/attendance/export", params={**params, "format": "ndjson", "department": "Engineering"},
+                          headers=headers)
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [r["date"] for r in records] == ["2025-03-03", "2025-03-04", "2025-03-05"]
+    assert records[0]["work_minutes"] == 540 and records[2]["out_time"] is None
+
+
+def test_export_attendance_scoped_for_employees(client, employee_token, march_shifts):
+    """Test that employees only ever receive their own rows."""
+    headers = {"Authorization": f"Bearer {employee_token}"}
+    params = {"from_date": "2025-03-01", "to_date": "2025-04-30", "format": "ndjson"}
+    response = client.get("/attendance/export", params=params, headers=headers)
+    assert {json.loads(line)["user_id"] for line in response.text.splitlines()} == {march_shifts.id}
+
+    assert client.get("/attendance/export", params={**params, "user_id": 1}, headers=headers).status_code == 403
+    assert client.get("/attendance/export", params={"from_date": "2025-04-02", "to_date": "2025-04-01"},
+                      headers=headers).status_code == 400
@@ -1,7 +1,43 @@
 """
 Authentication and Authorization Test Suite for NexusHR Backend.
 """
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
 import pytest
+from passlib.hash import bcrypt
+from sqlalchemy.orm import sessionmaker
+
+import database
+import main
+import workers
+from database import get_session_scope
+from main import app, principal_cache
+from models import User
+from passwords import pwd_context, password_pool, verify_and_update, BCRYPT_ROUNDS
+from workers import BoundedProcessPool
+
+
+class FakeExecutor:
+    """Stand-in for ProcessPoolExecutor that is slow to start and can be broken."""
+    started = []
+
+    def __init__(self, **kwargs):
+        time.sleep(0.05)
+        self.broken = False
+        FakeExecutor.started.append(self)
+
+    def submit(self, fn, *args):
+        if self.broken:
+            raise BrokenProcessPool("worker died")
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
 
 
 def test_login_success_admin(client):
@@ -85,3 +121,126 @@ def test_dashboard_stats_admin(client, admin_token):
     assert "attendance_percentage" in data
     assert "pending_leaves" in data
     assert "present_today" in data
+
+
+def test_principal_cache_serves_repeat_requests(client, admin_token):
+    """Test that repeated authenticated requests reuse the cached principal."""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    client.get("/dashboard/stats", headers=headers)
+    before = client.get("/system/cache-stats", headers=headers).json()["principal"]
+
+    client.get("/dashboard/stats", headers=headers)
+    client.get("/attendance/today", headers=headers)
+    after = client.get("/system/cache-stats", headers=headers).json()["principal"]
+
+    assert after["hits"] - before["hits"] == 3
+    assert after["misses"] == before["misses"]
+
+
+def test_principal_cache_invalidated_on_role_change(client, employee_token, db_session):
+    """Test that changing a user's role takes effect on the next request."""
+    headers = {"Authorization": f"Bearer {employee_token}"}
+    assert client.get("/system/cache-stats", headers=headers).status_code == 403
+
+    user = db_session.query(User).filter(User.email == "rahul@hrms.com").first()
+    user.role = "admin"
+    db_session.commit()
+
+    assert client.get("/system/cache-stats", headers=headers).status_code == 200
+
+
+def test_principal_cache_invalidated_on_commit_not_flush(client, employee_token, db_session):
+    """Test that a flushed role change keeps the cached principal until it is committed."""
+    headers = {"Authorization": f"Bearer {employee_token}"}
+    assert client.get("/system/cache-stats", headers=headers).status_code == 403
+
+    user = db_session.query(User).filter(User.email == "rahul@hrms.com").first()
+    user.role = "admin"
+    db_session.flush()
+    assert principal_cache.get("rahul@hrms.com") is not None
+    db_session.rollback()
+    db_session.commit()
+    assert principal_cache.get("rahul@hrms.com") is not None
+
+    user.role = "admin"
+    db_session.flush()
+    assert principal_cache.get("rahul@hrms.com") is not None
+    db_session.commit()
+    assert principal_cache.get("rahul@hrms.com") is None
+
+
+def test_login_rejected_with_503_when_bcrypt_pool_saturated(client, monkeypatch):
+    """Test that logins beyond the bcrypt queue limit get back-pressure instead of queueing."""
+    monkeypatch.setattr(password_pool, "max_pending", 0)
+    response = client.post(
+        "/token",
+        data={"username": "admin@hrms.com", "password": "admin123"}
+    )
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+
+
+def test_login_verifies_without_holding_a_session_slot(client, db_session, monkeypatch):
+    """Test that the bcrypt wait happens after the login's session and its slot are released."""
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(bind=db_session.get_bind()))
+    monkeypatch.delitem(app.dependency_overrides, get_session_scope)
+    free_slots = []
+
+    def verify(password, hashed_password):
+        free_slots.append(min(slots._value for slots in database._session_slots.values()))
+        return verify_and_update(password, hashed_password)
+    monkeypatch.setattr(main, "verify_and_update", verify)
+
+    response = client.post("/token", data={"username": "admin@hrms.com", "password": "admin123"})
+    assert response.status_code == 200
+    assert free_slots == [database.DB_MAX_SESSIONS]
+
+
+def test_pool_runs_inline_when_workers_cannot_start(monkeypatch):
+    """Test that a pool whose executor cannot start (no /dev/shm) falls back to inline tasks."""
+    def no_shm(**kwargs):
+        raise OSError(38, "Function not implemented")
+    monkeypatch.setattr(workers, "ProcessPoolExecutor", no_shm)
+    pool = BoundedProcessPool("test", max_workers=2, max_pending=4)
+    assert pool.run(abs, -3) == 3
+    assert pool.max_workers == 0 and pool.pending == 0
+
+
+def test_pool_started_and_restarted_once_under_concurrency(monkeypatch):
+    """Test that concurrent first tasks share one executor and a broken pool is replaced once."""
+    monkeypatch.setattr(workers, "ProcessPoolExecutor", FakeExecutor)
+    monkeypatch.setattr(FakeExecutor, "started", [])
+    pool = BoundedProcessPool("test", max_workers=2, max_pending=16)
+
+    def submit_many():
+        threads = [threading.Thread(target=pool.run, args=(abs, -1)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    submit_many()
+    assert len(FakeExecutor.started) == 1
+
+    FakeExecutor.started[0].broken = True
+    submit_many()
+    assert len(FakeExecutor.started) == 2
+    assert pool.pending == 0
+
+
+def test_login_rehashes_outdated_bcrypt_cost(client, db_session):
+    """Test that a hash with a stale bcrypt cost is upgraded on successful login."""
+    user = db_session.query(User).filter(User.email == "rahul@hrms.com").first()
+    user.hashed_password = bcrypt.using(rounds=4).hash("pass123")
+    db_session.commit()
+
+    response = client.post(
+        "/token",
+        data={"username": "rahul@hrms.com", "password": "pass123"}
+    )
+    assert response.status_code == 200
+
+    db_session.expire_all()
+    upgraded = db_session.query(User).filter(User.email == "rahul@hrms.com").first().hashed_password
+    assert upgraded.startswith(f"$2b${BCRYPT_ROUNDS:02d}$")
+    assert pwd_context.verify("pass123", upgraded)
@@ -0,0 +1,80 @@
+"""
+Cold Start Test Suite (import-time budget, lazy heavy imports, one-query startup).
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+
+from sqlalchemy import event, update
+from sqlalchemy.orm import sessionmaker
+
+import main
+import passwords
+from database import create_db_engine
+from migrations import schema_is_current
+from models import SchemaVersion, User
+from passwords import pwd_context
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+# Budgets for a serverless cold start: importing the app, then its startup hook
+IMPORT_BUDGET_SECONDS = 3.0
+STARTUP_BUDGET_SECONDS = 0.5
+
+IMPORT_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import main
+print(json.dumps({
+    "seconds": time.perf_counter() - started,
+    "loaded": sorted(name for name in ("reportlab", "passlib", "pyarrow") if name in sys.modules),
+}))
+"""
+
+
+def test_app_import_within_budget(tmp_path):
+    """Test that a fresh interpreter imports the app within budget and without ReportLab, passlib or pyarrow."""
+    env = {**os.environ, "PYTHONPATH": BACKEND_DIR}
+    env.pop("POSTGRES_URL", None)
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE], cwd=tmp_path, env=env,
+        capture_output=True, text=True, check=True, timeout=60
+    )
+    probe = json.loads(result.stdout.strip().splitlines()[-1])
+    assert probe["loaded"] == []
+    assert probe["seconds"] < IMPORT_BUDGET_SECONDS
+
+
+def test_startup_on_migrated_database_is_one_query(tmp_path, monkeypatch):
+    """Test seeding without hashing, then a single-SELECT startup once the schema marker is current."""
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'hrms.db'}")
+    monkeypatch.setattr(main, "engine", engine)
+    monkeypatch.setattr(main, "SessionLocal", sessionmaker(bind=engine))
+
+    def no_hashing(password):
+        raise AssertionError("startup must not hash passwords")
+    monkeypatch.setattr(passwords, "get_password_hash", no_hashing)
+
+    assert not schema_is_current(engine)
+    main.startup_db_check()
+    assert schema_is_current(engine)
+    with main.SessionLocal() as db:
+        admin = db.query(User).filter(User.email == "admin@hrms.com").one()
+        assert pwd_context.verify("admin123", admin.hashed_password)
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    started = time.perf_counter()
+    main.startup_db_check()
+    assert time.perf_counter() - started < STARTUP_BUDGET_SECONDS
+    assert len(statements) == 1 and "schema_version" in statements[0]
+
+    # Models changed since the last migration: the next startup migrates again
+    with engine.begin() as conn:
+        conn.execute(update(SchemaVersion).values(fingerprint="0" * 64))
+    assert not schema_is_current(engine)
+    main.startup_db_check()
+    assert schema_is_current(engine)
+    engine.dispose()
@@ -0,0 +1,136 @@
+"""
+Dashboard KPI Aggregation Test Suite.
+"""
+import pytest
+from datetime import date, timedelta, time
+
+from models import User, Attendance, Leave, Holiday, LeaveStatus
+from main import dashboard_cache
+from work_calendar import get_calendar
+
+
+@pytest.fixture
+def populated(db_session):
+    """Attendance, leave and holiday rows covering every dashboard figure."""
+    employee = db_session.query(User).filter(User.email == "rahul@hrms.com").first()
+    today = date.today()
+    db_session.add_all([
+        Attendance(user_id=employee.id, date=today, status="Present", in_time=time(9, 0)),
+        Attendance(user_id=employee.id, date=today - timedelta(days=1), status="Late", in_time=time(10, 0)),
+        Leave(user_id=employee.id, start_date=today, end_date=today + timedelta(days=1),
+              reason="Flu", leave_type="Sick", status=LeaveStatus.APPROVED.value),
+        Leave(user_id=employee.id, start_date=today + timedelta(days=10), end_date=today + timedelta(days=11),
+              reason="Trip", leave_type="Annual", status=LeaveStatus.PENDING.value),
+        Holiday(name="Far Festival", date=today + timedelta(days=40)),
+        Holiday(name="Near Festival", date=today + timedelta(days=3)),
+    ])
+    db_session.commit()
+    return employee
+
+
+def working_days_in_window(db_session):
+    today = date.today()
+    return get_calendar(db_session).working_days_between(today - timedelta(days=30), today)
+
+
+def test_admin_dashboard_values(client, admin_token, populated, db_session):
+    """Test that admin KPIs aggregate across the whole company."""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    data = client.get("/dashboard/stats", headers=headers).json()
+    near = (date.today() + timedelta(days=3)).strftime('%b %d, %Y')
+
+    assert data["total_employees"] == 1
+    assert data["pending_leaves"] == 1
+    assert data["present_today"] == 1
+    assert data["on_leave_today"] == 1
+    assert data["next_holiday"] == f"Near Festival ({near})"
+    assert data["attendance_percentage"] == round(2 / working_days_in_window(db_session) * 100, 1)
+
+
+def test_employee_dashboard_values(client, employee_token, populated, db_session):
+    """Test that employee KPIs are scoped to the caller."""
+    headers = {"Authorization": f"Bearer {employee_token}"}
+    data = client.get("/dashboard/stats", headers=headers).json()
+
+    assert data["pending_leaves"] == 1
+    assert data["attendance_percentage"] == round(2 / working_days_in_window(db_session) * 100, 1)
+
+
+def test_dashboard_stats_single_round_trip(client, admin_token, db_session, count_statements):
+    """Test that a cold snapshot is built in one SQL statement besides the request's leave-span lookup."""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    client.get("/attendance/today", headers=headers)
+    get_calendar(db_session)
+
+    statements = count_statements(
+        lambda: client.get("/dashboard/stats", headers=headers)
+    )
+    assert len(statements) == 2
+    assert "julianday" in statements[0]
+
+
+def test_dashboard_snapshot_served_from_cache(client, admin_token, employee_token, count_statements):
+    """Test that repeat dashboard loads do not touch the database."""
+    for token in (admin_token, employee_token):
+        headers = {"Authorization": f"Bearer {token}"}
+        first = client.get("/dashboard/stats", headers=headers).json()
+        statements = count_statements(
+            lambda: client.get("/dashboard/stats", headers=headers)
+        )
+        assert statements == []
+        assert client.get("/dashboard/stats", headers=headers).json() == first
+
+
+def test_dashboard_snapshot_invalidated_by_check_in(client, admin_token, employee_token):
+    """Test that a check-in is reflected immediately in both scopes."""
+    admin_headers = {"Authorization": f"Bearer {admin_token}"}
+    emp_headers = {"Authorization": f"Bearer {employee_token}"}
+    before_admin = client.get("/dashboard/stats", headers=admin_headers).json()
+    before_emp = client.get("/dashboard/stats", headers=emp_headers).json()
+
+    client.post("/attendance/check-in", headers=emp_headers)
+
+    after_admin = client.get("/dashboard/stats", headers=admin_headers).json()
+    after_emp = client.get("/dashboard/stats", headers=emp_headers).json()
+    assert after_admin["attendance_percentage"] > before_admin["attendance_percentage"]
+    assert after_emp["attendance_percentage"] > before_emp["attendance_percentage"]
+
+
+def test_dashboard_snapshot_invalidated_by_leave_workflow(client, admin_token, employee_token):
+    """Test that applying for and approving leave update the pending counts."""
+    admin_headers = {"Authorization": f"Bearer {admin_token}"}
+    emp_headers = {"Authorization": f"Bearer {employee_token}"}
+    assert client.get("/dashboard/stats", headers=admin_headers).json()["pending_leaves"] == 0
+    assert client.get("/dashboard/stats", headers=emp_headers).json()["pending_leaves"] == 0
+
+    start = date.today() + timedelta(days=5)
+    leave_id = client.post("/leaves", json={
+        "start_date": start.isoformat(),
+        "end_date": start.isoformat(),
+        "leave_type": "Annual",
+        "reason": "Errands"
+    }, headers=emp_headers).json()["id"]
+    assert client.get("/dashboard/stats", headers=admin_headers).json()["pending_leaves"] == 1
+    assert client.get("/dashboard/stats", headers=emp_headers).json()["pending_leaves"] == 1
+
+    client.put(f"/leaves/{leave_id}/status", json={"status": "Approved"}, headers=admin_headers)
+    assert client.get("/dashboard/stats", headers=admin_headers).json()["pending_leaves"] == 0
+    assert client.get("/dashboard/stats", headers=emp_headers).json()["pending_leaves"] == 0
+
+
+def test_dashboard_headcount_invalidated_on_commit_not_flush(client, admin_token, db_session):
+    """Test that a flushed new employee keeps the company snapshot until it is committed."""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    before = client.get("/dashboard/stats", headers=headers).json()["total_employees"]
+
+    db_session.add(User(email="priya@hrms.com", name="Priya Nair", hashed_password="x", role="employee"))
+    db_session.flush()
+    assert dashboard_cache.get(("company", date.today())) is not None
+    db_session.rollback()
+    assert client.get("/dashboard/stats", headers=headers).json()["total_employees"] == before
+
+    db_session.add(User(email="priya@hrms.com", name="Priya Nair", hashed_password="x", role="employee"))
+    db_session.flush()
+    assert dashboard_cache.get(("company", date.today())) is not None
+    db_session.commit()
+    assert client.get("/dashboard/stats", headers=headers).json()["total_employees"] == before + 1
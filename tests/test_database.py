@@ -0,0 +1,41 @@
+"""
+Engine Factory Test Suite (pool settings, serverless mode, SQLite pragmas).
+"""
+from sqlalchemy.pool import NullPool, QueuePool
+
+import database
+from database import create_db_engine
+
+
+def test_sqlite_file_engine_applies_pragmas(tmp_path):
+    """Test WAL, synchronous, busy_timeout and mmap_size on every new connection."""
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'hrms.db'}")
+    with engine.connect() as conn:
+        pragma = lambda name: conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+        assert pragma("journal_mode") == "wal"
+        assert pragma("synchronous") == 1  # NORMAL
+        assert pragma("busy_timeout") == database.SQLITE_BUSY_TIMEOUT_MS
+        assert pragma("mmap_size") == database.SQLITE_MMAP_SIZE
+    assert isinstance(engine.pool, QueuePool) and engine.pool.size() == database.DB_POOL_SIZE
+    engine.dispose()
+
+
+def test_in_memory_sqlite_keeps_default_pool():
+    """Test that in-memory databases are left alone (no pragmas, no pool sizing)."""
+    engine = create_db_engine("sqlite://")
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "memory"
+
+
+def test_postgres_pool_settings(monkeypatch):
+    """Test queue-pool tuning from the environment and the serverless null pool."""
+    monkeypatch.setattr(database, "DB_POOL", "queue")
+    monkeypatch.setattr(database, "DB_POOL_SIZE", 3)
+    monkeypatch.setattr(database, "DB_POOL_RECYCLE", 600)
+    engine = create_db_engine("postgresql+psycopg2://hrms@localhost/hrms")
+    assert isinstance(engine.pool, QueuePool)
+    assert engine.pool.size() == 3
+    assert engine.pool._recycle == 600 and engine.pool._pre_ping
+
+    monkeypatch.setattr(database, "DB_POOL", "null")
+    assert isinstance(create_db_engine("postgresql+psycopg2://hrms@localhost/hrms").pool, NullPool)
@@ -0,0 +1,113 @@
+"""
+Holiday Management Test Suite (CRUD, iCal/CSV import, cacheable public listing).
+"""
+from datetime import date
+
+import pytest
+
+from models import Holiday
+from holiday_import import HolidayFileError, parse_holiday_file
+
+ICAL = "\r\n".join([
+    "BEGIN:VCALENDAR",
+    "VERSION:2.0",
+    "BEGIN:VEVENT",
+    "DTSTART;VALUE=DATE:20250314",
+    "DTEND;VALUE=DATE:20250315",
+    "SUMMARY:Holi",
+    "DESCRIPTION:Festival of colours\\, spring",
+    "END:VEVENT",
+    "BEGIN:VEVENT",
+    "DTSTART;VALUE=DATE:20251020",
+    "DTEND;VALUE=DATE:20251022",
+    "SUMMARY:Diwali Bre",
+    " ak",  # folded line
+    "END:VEVENT",
+    "END:VCALENDAR",
+])
+
+
+def upload(client, token, content: str, filename: str, **params):
+    return client.post(
+        "/holidays/import",
+        params=params,
+        files={"file": (filename, content.encode())},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+
+
+def test_parse_ical_expands_multi_day_events():
+    """Test unfolding, escaping and exclusive DTEND handling."""
+    entries = parse_holiday_file(ICAL.encode(), ical=True)
+    assert [(e.date, e.name, e.description) for e in entries] == [
+        (date(2025, 3, 14), "Holi", "Festival of colours, spring"),
+        (date(2025, 10, 20), "Diwali Break", None),
+        (date(2025, 10, 21), "Diwali Break", None),
+    ]
+    with pytest.raises(HolidayFileError, match="Line 3"):
+        parse_holiday_file(b"BEGIN:VEVENT\nSUMMARY:x\nDTSTART:2025-99\nEND:VEVENT", ical=True)
+    with pytest.raises(HolidayFileError, match="More than one holiday"):
+        parse_holiday_file(b"date,name\n2025-01-26,Republic Day\n2025-01-26,Again", ical=False)
+
+
+def test_holiday_crud(client, admin_token, employee_token):
+    """Test admin create/update/delete, duplicate dates and employee access."""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    payload = {"name": "Republic Day", "date": "2025-01-26"}
+    assert client.post("/holidays", json=payload, headers={"Authorization": f"Bearer {employee_token}"}).status_code == 403
+
+    created = client.post("/holidays", json=payload, headers=headers)
+    assert created.status_code == 201
+    holiday_id = created.json()["id"]
+    assert client.post("/holidays", json=payload, headers=headers).status_code == 409
+
+    updated = client.put(f"/holidays/{holiday_id}", json={**payload, "description": "National holiday"}, headers=headers)
+    assert updated.json()["description"] == "National holiday"
+    assert client.get("/holidays", params={"year": 2025}).json()[0]["description"] == "National holiday"
+
+    assert client.delete(f"/holidays/{holiday_id}", headers=headers).status_code == 204
+    assert client.delete(f"/holidays/{holiday_id}", headers=headers).status_code == 404
+    assert client.get("/holidays", params={"year": 2025}).json() == []
+
+
+def test_import_replaces_year_in_one_transaction(client, admin_token, db_session):
+    """Test upsert by date, removal of the year's other holidays, and rollback on bad input."""
+    db_session.add_all([
+        Holiday(name="Old Holi", date=date(2025, 3, 14)),
+        Holiday(name="Dropped", date=date(2025, 8, 1)),
+        Holiday(name="Next Year", date=date(2026, 1, 1)),
+    ])
+    db_session.commit()
+
+    response = upload(client, admin_token, ICAL, "india-2025.ics", year=2025)
+    assert response.status_code == 200
+    assert response.json() == {"created": 2, "updated": 1, "removed": 1}
+    names = [h["name"] for h in client.get("/holidays", params={"year": 2025}).json()]
+    assert names == ["Holi", "Diwali Break", "Diwali Break"]
+    assert len(client.get("/holidays", params={"year": 2026}).json()) == 1
+
+    bad = "date,name\n2025-05-01,May Day\nnot-a-date,Broken\n"
+    response = upload(client, admin_token, bad, "holidays.csv", year=2025)
+    assert response.status_code == 400 and "Line 3" in response.json()["detail"]
+    response = upload(client, admin_token, "date,name\n2026-05-01,May Day\n", "holidays.csv", year=2025)
+    assert response.status_code == 400
+    response = upload(client, admin_token, "date,name\n2025-05-01,May Day,Labour,extra\n", "holidays.csv", year=2025)
+    assert response.status_code == 400 and "Line 2" in response.json()["detail"]
+    assert len(client.get("/holidays", params={"year": 2025}).json()) == 3
+
+
+def test_holiday_listing_etag(client, admin_token):
+    """Test the public listing's strong ETag, 304 revalidation and change on write."""
+    upload(client, admin_token, "date,name\n2025-01-26,Republic Day\n", "holidays.csv")
+    response = client.get("/holidays", params={"year": 2025})
+    etag = response.headers["etag"]
+    assert etag.startswith('"') and response.headers["cache-control"].startswith("public, max-age=")
+
+    cached = client.get("/holidays", params={"year": 2025}, headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert client.get("/holidays", params={"year": 2024}).headers["etag"] != etag
+
+    client.post("/holidays", json={"name": "Holi", "date": "2025-03-14"},
+                headers={"Authorization": f"Bearer {admin_token}"})
+    response = client.get("/holidays", params={"year": 2025}, headers={"If-None-Match": etag})
+    assert response.status_code == 200 and len(response.json()) == 2
@@ -0,0 +1,161 @@
+"""
+Index and Schema Migration Test Suite (EXPLAIN QUERY PLAN on SQLite).
+"""
+import pytest
+from datetime import date, time
+from sqlalchemy import create_engine, event, func, inspect, and_, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import Base
+from models import User, Attendance, Leave, LeaveStatus
+from migrations import MANAGED_INDEXES, applies_to, existing_indexes, parse_work_hours, upgrade_schema
+from attendance import close_shift
+from leave_calendar import leave_span, overlaps
+
+
+def query_plan(session, query) -> str:
+    """SQLite's EXPLAIN QUERY PLAN for an ORM query, flattened to one string."""
+    compiled = query.statement.compile(dialect=session.get_bind().dialect)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    rows = session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).all()
+    return " | ".join(row[-1] for row in rows)
+
+
+def test_check_in_lookup_uses_user_date_index(db_session):
+    """Test that per-user day lookups (check-in, today, history) use the composite index."""
+    plan = query_plan(db_session, db_session.query(Attendance).filter(and_(
+        Attendance.user_id == 1,
+        Attendance.date == date(2025, 3, 3)
+    )))
+    assert "uq_attendances_user_date" in plan
+
+    plan = query_plan(db_session, db_session.query(Attendance).filter(and_(
+        Attendance.user_id == 1,
+        Attendance.date >= date(2025, 3, 1)
+    )).order_by(Attendance.date.desc()))
+    assert "uq_attendances_user_date" in plan
+
+
+def test_open_shift_lookups_use_user_date_index(db_session):
+    """Test that the app's open-shift lookup (close_shift's UPDATE) is served by the unique index."""
+    db_session.add(Attendance(user_id=2, date=date(2025, 3, 3), in_time=time(9, 0)))
+    db_session.commit()
+    issued = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("UPDATE attendances"):
+            issued.append((statement, parameters))
+    event.listen(db_session.get_bind(), "before_cursor_execute", record)
+    try:
+        close_shift(db_session, 2, date(2025, 3, 3), time(18, 0))
+    finally:
+        event.remove(db_session.get_bind(), "before_cursor_execute", record)
+    db_session.commit()
+
+    (statement, parameters), = issued
+    assert "out_time IS NULL" in statement
+    rows = db_session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+    assert "uq_attendances_user_date (user_id=? AND date=?)" in " | ".join(row[-1] for row in rows)
+
+
+def test_upgrade_schema_drops_unused_open_shift_index():
+    """Test that databases from before its removal lose the partial index no query used."""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE INDEX ix_attendances_open_shift ON attendances (date, user_id) WHERE out_time IS NULL"))
+    upgrade_schema(engine)
+    assert "ix_attendances_open_shift" not in existing_indexes(engine, inspect(engine), "attendances")
+
+
+def test_leave_queries_use_indexes(db_session):
+    """Test the overlap check and the status-filtered leave listing."""
+    plan = query_plan(db_session, db_session.query(Leave).filter(and_(
+        Leave.user_id == 2,
+        Leave.status == LeaveStatus.APPROVED.value,
+        Leave.end_date >= date(2025, 3, 1),
+        Leave.start_date <= date(2025, 3, 31)
+    )))
+    assert "ix_leaves_user_status_dates" in plan
+
+    plan = query_plan(db_session, db_session.query(Leave).filter(
+        Leave.status == LeaveStatus.PENDING.value
+    ).order_by(Leave.applied_at.desc(), Leave.id.desc()))
+    assert "ix_leaves_status_applied_at" in plan
+
+
+def test_leave_calendar_uses_bounded_interval_scan(db_session):
+    """Test that the SQLite overlap predicate is a start_date range on the status/dates index."""
+    plan = query_plan(db_session, db_session.query(Leave).filter(and_(
+        Leave.status == LeaveStatus.APPROVED.value,
+        overlaps(db_session, date(2025, 3, 1), date(2025, 3, 31))
+    )))
+    assert "ix_leaves_status_start_end (status=? AND start_date>? AND start_date<?)" in plan
+
+
+def test_longest_leave_span_is_an_index_seek(db_session):
+    """Test that the per-session span lookup reads the expression index instead of scanning leaves."""
+    plan = query_plan(db_session, db_session.query(func.max(leave_span("sqlite"))))
+    assert plan == "SEARCH leaves USING INDEX ix_leaves_span"
+
+
+def test_duplicate_attendance_rejected(db_session):
+    """Test that the unique index blocks a second row for the same user and day."""
+    employee = db_session.query(User).filter(User.email == "rahul@hrms.com").first()
+    db_session.add(Attendance(user_id=employee.id, date=date(2025, 3, 3), in_time=time(9, 0)))
+    db_session.commit()
+    db_session.add(Attendance(user_id=employee.id, date=date(2025, 3, 3), in_time=time(9, 5)))
+    with pytest.raises(IntegrityError):
+        db_session.commit()
+    db_session.rollback()
+
+
+def test_upgrade_schema_adds_indexes_to_existing_database():
+    """Test that an older database gets duplicates removed and every index created, idempotently."""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for index in MANAGED_INDEXES:
+            index.drop(conn)
+    session = sessionmaker(bind=engine)()
+    session.add_all([
+        Attendance(user_id=1, date=date(2025, 3, 3), in_time=time(9, 0)),
+        Attendance(user_id=1, date=date(2025, 3, 3), in_time=time(9, 5)),
+        Attendance(user_id=1, date=date(2025, 3, 4), in_time=time(9, 0)),
+    ])
+    session.commit()
+
+    upgrade_schema(engine)
+    upgrade_schema(engine)
+
+    inspector = inspect(engine)
+    names = {name for table in ("attendances", "leaves") for name in existing_indexes(engine, inspector, table)}
+    assert {index.name for index in MANAGED_INDEXES if applies_to(index, "sqlite")} <= names
+    assert "ix_leaves_period" not in names
+    rows = session.query(Attendance.date, Attendance.in_time).order_by(Attendance.id).all()
+    assert rows == [(date(2025, 3, 3), time(9, 0)), (date(2025, 3, 4), time(9, 0))]
+    session.close()
+
+
+def test_upgrade_schema_backfills_work_minutes():
+    """Test that a database with the legacy work_hours text gets work_minutes added and filled."""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE attendances DROP COLUMN work_minutes"))
+        conn.execute(text("ALTER TABLE attendances ADD COLUMN work_hours VARCHAR(20)"))
+        conn.execute(text(
+            "INSERT INTO attendances (user_id, date, status, work_hours) VALUES "
+            "(1, '2025-03-03', 'Present', '8h 45m'), (1, '2025-03-04', 'Present', NULL)"
+        ))
+
+    upgrade_schema(engine)
+    upgrade_schema(engine)
+
+    with engine.connect() as conn:
+        minutes = conn.execute(text("SELECT work_minutes FROM attendances ORDER BY id")).scalars().all()
+    assert minutes == [525, None]
+    assert parse_work_hours("0h 5m") == 5
+    assert parse_work_hours("garbage") is None
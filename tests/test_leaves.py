@@ -2,7 +2,9 @@
 Leave Application, Validation, and Approval Workflow Test Suite.
 """
 import pytest
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta
+
+from models import User, Leave
 
 
 def test_apply_leave_success(client, employee_token):
@@ -163,3 +165,149 @@ def test_employee_cannot_approve_leave(client, employee_token):
     )
     assert approve_res.status_code == 403
     assert "admin" in approve_res.json()["detail"].lower()
+
+
+@pytest.fixture
+def leave_history(db_session):
+    """Seven leaves for the employee, three sharing one applied_at timestamp."""
+    employee = db_session.query(User).filter(User.email == "rahul@hrms.com").first()
+    base = datetime(2025, 1, 1, 9, 0, 0)
+    applied = [base, base + timedelta(hours=1), base + timedelta(hours=1), base + timedelta(hours=1),
+               base + timedelta(hours=2), base + timedelta(hours=3), base + timedelta(hours=4)]
+    statuses = ["Approved", "Pending", "Rejected", "Pending", "Approved", "Pending", "Pending"]
+    for i, (at, st) in enumerate(zip(applied, statuses)):
+        start = date(2025, 2, 1) + timedelta(days=10 * i)
+        db_session.add(Leave(
+            user_id=employee.id, start_date=start, end_date=start + timedelta(days=1),
+            reason=f"Leave {i}", leave_type="Annual", status=st, applied_at=at
+        ))
+    db_session.commit()
+    return db_session.query(Leave).order_by(Leave.applied_at.desc(), Leave.id.desc()).all()
+
+
+def test_leaves_keyset_pagination(client, admin_token, leave_history):
+    """Test that walking X-Next-Cursor returns every leave once, newest first, across timestamp ties."""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    seen = []
+    cursor = None
+    pages = 0
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        res = client.get("/leaves", params=params, headers=headers)
+        assert res.status_code == 200
+        seen += [leave["id"] for leave in res.json()]
+        pages += 1
+        cursor = res.headers.get("x-next-cursor")
+        if not cursor:
+            break
+
+    assert pages == 4
+    assert seen == [leave.id for leave in leave_history]
+    # Browsers only let the frontend read the cursor if CORS exposes it
+    res = client.get("/leaves", params={"limit": 2}, headers={**headers, "Origin": "https://hrms.example.com"})
+    assert "x-next-cursor" in res.headers["access-control-expose-headers"].lower()
+    assert all(name == "Rahul Sharma" for name in
+               [leave["user_name"] for leave in client.get("/leaves", headers=headers).json()])
+
+
+def test_leaves_filters(client, admin_token, employee_token, leave_history):
+    """Test status, date-range and user filters on the leave listing."""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    pending = client.get("/leaves", params={"status": "Pending"}, headers=headers).json()
+    assert len(pending) == 4 and all(leave["status"] == "Pending" for leave in pending)
+
+    ranged = client.get("/leaves", params={"from_date": "2025-02-11", "to_date": "2025-02-21"}, headers=headers).json()
+    assert sorted(leave["reason"] for leave in ranged) == ["Leave 1", "Leave 2"]
+
+    employee_id = leave_history[0].user_id
+    assert len(client.get("/leaves", params={"user_id": employee_id}, headers=headers).json()) == 7
+    assert client.get("/leaves", params={"user_id": employee_id + 100}, headers=headers).json() == []
+
+    # Employees only ever see their own leaves
+    emp_headers = {"Authorization": f"Bearer {employee_token}"}
+    assert len(client.get("/leaves", params={"user_id": 999}, headers=emp_headers).json()) == 7
+
+
+def test_leaves_invalid_cursor_rejected(client, admin_token):
+    """Test that a malformed cursor is a client error."""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    res = client.get("/leaves", params={"cursor": "not-a-cursor"}, headers=headers)
+    assert res.status_code == 400
+
+
+@pytest.fixture
+def team_leaves(db_session):
+    """Leaves of two Engineering employees and one in Sales around March 2025."""
+    rahul = db_session.query(User).filter(User.email == "rahul@hrms.com").first()
+    priya = User(email="priya@hrms.com", name="Priya Nair", hashed_password="x", role="employee", department="Engineering")
+    sam = User(email="sam@hrms.com", name="Sam Iyer", hashed_password="x", role="employee", department="Sales")
+    db_session.add_all([priya, sam])
+    db_session.flush()
+    db_session.add_all([
+        # Starts long before the range but still covers its first days
+        Leave(user_id=priya.id, start_date=date(2025, 1, 20), end_date=date(2025, 3, 4),
+              reason="Parental", leave_type="Personal", status="Approved"),
+        Leave(user_id=rahul.id, start_date=date(2025, 3, 10), end_date=date(2025, 3, 12),
+              reason="Trip", leave_type="Annual", status="Pending"),
+        Leave(user_id=rahul.id, start_date=date(2025, 3, 20), end_date=date(2025, 3, 20),
+              reason="Rejected one", leave_type="Annual", status="Rejected"),
+        Leave(user_id=sam.id, start_date=date(2025, 3, 28), end_date=date(2025, 4, 2),
+              reason="Wedding", leave_type="Annual", status="Approved"),
+        Leave(user_id=sam.id, start_date=date(2025, 2, 1), end_date=date(2025, 2, 28),
+              reason="Before range", leave_type="Sick", status="Approved"),
+    ])
+    db_session.commit()
+
+
+def test_leave_calendar_lists_overlapping_leaves(client, admin_token, team_leaves):
+    """Test who is off in a range, across statuses and departments, with working days clipped to the range."""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    params = {"from_date": "2025-03-01", "to_date": "2025-03-31"}
+    entries = client.get("/leaves/calendar", params=params, headers=headers).json()
+    assert [(e["name"], e["status"], e["working_days_in_range"]) for e in entries] == [
+        ("Priya Nair", "Approved", 2),
+        ("Rahul Sharma", "Pending", 3),
+        ("Sam Iyer", "Approved", 2),
+    ]
+    assert "reason" not in entries[0]
+
+    approved = client.get("/leaves/calendar", params={**params, "include_pending": False, "department": "Engineering"},
+                          headers=headers).json()
+    assert [e["name"] for e in approved] == ["Priya Nair"]
+
+    too_long = client.get("/leaves/calendar", params={"from_date": "2025-01-01", "to_date": "2026-06-01"}, headers=headers)
+    assert too_long.status_code == 400
+
+
+def test_leave_calendar_scoped_to_employee_department(client, employee_token, team_leaves):
+    """Test that employees see their own department's calendar only."""
+    headers = {"Authorization": f"Bearer {employee_token}"}
+    params = {"from_date": "2025-03-01", "to_date": "2025-03-31"}
+    entries = client.get("/leaves/calendar", params=params, headers=headers).json()
+    assert {e["department"] for e in entries} == {"Engineering"}
+    assert client.get("/leaves/calendar", params={**params, "department": "Sales"}, headers=headers).status_code == 403
+
+
+def test_leave_overlap_sees_long_leaves(client, employee_token, db_session):
+    """Test the bounded start_date scan finds long leaves, including ones written after the span was read."""
+    employee = db_session.query(User).filter(User.email == "rahul@hrms.com").first()
+    start = date.today() - timedelta(days=200)
+    db_session.add(Leave(user_id=employee.id, start_date=start, end_date=date.today() + timedelta(days=5),
+                         reason="Sabbatical", leave_type="Personal", status="Approved"))
+    db_session.commit()
+
+    headers = {"Authorization": f"Bearer {employee_token}"}
+    payload = {"start_date": str(date.today() + timedelta(days=3)), "end_date": str(date.today() + timedelta(days=8)),
+               "reason": "Overlaps the sabbatical", "leave_type": "Annual"}
+    res = client.post("/leaves", json=payload, headers=headers)
+    assert res.status_code == 400 and "Approved" in res.json()["detail"]
+
+    long_leave = {**payload, "start_date": str(date.today() + timedelta(days=10)),
+                  "end_date": str(date.today() + timedelta(days=300))}
+    assert client.post("/leaves", json=long_leave, headers=headers).status_code == 200
+    inside = {**payload, "start_date": str(date.today() + timedelta(days=250)),
+              "end_date": str(date.today() + timedelta(days=252))}
+    res = client.post("/leaves", json=inside, headers=headers)
+    assert res.status_code == 400 and "Pending" in res.json()["detail"]
@@ -0,0 +1,284 @@
+"""
+Attendance Partitioning Test Suite (Postgres DDL, archival eligibility, SQLite single table).
+"""
+import os
+from datetime import date, time
+
+import pytest
+from sqlalchemy import event, func, insert, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.schema import CreateTable
+
+import main
+from database import Base, create_db_engine, normalize_url
+from migrations import migrate, record_schema_version
+from models import Attendance, Payslip, User
+from partitions import (
+    ARCHIVE_PARTITION, add_months, archivable_months, archivable_years, archive_closed_months, archive_year,
+    archived_before, ensure_partitions, is_partitioned, maintain_partitions, month_partitions,
+    partition_bounds, partition_existing_table, partition_name
+)
+
+# A disposable Postgres database (its public schema is recreated) for the DDL tests; CI provides one
+TEST_POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+requires_postgres = pytest.mark.skipif(not TEST_POSTGRES_URL, reason="TEST_POSTGRES_URL is not set")
+
+
+class _Result:
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.rowcount = 0
+
+    def all(self):
+        return self.rows
+
+
+class FakePostgres:
+    """Records the SQL `partition_existing_table` runs against a plain, unpartitioned Postgres table."""
+
+    class dialect:
+        name = "postgresql"
+
+    def __init__(self):
+        self.statements = []
+        self.created = False
+
+    def execute(self, statement, params=None):
+        sql = str(statement)
+        self.statements.append(sql)
+        return _Result([("attendances_pkey",)] if "pg_indexes" in sql else ())
+
+    def scalar(self, statement, params=None):
+        sql = str(statement)
+        if "relkind" in sql:
+            return "p" if self.created else "r"
+        return "public.attendances_id_seq" if "pg_get_serial_sequence" in sql else None
+
+    def scalars(self, statement, params=None):
+        self.statements.append(str(statement))
+        return _Result([date(2025, 1, 1)])
+
+    def _run_ddl_visitor(self, visitor, element, **kwargs):
+        self.statements.append(f"CREATE TABLE {element.name}")
+        self.created = True
+
+
+def test_attendance_ddl_by_dialect():
+    """Test monthly range partitioning with the date in the primary key on Postgres only."""
+    pg = str(CreateTable(Attendance.__table__).compile(dialect=postgresql.dialect()))
+    assert "PARTITION BY RANGE (date)" in pg
+    assert "PRIMARY KEY (id, date)" in pg
+
+    lite = str(CreateTable(Attendance.__table__).compile(dialect=sqlite.dialect()))
+    assert "PARTITION" not in lite
+    assert "PRIMARY KEY (id)" in lite
+
+
+def test_partition_naming_and_bounds():
+    """Test month arithmetic and parsing of partition names and the archive bound."""
+    assert add_months(date(2024, 11, 1), 3) == date(2025, 2, 1)
+    assert add_months(date(2025, 1, 1), -1) == date(2024, 12, 1)
+    assert partition_name(date(2025, 3, 1)) == "attendances_y2025m03"
+
+    bounds = {
+        "attendances_y2025m04": "FOR VALUES FROM ('2025-04-01') TO ('2025-05-01')",
+        "attendances_y2025m03": "FOR VALUES FROM ('2025-03-01') TO ('2025-04-01')",
+        "attendances_default": "DEFAULT",
+        ARCHIVE_PARTITION: "FOR VALUES FROM (MINVALUE) TO ('2025-03-01')",
+    }
+    assert month_partitions(bounds) == [date(2025, 3, 1), date(2025, 4, 1)]
+    assert archived_before(bounds) == date(2025, 3, 1)
+    assert archived_before({}) is None
+
+    bounds["attendances_archive_y2025"] = "FOR VALUES FROM ('2025-03-01') TO ('2026-01-01')"
+    assert archived_before(bounds) == date(2026, 1, 1)
+    assert month_partitions(bounds) == [date(2025, 3, 1), date(2025, 4, 1)]
+
+
+def test_archivable_months_are_closed_paid_prefix(db_session):
+    """Test that only a leading run of months past the hot window with every employee paid is archivable."""
+    months = [date(2025, 1, 1), date(2025, 2, 1), date(2025, 3, 1)]
+    for month_first in months:
+        db_session.add(Attendance(user_id=2, date=month_first.replace(day=3), status="Present",
+                                  in_time=time(9, 0), out_time=time(18, 0), work_minutes=540))
+    for month_first in (months[0], months[2]):
+        db_session.add(Payslip(user_id=2, month=month_first, base_salary=1, tax=0, deductions=0,
+                               net_salary=1, absent_days=0, working_days=20))
+    db_session.commit()
+
+    conn = db_session.connection()
+    # February is unpaid, so March (paid) must wait for it
+    assert archivable_months(conn, months, today=date(2025, 6, 15)) == [date(2025, 1, 1)]
+
+    db_session.add(Payslip(user_id=2, month=months[1], base_salary=1, tax=0, deductions=0,
+                           net_salary=1, absent_days=0, working_days=20))
+    db_session.commit()
+    conn = db_session.connection()
+    assert archivable_months(conn, months, today=date(2025, 6, 15)) == months
+    # With April as the current month, February and March are still hot
+    assert archivable_months(conn, months, today=date(2025, 4, 10)) == [date(2025, 1, 1)]
+
+
+def test_archivable_years_are_closed_eligible_prefix():
+    """Test that a year is archived only once it is past the hot months and all its months are eligible."""
+    months = [date(2024, 1, 1), date(2024, 12, 1), date(2025, 3, 1), date(2025, 6, 1)]
+    bounds = {partition_name(m): "" for m in months}
+    assert archivable_years(bounds, today=date(2025, 6, 15)) == {2024: months[:2]}
+    # December 2024 is still within the hot months
+    assert archivable_years(bounds, today=date(2025, 2, 15)) == {}
+    assert archivable_years(bounds, today=date(2025, 6, 15), eligible=months[:1]) == {}
+    assert archivable_years(bounds, today=date(2026, 5, 1)) == {2024: months[:2], 2025: months[2:]}
+
+
+def test_archive_year_adds_a_bounded_partition():
+    """Test that folding a year creates its archive with explicit bounds and never re-validates old archives."""
+    fake = FakePostgres()
+    archive_year(fake, 2024, [date(2024, 1, 1), date(2024, 12, 1)], archived=None)
+    archive_year(fake, 2025, [date(2025, 3, 1)], archived=date(2025, 1, 1))
+    assert "ALTER TABLE attendances DETACH PARTITION attendances_y2024m12" in fake.statements
+    assert (
+        "CREATE TABLE attendances_archive_y2024 PARTITION OF attendances FOR VALUES FROM (MINVALUE) TO ('2025-01-01')"
+        in fake.statements
+    )
+    assert (
+        "CREATE TABLE attendances_archive_y2025 PARTITION OF attendances "
+        "FOR VALUES FROM ('2025-01-01') TO ('2026-01-01')" in fake.statements
+    )
+    assert not [sql for sql in fake.statements if "CHECK" in sql or "ATTACH" in sql or "DETACH PARTITION attendances_archive" in sql]
+
+
+def test_sqlite_keeps_a_single_table(db_session):
+    """Test that partition maintenance and archival do nothing on SQLite."""
+    engine = db_session.get_bind()
+    assert maintain_partitions(engine) == []
+    assert archive_closed_months(engine) == []
+
+
+def test_partitioning_an_existing_table_drops_duplicates(db_session):
+    """Test that converting a plain Postgres table keeps one row per (user_id, date)."""
+    fake = FakePostgres()
+    assert partition_existing_table(fake)
+    created = fake.statements.index("CREATE TABLE attendances")
+    copy = next(i for i, sql in enumerate(fake.statements) if sql.startswith("INSERT INTO attendances "))
+    assert created < copy
+    assert "CREATE TABLE attendances_y2025m01 (LIKE attendances INCLUDING DEFAULTS)" in fake.statements
+    assert fake.statements[-1] == "DROP TABLE attendances_unpartitioned"
+
+    # Run the recorded copy on a table holding a duplicate pair
+    conn = db_session.connection()
+    conn.execute(text("CREATE TABLE attendances_unpartitioned AS SELECT * FROM attendances WHERE 0"))
+    for id, user_id, day in ((1, 2, 6), (2, 2, 6), (3, 2, 7), (4, 1, 6)):
+        conn.execute(text(
+            "INSERT INTO attendances_unpartitioned (id, user_id, date, status, work_minutes) "
+            "VALUES (:id, :user_id, :day, 'Present', 540)"
+        ), {"id": id, "user_id": user_id, "day": date(2025, 1, day)})
+    conn.execute(text(fake.statements[copy]))
+    assert conn.scalars(select(Attendance.id).order_by(Attendance.id)).all() == [1, 3, 4]
+    assert conn.scalar(select(func.count()).select_from(Attendance)) == 3
+
+
+@pytest.fixture
+def pg_engine():
+    """An empty Postgres database with the app's tables (attendances partitioned, no partitions yet)."""
+    engine = create_db_engine(normalize_url(TEST_POSTGRES_URL))
+    with engine.begin() as conn:
+        conn.execute(text("DROP SCHEMA public CASCADE"))
+        conn.execute(text("CREATE SCHEMA public"))
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User).values(id=1, email="pg@hrms.com", name="PG", hashed_password="x"))
+    yield engine
+    engine.dispose()
+
+
+def add_attendance(conn, *days):
+    for day in days:
+        conn.execute(insert(Attendance).values(user_id=1, date=day, status="Present", work_minutes=540))
+
+
+def add_payslips(conn, *months):
+    for month_first in months:
+        conn.execute(insert(Payslip).values(user_id=1, month=month_first, base_salary=1, tax=0, deductions=0,
+                                            net_salary=1, absent_days=0, working_days=20))
+
+
+def rows_in(conn, table: str) -> int:
+    return conn.scalar(text(f"SELECT count(*) FROM {table}"))
+
+
+@requires_postgres
+def test_postgres_month_partitions_take_rows_from_default(pg_engine):
+    """Test that a new month partition moves that month's rows out of the DEFAULT partition."""
+    with pg_engine.begin() as conn:
+        add_attendance(conn, date(2025, 3, 3), date(2025, 8, 4))
+        assert rows_in(conn, "attendances_default") == 2
+        created = ensure_partitions(conn, today=date(2025, 3, 10))
+    assert created == ["attendances_y2025m03", "attendances_y2025m04", "attendances_y2025m05", "attendances_y2025m06"]
+    with pg_engine.begin() as conn:
+        assert (rows_in(conn, "attendances_y2025m03"), rows_in(conn, "attendances_default")) == (1, 1)
+        assert ensure_partitions(conn, today=date(2025, 3, 10)) == []
+        assert rows_in(conn, "attendances") == 2
+
+
+@requires_postgres
+def test_postgres_archive_folds_closed_years(pg_engine):
+    """Test yearly archives: explicit bounds, stray DEFAULT rows included, no re-validation of older archives."""
+    with pg_engine.begin() as conn:
+        ensure_partitions(conn, today=date(2024, 1, 1), months=[date(2024, 12, 1), date(2025, 3, 1)])
+        add_attendance(conn, date(2023, 11, 2), date(2024, 1, 2), date(2024, 7, 1), date(2024, 12, 2), date(2025, 3, 3))
+        add_payslips(conn, date(2024, 1, 1), date(2024, 12, 1))
+
+    statements = []
+    event.listen(pg_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    archived = archive_closed_months(pg_engine, today=date(2025, 6, 15))
+    assert [m for m in archived if m.year != 2024] == []
+    assert {date(2024, 1, 1), date(2024, 12, 1)} <= set(archived)
+    with pg_engine.begin() as conn:
+        bounds = partition_bounds(conn)
+        assert bounds["attendances_archive_y2024"] == "FOR VALUES FROM (MINVALUE) TO ('2025-01-01')"
+        # November 2023 and July 2024 had no partition: they came out of the DEFAULT partition
+        assert (rows_in(conn, "attendances_archive_y2024"), rows_in(conn, "attendances_default")) == (4, 0)
+        add_payslips(conn, date(2025, 3, 1))
+
+    statements.clear()
+    archive_closed_months(pg_engine, today=date(2026, 5, 1))
+    with pg_engine.begin() as conn:
+        bounds = partition_bounds(conn)
+        assert bounds["attendances_archive_y2025"] == "FOR VALUES FROM ('2025-01-01') TO ('2026-01-01')"
+        assert month_partitions(bounds)[0] == date(2026, 5, 1)
+        assert rows_in(conn, "attendances") == 5
+    assert not [sql for sql in statements if "attendances_archive_y2024" in sql or ("archive" in sql and "CHECK" in sql)]
+
+
+@requires_postgres
+def test_postgres_startup_on_current_schema_is_one_query(pg_engine, monkeypatch):
+    """Test that a migrated Postgres database starts with the schema-marker SELECT alone."""
+    migrate(pg_engine)
+    record_schema_version(pg_engine)
+    monkeypatch.setattr(main, "engine", pg_engine)
+    statements = []
+    event.listen(pg_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    main.startup_db_check()
+    assert len(statements) == 1 and "schema_version" in statements[0]
+
+
+@requires_postgres
+def test_postgres_partitions_an_existing_table(pg_engine):
+    """Test converting a plain attendances table: month partitions, duplicates dropped, ids kept."""
+    with pg_engine.begin() as conn:
+        conn.execute(text("ALTER TABLE attendances RENAME TO attendances_old"))
+        conn.execute(text("CREATE TABLE attendances (LIKE attendances_old INCLUDING DEFAULTS)"))
+        conn.execute(text("ALTER SEQUENCE attendances_id_seq OWNED BY attendances.id"))
+        conn.execute(text("DROP TABLE attendances_old CASCADE"))
+        conn.execute(text("ALTER TABLE attendances ADD PRIMARY KEY (id)"))
+        add_attendance(conn, date(2025, 1, 6), date(2025, 1, 6), date(2025, 2, 3))
+        assert not is_partitioned(conn)
+
+    with pg_engine.begin() as conn:
+        assert partition_existing_table(conn)
+    with pg_engine.begin() as conn:
+        assert is_partitioned(conn)
+        assert (rows_in(conn, "attendances_y2025m01"), rows_in(conn, "attendances_y2025m02")) == (1, 1)
+        assert conn.scalars(select(Attendance.id).order_by(Attendance.id)).all() == [1, 3]
+        add_attendance(conn, date(2025, 2, 4))
+        assert conn.scalar(select(func.max(Attendance.id))) == 4
@@ -1,7 +1,18 @@
 """
 Payroll Calculation and PDF Payslip Streaming Test Suite.
 """
+import io
+import os
+import zipfile
+
 import pytest
+from datetime import date, time
+from sqlalchemy import event
+
+from models import User, Attendance, Leave, Holiday, LeaveStatus, Payslip
+from payroll import previous_month
+from payslip_pdf import render_many, stream_zip
+from cache import SpillingLRUCache
 
 
 def test_get_payroll_me(client, employee_token):
@@ -32,3 +43,231 @@ def test_download_payslip_pdf(client, employee_token):
     # PDF magic bytes "%PDF-"
     assert response.content.startswith(b"%PDF-")
     assert len(response.content) > 500  # Valid binary PDF length
+
+
+@pytest.fixture
+def march_2025(db_session):
+    """March 2025 (21 weekdays) with one holiday, a week of attendance and two approved leaves."""
+    employee = db_session.query(User).filter(User.email == "rahul@hrms.com").first()
+    db_session.add(Holiday(name="Holi", date=date(2025, 3, 14)))
+    for day in range(3, 8):
+        db_session.add(Attendance(user_id=employee.id, date=date(2025, 3, day), status="Present", in_time=time(9, 0)))
+    db_session.add_all([
+        # Overlaps days already covered by attendance
+        Leave(user_id=employee.id, start_date=date(2025, 2, 27), end_date=date(2025, 3, 4),
+              reason="Trip", leave_type="Annual", status=LeaveStatus.APPROVED.value),
+        Leave(user_id=employee.id, start_date=date(2025, 3, 10), end_date=date(2025, 3, 12),
+              reason="Flu", leave_type="Sick", status=LeaveStatus.APPROVED.value),
+        # Rejected leave does not cover absences
+        Leave(user_id=employee.id, start_date=date(2025, 3, 17), end_date=date(2025, 3, 17),
+              reason="Errand", leave_type="Personal", status=LeaveStatus.REJECTED.value),
+    ])
+    db_session.commit()
+    return employee
+
+
+def test_payroll_run_for_all_employees(client, admin_token, march_2025):
+    """Test a whole-company payroll run for a given completed month."""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    response = client.post("/payroll/run", params={"month": "2025-03"}, headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["month"] == "March 2025"
+    assert data["employee_count"] == 2
+
+    by_name = {p["name"]: p for p in data["payslips"]}
+    rahul = by_name["Rahul Sharma"]
+    assert rahul["working_days"] == 20
+    assert rahul["absent_days"] == 12
+    assert rahul["deductions"] == round(1200000 / 31 * 12, 2)
+    assert rahul["net_salary"] == round(1200000 - 1200000 / 31 * 12 - 144000, 2)
+
+    admin = by_name["Aditya Verma"]
+    assert admin["absent_days"] == 20
+    assert data["total_net_salary"] == round(rahul["net_salary"] + admin["net_salary"], 2)
+
+
+def test_payroll_run_constant_query_count(client, admin_token, db_session):
+    """Test that the run's query count does not grow with headcount."""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    client.get("/attendance/today", headers=headers)
+
+    def run_and_count():
+        statements = []
+        engine = db_session.get_bind()
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            assert client.post("/payroll/run", params={"month": "2025-03"}, headers=headers).status_code == 200
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+        return len(statements)
+
+    run_and_count()  # loads the working-day calendar
+    small = run_and_count()
+    db_session.add_all([
+        User(email=f"bulk{i}@hrms.com", name=f"Bulk {i}", hashed_password="x", role="employee")
+        for i in range(25)
+    ])
+    db_session.commit()
+    assert run_and_count() == small
+
+
+def test_payroll_run_rejects_open_month(client, admin_token):
+    """Test that the current month cannot be run before it closes."""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    current = date.today().strftime("%Y-%m")
+    response = client.post("/payroll/run", params={"month": current}, headers=headers)
+    assert response.status_code == 400
+    assert client.post("/payroll/run", params={"month": "March"}, headers=headers).status_code == 400
+
+
+def test_payroll_run_admin_only(client, employee_token):
+    """Test that employees cannot run company payroll."""
+    headers = {"Authorization": f"Bearer {employee_token}"}
+    assert client.post("/payroll/run", headers=headers).status_code == 403
+
+
+def test_payslip_snapshot_is_stable_until_rerun(client, employee_token, admin_token, db_session):
+    """Test that a closed month's payslip ignores later attendance edits until payroll is re-run."""
+    headers = {"Authorization": f"Bearer {employee_token}"}
+    first = client.get("/payroll/me", headers=headers).json()
+
+    employee = db_session.query(User).filter(User.email == "rahul@hrms.com").first()
+    month_first = previous_month()
+    workday = next(month_first.replace(day=d) for d in range(1, 29) if month_first.replace(day=d).weekday() < 5)
+    db_session.add(Attendance(user_id=employee.id, date=workday, status="Present", in_time=time(9, 0)))
+    db_session.commit()
+
+    assert client.get("/payroll/me", headers=headers).json() == first
+    assert db_session.query(Payslip).filter(Payslip.user_id == employee.id).count() == 1
+
+    admin_headers = {"Authorization": f"Bearer {admin_token}"}
+    client.post("/payroll/run", headers=admin_headers)
+    rerun = client.get("/payroll/me", headers=headers).json()
+    assert rerun["absent_days"] == first["absent_days"] - 1
+
+
+def test_payroll_run_persists_payslips(client, admin_token, march_2025, db_session):
+    """Test that a run stores one payslip per user and a re-run replaces them."""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    client.post("/payroll/run", params={"month": "2025-03"}, headers=headers)
+    client.post("/payroll/run", params={"month": "2025-03"}, headers=headers)
+
+    slips = db_session.query(Payslip).filter(Payslip.month == date(2025, 3, 1)).all()
+    assert len(slips) == 2
+    assert {s.user_id: s.absent_days for s in slips}[march_2025.id] == 12
+
+
+def test_payroll_me_single_lookup_once_stored(client, employee_token, db_session):
+    """Test that reading a stored payslip is one indexed query."""
+    headers = {"Authorization": f"Bearer {employee_token}"}
+    client.get("/payroll/me", headers=headers)
+
+    statements = []
+    engine = db_session.get_bind()
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        assert client.get("/payroll/me", headers=headers).status_code == 200
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert len(statements) == 1
+
+
+def test_payslip_download_etag_and_cache(client, employee_token):
+    """Test that repeat downloads reuse the rendered PDF and honour If-None-Match."""
+    headers = {"Authorization": f"Bearer {employee_token}"}
+    first = client.get("/payroll/download", headers=headers)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+
+    # ReportLab stamps each render with a new timestamp, so equal bytes mean a cache hit
+    second = client.get("/payroll/download", headers=headers)
+    assert second.content == first.content
+    assert second.headers["etag"] == etag
+
+    not_modified = client.get("/payroll/download", headers={**headers, "If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+
+    stale = client.get("/payroll/download", headers={**headers, "If-None-Match": '"other"'})
+    assert stale.status_code == 200
+
+
+def test_export_payslips_zip(client, admin_token, march_2025, db_session):
+    """Test that the bulk export streams one PDF per employee and stores missing payslips."""
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    response = client.get("/payroll/export/payslips", params={"month": "2025-03"}, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/zip"
+    assert 'filename="Payslips_2025-03.zip"' in response.headers["content-disposition"]
+
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    names = archive.namelist()
+    assert len(names) == 2
+    assert f"Payslip_{march_2025.id}_Rahul_Sharma.pdf" in names
+    for name in names:
+        assert archive.read(name).startswith(b"%PDF-")
+    assert db_session.query(Payslip).filter(Payslip.month == date(2025, 3, 1)).count() == 2
+
+
+def test_export_payslips_admin_only(client, employee_token, admin_token):
+    """Test that employees cannot export payslips and open months are rejected."""
+    response = client.get("/payroll/export/payslips", headers={"Authorization": f"Bearer {employee_token}"})
+    assert response.status_code == 403
+
+    today = date.today()
+    response = client.get(
+        "/payroll/export/payslips",
+        params={"month": f"{today:%Y-%m}"},
+        headers={"Authorization": f"Bearer {admin_token}"},
+    )
+    assert response.status_code == 400
+
+
+def test_render_many_keeps_order_and_zip_streams_per_member():
+    """Test that windowed rendering yields every PDF and the ZIP is emitted one member at a time."""
+    jobs = [({"user_id": i, "name": f"Employee {i}", "month": "March 2025", "base_salary": 1000.0,
+              "tax": 120.0, "deductions": 0.0, "net_salary": 880.0, "absent_days": 0,
+              "working_days": 20}, "Engineer") for i in range(1, 5)]
+    pdfs = list(render_many(jobs, window=2))
+    assert len(pdfs) == 4
+    assert all(pdf.startswith(b"%PDF-") for pdf in pdfs)
+
+    chunks = list(stream_zip((f"{i}.pdf", pdf) for i, pdf in enumerate(pdfs)))
+    assert len(chunks) == len(pdfs) + 1
+    assert zipfile.ZipFile(io.BytesIO(b"".join(chunks))).namelist() == ["0.pdf", "1.pdf", "2.pdf", "3.pdf"]
+
+
+def test_payslip_cache_spills_to_disk(tmp_path):
+    """Test that PDFs evicted from memory are served back from the spill directory."""
+    cache = SpillingLRUCache(str(tmp_path), max_memory_bytes=10)
+    cache.set("a", b"12345678")
+    cache.set("b", b"abcdefgh")  # evicts "a" to disk
+
+    assert cache.stats()["memory_entries"] == 1
+    assert cache.get("a") == b"12345678"
+    assert cache.stats()["disk_hits"] == 1
+    assert cache.get("missing") is None
+
+
+def test_payslip_cache_disk_budget(tmp_path):
+    """Test that the spill directory is created lazily and its oldest files are deleted past the budget."""
+    directory = tmp_path / "spill"
+    cache = SpillingLRUCache(str(directory), max_memory_bytes=10, max_disk_bytes=20)
+    assert not directory.exists()
+    assert cache.get("a") is None
+
+    dated = set()
+    for index, key in enumerate("abcd"):
+        cache.set(key, key.encode() * 8)
+        for spilled in set(directory.glob("*.bin")) - dated:
+            os.utime(spilled, (index, index))  # distinct mtimes regardless of filesystem resolution
+            dated.add(spilled)
+    # a, b and c were spilled in turn; only the two newest fit in 20 bytes
+    assert sum(f.stat().st_size for f in directory.glob("*.bin")) == 16
+    assert cache.get("a") is None
+    assert cache.get("c") == b"cccccccc"
+    cache.clear()
+    assert cache.get("a") is None and cache.get("b") is None
@@ -0,0 +1,172 @@
+"""
+Write-Behind Punch Queue Test Suite (optional PUNCH_QUEUE_ENABLED ingestion mode).
+"""
+import json
+import threading
+import time as time_module
+
+import pytest
+from datetime import date, time
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+
+import main
+from models import User, Attendance
+from attendance import PunchRejected, open_shift
+from punch_queue import Punch, PunchQueue, PunchQueueFull
+
+DAY = date(2025, 3, 3)
+
+
+@pytest.fixture
+def employee_id(db_session):
+    return db_session.query(User).filter(User.email == "rahul@hrms.com").first().id
+
+
+def wait_for_flush(queue, timeout=5.0):
+    deadline = time_module.monotonic() + timeout
+    while queue.pending and time_module.monotonic() < deadline:
+        time_module.sleep(0.01)
+    assert queue.pending == 0
+
+
+@pytest.fixture
+def punch_queue(db_session, tmp_path):
+    queue = PunchQueue(str(tmp_path / "punches.wal"), flush_interval=0.01)
+    queue.start(db_session.get_bind())
+    yield queue
+    queue.stop()
+
+
+def test_queued_shift_is_written_on_flush(punch_queue, db_session, employee_id):
+    """Test that an acknowledged check-in and check-out end up as one completed row."""
+    opened = punch_queue.check_in(employee_id, DAY, time(9, 10))
+    assert opened.status == "Present"
+    closed = punch_queue.check_out(employee_id, DAY, time(17, 40, 30))
+    assert closed.work_minutes == 8 * 60 + 30
+    punch_queue.stop()
+
+    row = db_session.query(Attendance).filter(Attendance.user_id == employee_id).one()
+    assert (row.date, row.status, row.in_time, row.out_time, row.work_minutes) == (
+        DAY, "Present", time(9, 10), time(17, 40, 30), 510
+    )
+    assert punch_queue.pending == 0
+    with open(punch_queue.wal_path) as f:
+        assert f.read() == ""
+
+
+def test_queue_applies_state_machine_rules(punch_queue, db_session, employee_id):
+    """Test the same rejections as the synchronous path, including shifts already in the database."""
+    with pytest.raises(PunchRejected, match="not checked in"):
+        punch_queue.check_out(employee_id, DAY, time(18, 0))
+    punch_queue.check_in(employee_id, DAY, time(9, 45))
+    with pytest.raises(PunchRejected, match="already checked in"):
+        punch_queue.check_in(employee_id, DAY, time(9, 50))
+    punch_queue.check_out(employee_id, DAY, time(18, 0))
+    with pytest.raises(PunchRejected, match="completed your shift"):
+        punch_queue.check_in(employee_id, DAY, time(19, 0))
+    with pytest.raises(PunchRejected, match="already checked out"):
+        punch_queue.check_out(employee_id, DAY, time(19, 0))
+
+    # The writer thread shares the test database's single connection: let it finish first
+    wait_for_flush(punch_queue)
+    other_day = date(2025, 3, 4)
+    open_shift(db_session, employee_id, other_day, time(9, 0))
+    with pytest.raises(PunchRejected, match="already checked in"):
+        punch_queue.check_in(employee_id, other_day, time(9, 5))
+
+
+def test_wal_is_replayed_on_start(db_session, employee_id, tmp_path):
+    """Test that punches acknowledged before a crash are written on the next start."""
+    wal_path = tmp_path / "punches.wal"
+    wal_path.write_text(
+        Punch(employee_id, DAY, time(9, 0), "Present").to_json() + "\n"
+        + Punch(employee_id, DAY, time(9, 0), "Present", time(17, 0), 480).to_json() + "\n"
+        + '{"user_id": 1, "da'  # torn final write
+    )
+    queue = PunchQueue(str(wal_path))
+    queue.start(db_session.get_bind())
+    queue.stop()
+
+    row = db_session.query(Attendance).filter(Attendance.user_id == employee_id).one()
+    assert (row.out_time, row.work_minutes) == (time(17, 0), 480)
+    assert wal_path.read_text() == ""
+
+
+def test_full_queue_rejects_punches(db_session, tmp_path):
+    """Test back-pressure once max_pending punches are waiting to be written."""
+    queue = PunchQueue(str(tmp_path / "punches.wal"), max_pending=1, flush_interval=0.01)
+    queue.start(db_session.get_bind())
+    release = threading.Event()
+    write = queue.write
+    queue.write = lambda punches: (release.wait(5), write(punches))
+
+    accepted = 0
+    with pytest.raises(PunchQueueFull):
+        for user_id in range(1, 10):
+            queue.check_in(user_id, DAY, time(9, 0))
+            accepted += 1
+    release.set()
+    queue.stop()
+    assert db_session.query(Attendance).count() == accepted
+
+
+def test_rejected_punch_is_dead_lettered(db_session, employee_id, tmp_path):
+    """Test that a punch the database refuses is set aside while the rest of its batch is written."""
+    queue = PunchQueue(str(tmp_path / "punches.wal"), flush_interval=0.01)
+    write = queue.write
+
+    def write_known_users(punches):
+        if any(punch.user_id == 999 for punch in punches):
+            raise IntegrityError("INSERT INTO attendances", {}, Exception("FOREIGN KEY constraint failed"))
+        write(punches)
+    queue.write = write_known_users
+    queue.start(db_session.get_bind())
+    queue.check_in(999, DAY, time(9, 0))
+    queue.check_in(employee_id, DAY, time(9, 5))
+    queue.stop()
+
+    assert db_session.query(Attendance.user_id).all() == [(employee_id,)]
+    assert (queue.rejected, queue.pending) == (1, 0)
+    with open(queue.dead_letter_path) as f:
+        dead = [json.loads(line) for line in f]
+    assert dead[0]["punch"]["user_id"] == 999 and "FOREIGN KEY" in dead[0]["error"]
+    with open(queue.wal_path) as f:
+        assert f.read() == ""
+
+
+def test_shift_states_load_without_the_lock(punch_queue, db_session, employee_id):
+    """Test that the shift-state query runs while other punches can still take the queue lock."""
+    locked = []
+    caller = threading.current_thread()
+
+    def record(conn, cursor, statement, *args):
+        # The writer thread runs its own queries; only the punching thread's loads count
+        if threading.current_thread() is caller and statement.lstrip().startswith("SELECT attendances.user_id"):
+            locked.append(punch_queue._lock.locked())
+    event.listen(db_session.get_bind(), "before_cursor_execute", record)
+    try:
+        punch_queue.check_in(employee_id, DAY, time(9, 0))
+        punch_queue.mark_stale()
+        punch_queue.check_out(employee_id, DAY, time(17, 0))
+    finally:
+        event.remove(db_session.get_bind(), "before_cursor_execute", record)
+    assert locked and not any(locked)
+
+
+def test_check_in_endpoint_in_queue_mode(client, employee_token, punch_queue, monkeypatch, db_session):
+    """Test that the API acknowledges queued punches with 202 and no row id."""
+    monkeypatch.setattr(main, "punch_queue", punch_queue)
+    headers = {"Authorization": f"Bearer {employee_token}"}
+
+    response = client.post("/attendance/check-in", headers=headers)
+    assert response.status_code == 202
+    assert response.json()["id"] is None
+    assert client.post("/attendance/check-in", headers=headers).status_code == 400
+
+    response = client.post("/attendance/check-out", headers=headers)
+    assert response.status_code == 202
+    assert response.json()["work_hours"] is not None
+
+    punch_queue.stop()
+    assert db_session.query(Attendance).filter(Attendance.out_time.is_not(None)).count() == 1
@@ -0,0 +1,121 @@
+"""
+Read Replica Routing Test Suite (replica reads, lag fallback, read-your-writes).
+
+The primary is the suite's usual test database; the replica is a second
+in-memory SQLite database holding different rows, so each response shows
+which one served it. Lag comes from a stand-in probe.
+"""
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import database
+from database import Base, ReplicaSet, recent_writers
+from models import Leave, Payslip, User
+from payroll import get_payslip, previous_month
+
+replica_engine = create_engine(
+    "sqlite:///:memory:",
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool
+)
+ReplicaSession = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+
+
+class StubProbe:
+    def __init__(self):
+        self.lag = 0.0
+
+    def __call__(self, conn) -> float:
+        if self.lag is None:
+            raise ConnectionError("replica unreachable")
+        return self.lag
+
+
+@pytest.fixture
+def replica(monkeypatch):
+    """A single replica (with its own copy of the employee and one leave) routed to by get_read_db."""
+    Base.metadata.create_all(bind=replica_engine)
+    session = ReplicaSession()
+    session.add(User(id=2, email="rahul@hrms.com", name="Rahul Sharma", hashed_password="x", department="Engineering"))
+    session.add(Leave(user_id=2, leave_type="Sick", reason="On the replica",
+                      start_date=date.today() + timedelta(days=3), end_date=date.today() + timedelta(days=3)))
+    session.commit()
+    session.close()
+
+    probe = StubProbe()
+    replicas = ReplicaSet([replica_engine], max_lag=5, probe=probe)
+    replicas.refresh()
+    monkeypatch.setattr(database, "replicas", replicas)
+    recent_writers.clear()
+    yield replicas
+    recent_writers.clear()
+    Base.metadata.drop_all(bind=replica_engine)
+
+
+def leave_reasons(client, token):
+    response = client.get("/leaves", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    return [leave["reason"] for leave in response.json()]
+
+
+def test_reads_go_to_healthy_replica(client, employee_token, replica):
+    """Test that read-only endpoints are served by a replica within the lag budget."""
+    assert leave_reasons(client, employee_token) == ["On the replica"]
+    response = client.get("/leaves/calendar", headers={"Authorization": f"Bearer {employee_token}"})
+    assert [entry["leave_type"] for entry in response.json()] == ["Sick"]
+
+
+def test_lagging_or_unreachable_replica_falls_back_to_primary(client, employee_token, replica):
+    """Test fallback to the primary when the replica lags too far or fails its probe."""
+    replica.probe.lag = 30.0
+    replica.refresh()
+    assert leave_reasons(client, employee_token) == []
+
+    replica.probe.lag = None
+    replica.refresh()
+    assert replica.lags == [None]
+    assert leave_reasons(client, employee_token) == []
+
+    replica.probe.lag = 0.5
+    replica.refresh()
+    assert leave_reasons(client, employee_token) == ["On the replica"]
+
+
+def test_client_reads_its_own_writes_from_primary(client, employee_token, admin_token, replica):
+    """Test that a client who just wrote reads from the primary while others stay on the replica."""
+    start = date.today() + timedelta(days=10)
+    response = client.post("/leaves", json={
+        "start_date": start.isoformat(), "end_date": start.isoformat(),
+        "leave_type": "Annual", "reason": "Written to the primary"
+    }, headers={"Authorization": f"Bearer {employee_token}"})
+    assert response.status_code == 200
+
+    assert leave_reasons(client, employee_token) == ["Written to the primary"]
+    assert leave_reasons(client, admin_token) == ["On the replica"]
+
+    recent_writers.clear()  # the stickiness window has passed
+    assert leave_reasons(client, employee_token) == ["On the replica"]
+
+
+def test_payslip_lookup_on_replica_and_compute_on_primary(db_session, replica):
+    """Test that stored payslips are read from the replica and missing ones are stored on the primary."""
+    month = previous_month()
+    user = db_session.query(User).filter(User.id == 2).one()
+    replica_db = ReplicaSession()
+    try:
+        replica_db.add(Payslip(user_id=2, month=month, base_salary=42, tax=0, deductions=0,
+                               net_salary=42, absent_days=0, working_days=0))
+        replica_db.commit()
+        assert get_payslip(db_session, user, month, replica_db)["net_salary"] == 42
+
+        replica_db.query(Payslip).delete()
+        replica_db.commit()
+        computed = get_payslip(db_session, user, month, replica_db)
+        assert computed["net_salary"] != 42
+        assert db_session.query(Payslip).filter(Payslip.user_id == 2).count() == 1
+    finally:
+        replica_db.close()
@@ -0,0 +1,111 @@
+"""
+Monthly Attendance Rollup Test Suite (incremental maintenance, rebuilds and readers).
+"""
+from datetime import date, time
+
+import pytest
+from sqlalchemy import delete, insert, literal, select
+
+from models import User, Attendance, AttendanceRollup
+from attendance import open_shift, close_shift, parse_punch_file, replay_punches
+from migrations import upgrade_schema
+from punch_queue import Punch, PunchQueue
+from rollup import attended_days_query, rebuild_rollups, sql_popcount
+
+
+def rollups(db_session):
+    db_session.expire_all()
+    return {
+        (r.user_id, r.month): (r.present_days, r.late_days, r.half_days, r.days_mask,
+                               r.completed_shifts, r.minutes_worked, r.overtime_minutes)
+        for r in db_session.query(AttendanceRollup)
+    }
+
+
+@pytest.fixture
+def employee_id(db_session):
+    return db_session.query(User).filter(User.email == "rahul@hrms.com").first().id
+
+
+def test_punches_update_rollup_incrementally(db_session, employee_id):
+    """Test that check-in/check-out increments equal a rebuild from raw attendance."""
+    open_shift(db_session, employee_id, date(2025, 3, 3), time(9, 0))
+    close_shift(db_session, employee_id, date(2025, 3, 3), time(18, 30))
+    open_shift(db_session, employee_id, date(2025, 3, 4), time(9, 45))
+    close_shift(db_session, employee_id, date(2025, 3, 4), time(17, 0))
+    open_shift(db_session, employee_id, date(2025, 3, 5), time(9, 0))
+    open_shift(db_session, employee_id, date(2025, 4, 1), time(9, 0))
+
+    incremental = rollups(db_session)
+    assert incremental[(employee_id, date(2025, 3, 1))] == (2, 1, 0, 0b11100, 2, 570 + 435, 90)
+    assert incremental[(employee_id, date(2025, 4, 1))] == (1, 0, 0, 0b1, 0, 0, 0)
+
+    with db_session.get_bind().begin() as conn:
+        assert rebuild_rollups(conn) == 2
+    assert rollups(db_session) == incremental
+
+
+def test_batch_writers_rebuild_touched_months(db_session, employee_id, tmp_path):
+    """Test the bulk upload and the write-behind queue keep rollups in sync."""
+    content = "\n".join([
+        "user_id,timestamp,direction",
+        f"{employee_id},2025-03-03T09:00:00,in",
+        f"{employee_id},2025-03-03T17:00:00,out",
+    ]).encode()
+    replay_punches(db_session, parse_punch_file(content, csv_format=True))
+
+    queue = PunchQueue(str(tmp_path / "punches.wal"))
+    queue.start(db_session.get_bind())
+    queue.write([
+        Punch(employee_id, date(2025, 3, 4), time(9, 0), "Present"),
+        Punch(employee_id, date(2025, 3, 4), time(9, 0), "Present", time(18, 0), 540),
+    ])
+    queue.stop()
+
+    assert rollups(db_session) == {(employee_id, date(2025, 3, 1)): (2, 0, 0, 0b1100, 2, 1020, 60)}
+
+
+def test_orm_edits_move_rows_between_months(db_session, employee_id):
+    """Test that editing or deleting attendance through the ORM recomputes old and new months."""
+    row = Attendance(user_id=employee_id, date=date(2025, 3, 31), status="Half-day", in_time=time(9, 0))
+    db_session.add(row)
+    db_session.commit()
+    assert rollups(db_session) == {(employee_id, date(2025, 3, 1)): (0, 0, 1, 1 << 30, 0, 0, 0)}
+
+    row.date = date(2025, 4, 2)
+    db_session.commit()
+    assert rollups(db_session) == {(employee_id, date(2025, 4, 1)): (0, 0, 1, 0b10, 0, 0, 0)}
+
+    db_session.delete(row)
+    db_session.commit()
+    assert rollups(db_session) == {}
+
+
+@pytest.mark.parametrize("value", [0, 1, 0b1011, 0x7FFFFFFF, 0x55555555, 1 << 30])
+def test_sql_popcount(db_session, value):
+    """Test the portable SQL bit count against Python's."""
+    assert db_session.scalar(select(sql_popcount(literal(value)))) == value.bit_count()
+
+
+def test_attended_days_window_spans_months(db_session, employee_id):
+    """Test that only days inside the window count, across a month boundary."""
+    for day in (date(2025, 2, 10), date(2025, 2, 20), date(2025, 3, 1), date(2025, 3, 11)):
+        open_shift(db_session, employee_id, day, time(9, 0))
+    query = attended_days_query(date(2025, 2, 15), date(2025, 3, 10))
+    assert db_session.scalar(query) == 2
+    assert db_session.scalar(query.where(AttendanceRollup.user_id == employee_id + 1)) == 0
+
+
+def test_upgrade_schema_backfills_rollups(db_session, employee_id):
+    """Test that an existing database without rollups gets them on startup."""
+    engine = db_session.get_bind()
+    with engine.begin() as conn:
+        # Core inserts bypass the ORM events, like rows written before the rollup existed
+        conn.execute(insert(Attendance), [
+            {"user_id": employee_id, "date": date(2025, 3, d), "status": "Present", "in_time": time(9, 0)}
+            for d in (3, 4)
+        ])
+        conn.execute(delete(AttendanceRollup))
+
+    upgrade_schema(engine)
+    assert rollups(db_session) == {(employee_id, date(2025, 3, 1)): (2, 0, 0, 0b1100, 0, 0, 0)}
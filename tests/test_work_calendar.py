@@ -0,0 +1,78 @@
+"""
+Working-Day Calendar Test Suite (cached holiday snapshot and bitmap counting).
+"""
+from datetime import date, timedelta
+
+from sqlalchemy import event
+
+from models import Holiday
+from work_calendar import WorkCalendar, get_calendar
+
+
+def test_working_days_between_spans_months_and_holidays():
+    """Test weekday/holiday counting across a month boundary, inclusive of both ends."""
+    calendar = WorkCalendar({date(2025, 3, 14): "Holi", date(2025, 3, 31): "Eid"})
+    assert calendar.working_days_between(date(2025, 3, 1), date(2025, 3, 31)) == 19
+    # Mon 2025-03-24 .. Fri 2025-04-04: 10 weekdays, one of them a holiday
+    assert calendar.working_days_between(date(2025, 3, 24), date(2025, 4, 4)) == 9
+    assert calendar.working_days_between(date(2025, 3, 8), date(2025, 3, 9)) == 0
+    assert calendar.working_days_between(date(2025, 3, 5), date(2025, 3, 4)) == 0
+
+    assert calendar.is_working_day(date(2025, 3, 13))
+    assert not calendar.is_working_day(date(2025, 3, 14))
+    assert not calendar.is_working_day(date(2025, 3, 15))
+    assert calendar.next_holiday(date(2025, 3, 15)) == (date(2025, 3, 31), "Eid")
+    assert calendar.next_holiday(date(2025, 4, 1)) is None
+
+
+def test_calendar_loaded_once_and_invalidated_by_holiday_writes(db_session):
+    """Test that the snapshot costs one query and is dropped when a holiday changes."""
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db_session.get_bind(), "before_cursor_execute", listener)
+    try:
+        first = get_calendar(db_session)
+        assert get_calendar(db_session) is first
+    finally:
+        event.remove(db_session.get_bind(), "before_cursor_execute", listener)
+    assert len(statements) == 1
+
+    day = date(2025, 3, 3)
+    assert first.is_working_day(day)
+    db_session.add(Holiday(name="Founders Day", date=day))
+    db_session.commit()
+    assert not get_calendar(db_session).is_working_day(day)
+
+
+def test_calendar_invalidated_on_commit_not_flush(db_session):
+    """Test that the snapshot survives a flush and a rollback and is dropped by the commit."""
+    day = date(2025, 3, 4)
+    before = get_calendar(db_session)
+    db_session.add(Holiday(name="Rolled Back Day", date=day))
+    db_session.flush()
+    assert get_calendar(db_session) is before
+    db_session.rollback()
+    db_session.commit()
+    assert get_calendar(db_session) is before
+
+    db_session.add(Holiday(name="Committed Day", date=day))
+    db_session.flush()
+    assert get_calendar(db_session) is before
+    db_session.commit()
+    assert not get_calendar(db_session).is_working_day(day)
+
+
+def test_leave_reports_working_days(client, employee_token, db_session):
+    """Test that leave responses count only the working days they cover."""
+    start = date.today() + timedelta(days=(7 - date.today().weekday()))  # next Monday
+    db_session.add(Holiday(name="Mid-week Holiday", date=start + timedelta(days=2)))
+    db_session.commit()
+
+    response = client.post("/leaves", json={
+        "start_date": str(start),
+        "end_date": str(start + timedelta(days=6)),
+        "reason": "Family visit",
+        "leave_type": "Annual"
+    }, headers={"Authorization": f"Bearer {employee_token}"})
+    assert response.status_code == 200
+    assert response.json()["working_days"] == 4